@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
 from sortedcontainers import SortedList
 
 import bitcoin.logs.logger as lc
+import bitcoin.order_book.batch as batch
+import bitcoin.order_book.util as ob_util
 import bitcoin.storage.util as sutil
 
 import bitcoin.backtester.viewgen as vg
@@ -12,11 +15,21 @@ logger = lc.config_logger('backtester', level='DEBUG', file_handler=False)
 
 
 class BackTester(object):
-    def __init__(self, strategy):
+    def __init__(self, strategy, engine=None, tick_size=None):
+        """
+        Parameters
+        ----------
+        strategy: Strategy object
+        engine: str
+            order book engine, see OrderBook
+        tick_size: float
+        """
         self.viewgen = vg.ViewGen(strategy)
         self.tradegen = tg.TradeGen()
+        self.engine = engine
+        self.tick_size = tick_size
 
-    def run(self, data, start=None, end=None, run_tradegen=False):
+    def run(self, data, start=None, end=None, run_tradegen=False, freq=None, verify=False):
         """
         Run viewgen and tradegen. Viewgen outputs how much and at what price to buy for and tradegen implements
         the view by placing limit orders.
@@ -29,6 +42,12 @@ class BackTester(object):
         end: datetime or str
             used to end the backtester early
         run_tradegen: bool
+        freq: str or pd.Timedelta
+            run the strategy once every `freq` e.g. '1s' and apply the messages in between with
+            `GdaxOrderBook.apply_batch`. By default the strategy runs on every message. Not supported with tradegen
+            since it needs to see every match.
+        verify: bool
+            check the replayed book against every stored book it passes and log differences
 
         Returns
         -------
@@ -43,6 +62,13 @@ class BackTester(object):
             logger.error('No messages found!')
             return
 
+        if freq is not None:
+            assert not run_tradegen, 'freq is not supported with tradegen'
+            self._run_batch(data, start=start, end=end, freq=pd.to_timedelta(freq))
+            return
+
+        checksums = self.get_checksums(data.books) if verify else {}
+
         for msg in messages:
             # continue till start
             if start and msg['time'] < start:
@@ -56,7 +82,9 @@ class BackTester(object):
             if not book or msg['sequence'] > book.sequence + 1:
                 book = self.get_next_book(sequence=msg['sequence'],
                                           timestamp=msg['time'],
-                                          books_df=data.books)
+                                          books_df=data.books,
+                                          engine=self.engine,
+                                          tick_size=self.tick_size)
                 # no more books available
                 if book is None:
                     return
@@ -70,6 +98,7 @@ class BackTester(object):
             # received messages have no impact, but increment book
             if msg['type'] == 'received':
                 book.sequence = msg['sequence']
+                self.verify_book(book, checksums)
                 continue
 
             # run viewgen and tradegen
@@ -80,9 +109,71 @@ class BackTester(object):
 
             # update book
             book.process_message(msg)
+            self.verify_book(book, checksums)
+
+    @staticmethod
+    def get_checksums(books_df):
+        """
+        Checksum of every stored book, see OrderBook.checksum
+
+        Returns
+        -------
+        dict[sequence, int]
+        """
+        result = {}
+        for sequence, book_df in books_df.groupby('sequence'):
+            orders = zip(book_df['price'].astype(float), book_df['size'].astype(float), book_df['order_id'])
+            result[sequence] = ob_util.get_checksum(orders)
+        return result
+
+    @staticmethod
+    def verify_book(book, checksums):
+        """
+        Compare the book with the stored book at the same sequence if there is one
+        """
+        expected = checksums.get(book.sequence)
+        if expected is not None and expected != book.checksum:
+            logger.error('Book differs from the stored book at {}'.format(book.sequence))
+
+    def _run_batch(self, data, start, end, freq):
+        """
+        Run viewgen every `freq` and fast forward the book in between, see `run`
+        """
+        columns = batch.messages_to_columns(data.messages)
+        sequences = columns['sequence']
+        row = np.searchsorted(columns['time'], np.datetime64(start)) if start else 0
+        book = None
+        clock = None  # time of the next viewgen run
+
+        while row < len(sequences):
+            # get a new book if no book defined or a gap that apply_batch does not accept
+            if not book or sequences[row] > book.sequence + 2:
+                book = self.get_next_book(sequence=sequences[row],
+                                          timestamp=pd.Timestamp(columns['time'][row]),
+                                          books_df=data.books,
+                                          engine=self.engine,
+                                          tick_size=self.tick_size)
+                # no more books available
+                if book is None:
+                    return
+                row = np.searchsorted(sequences, book.sequence, side='right')
+                clock = pd.Timestamp(book.timestamp)
+                continue
+
+            # return when reached the end
+            if end and pd.Timestamp(book.timestamp) > end:
+                return
+
+            self.viewgen.run(book=book)
+            clock += freq
+            next_time = pd.Timestamp(columns['time'][row])
+            if next_time > clock:
+                # no messages until the next run, skip the runs in between
+                clock += freq * int(np.ceil((next_time - clock) / freq))
+            row = book.apply_batch(columns, start=row, end_time=clock)
 
     @staticmethod
-    def get_next_book(sequence, timestamp, books_df):
+    def get_next_book(sequence, timestamp, books_df, engine=None, tick_size=None):
         """
         Get next book after the sequence if available.
 
@@ -92,6 +183,9 @@ class BackTester(object):
         timestamp: datetime
         books_df: DataFrame
             multiple books
+        engine: str
+            order book engine, see OrderBook
+        tick_size: float
 
         Returns
         -------
@@ -112,7 +206,7 @@ class BackTester(object):
         # next book
         next_seq = seq_list[next_seq_idx]
         book_df = books_df[books_df['sequence'] == next_seq]
-        book = sutil.df_to_book(book_df)
+        book = sutil.df_to_book(book_df, engine=engine, tick_size=tick_size)
         logger.info('Current message at {} ({}). Got book at {} ({})'.format(
             timestamp, sequence, book.sequence, book.timestamp)
         )
@@ -149,6 +149,7 @@ class TradeGen(object):
             remaining_size=abs(open_inst.size),
             start_time=open_inst.time,
             end_time=None,
+            queue_ahead=open_inst.queue_ahead,
         )
 
         # add to orders and open orders
@@ -269,7 +270,12 @@ class TradeGen(object):
         match_size = message['size']
         # if maker_time is None, it means that the maker order existed before we got a snapshot and
         # thus we don't have a timestamp. In this case, our order was after the maker order
-        maker_time = book.order_to_time.get(message['maker_order_id'])
+        maker_order_id = message['maker_order_id']
+        maker_time = book.order_to_time.get(maker_order_id)
+        # size queued ahead of the maker order. The message is applied to the book after the tradegen runs
+        maker_ahead = book.get_volume_ahead(maker_order_id) if maker_order_id in book.orders else None
+        # orders that left the level were either ahead of ours or behind it, so this bounds the size ahead of ours
+        level_size = book.get_volume_ahead(side=maker_side, price=match_price)
 
         for order in open_orders:
             # our order is competitive if it has a better price than the match price
@@ -277,9 +283,18 @@ class TradeGen(object):
             # match at same price if our order came before. Note that order.timestamp < None is False and implies
             # that maker order is created before we got the snapshot
             earlier_time = maker_time and (order['start_time'] < maker_time)
-            early_at_same_price = (order['price'] == match_price) and earlier_time
             # order has to be same side as maker i.e. opposite side of taker
             same_side_as_maker = butil.SIDE_DICT[maker_side] == np.sign(order['size'])
+            early_at_same_price = False
+            if same_side_as_maker and order['price'] == match_price:
+                # queue_ahead is at least the size ahead of our order, so a maker with as much size ahead of it is
+                # behind our order
+                order['queue_ahead'] = min(order['queue_ahead'], level_size)
+                earlier_in_queue = maker_ahead is not None and maker_ahead >= order['queue_ahead']
+                early_at_same_price = earlier_time or earlier_in_queue
+                if not early_at_same_price:
+                    # the maker order was ahead of ours so our order moves up the queue
+                    order['queue_ahead'] = max(order['queue_ahead'] - match_size, 0)
             if same_side_as_maker and (competitive_price or early_at_same_price):
                 fill_size = min(match_size, order['remaining_size'])
 
@@ -360,13 +375,15 @@ class TradeGen(object):
             # open new order
             size = target_size - open_exposure
             if abs(size) > eps:
+                queue_ahead = book.get_volume_ahead(side=butil.get_side(size), price=target_price)
                 open_inst.append(
-                    butil.OpenOrder(time=book.timestamp, price=target_price, size=size)
+                    butil.OpenOrder(time=book.timestamp, price=target_price, size=size, queue_ahead=queue_ahead)
                 )
         else:
             # no open orders. create new order with target size
+            queue_ahead = book.get_volume_ahead(side=butil.get_side(target_size), price=target_price)
             open_inst.append(
-                butil.OpenOrder(time=book.timestamp, price=target_price, size=target_size)
+                butil.OpenOrder(time=book.timestamp, price=target_price, size=target_size, queue_ahead=queue_ahead)
             )
 
         all_orders = open_inst + cancel_inst
@@ -4,7 +4,7 @@ from collections import namedtuple
 
 FillOrder = namedtuple('FillOrder', ['order_id', 'fill_time', 'fill_size'])
 DoneOrder = namedtuple('DoneOrder', ['order_id', 'time', 'status'])
-OpenOrder = namedtuple('OpenOrder', ['time', 'price', 'size'])
+OpenOrder = namedtuple('OpenOrder', ['time', 'price', 'size', 'queue_ahead'])
 View = namedtuple('View', ['size', 'price'])
 
 
@@ -51,3 +51,18 @@ def get_competitive_prices(book):
     else:
         target_bid, target_ask = best_bid + 0.01, best_ask - 0.01
     return target_bid, target_ask
+
+
+def get_side(size):
+    """
+    Side of an order from the sign of its size.
+
+    Parameters
+    ----------
+    size: float
+
+    Returns
+    -------
+    str
+    """
+    return 'buy' if size > 0 else 'sell'
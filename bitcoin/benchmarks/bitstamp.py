@@ -0,0 +1,106 @@
+"""
+Replay benchmark for BtOrderBook.
+
+Replays the live_orders messages captured by `websocket.bt_ws` in `logs/bitstamp_ws` through
+`BtOrderBook.process_message` and reports messages per second. The captured streams are short so they are replayed
+`--repeat` times, each time into an empty book.
+
+Usage:
+    python -m bitcoin.benchmarks.bitstamp --repeat 200
+    python -m bitcoin.benchmarks.bitstamp --fixed-point
+"""
+import argparse
+import ast
+import glob
+import os
+import time
+
+import bitcoin.logs.logger as lc
+import bitcoin.order_book.bt_order_book as ob
+import bitcoin.order_book.order_book as base_ob
+import bitcoin.util as util
+
+
+logger = lc.config_logger('benchmarks', file_handler=False)
+LOG_SEPARATOR = ' - bitstamp_ws - DEBUG - '
+
+
+def load_logs(paths=None):
+    """
+    Raw websocket messages from bitstamp_ws log files in time order.
+
+    Parameters
+    ----------
+    paths: list[str]
+        log files, by default all files in logs/bitstamp_ws
+
+    Returns
+    -------
+    list[dict]
+    """
+    if paths is None:
+        paths = sorted(glob.glob(os.path.join(util.get_project_root(), 'logs', 'bitstamp_ws', '*.log')))
+    messages = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                _, sep, msg = line.partition(LOG_SEPARATOR)
+                if not sep or not msg.startswith('{'):
+                    continue
+                try:
+                    messages.append(ast.literal_eval(msg.strip()))
+                except (SyntaxError, ValueError):
+                    # truncated line
+                    continue
+    return messages
+
+
+def replay(book, messages):
+    """
+    Apply parsed messages to the book.
+
+    Returns
+    -------
+    float
+        elapsed seconds
+    """
+    start = time.time()
+    process_message = book.process_message
+    for msg in messages:
+        process_message(msg)
+    return time.time() - start
+
+
+def run(repeat=200, engines=None, fixed_point=False, paths=None):
+    """
+    Replay the captured streams for every engine and log the throughput.
+
+    Returns
+    -------
+    dict[engine, messages per second]
+    """
+    engines = engines or base_ob.ENGINES
+    messages = [ob.parse_message(msg, fixed_point=fixed_point) for msg in load_logs(paths)]
+    messages = [msg for msg in messages if msg['event'].startswith('order_')]
+    result = {}
+
+    for engine in engines:
+        elapsed = 0
+        for _ in range(repeat):
+            book = ob.BtOrderBook(0, engine=engine, fixed_point=fixed_point)
+            elapsed += replay(book, messages)
+        num_messages = repeat * len(messages)
+        result[engine] = num_messages / elapsed
+        logger.info('{}: {:,} messages in {:.2f}s ({:,.0f} msgs/s)'.format(engine, num_messages, elapsed,
+                                                                           result[engine]))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bitstamp order book replay benchmark')
+    parser.add_argument('--repeat', type=int, default=200, help='number of times the captured streams are replayed')
+    parser.add_argument('--engine', action='append', choices=base_ob.ENGINES, help='engines to benchmark')
+    parser.add_argument('--fixed-point', action='store_true', help='use fixed point prices and sizes')
+    parser.add_argument('--log', action='append', help='bitstamp_ws log files to replay')
+    args = parser.parse_args()
+    run(repeat=args.repeat, engines=args.engine, fixed_point=args.fixed_point, paths=args.log)
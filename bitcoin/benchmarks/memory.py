@@ -0,0 +1,106 @@
+"""
+Memory benchmark for GdaxOrderBook.
+
+Builds a level 3 book and reports the bytes used per order, including the order ids, levels and indexes. Use it
+to size hosts that run several books per process.
+
+Usage:
+    python -m bitcoin.benchmarks.memory --orders 50000
+"""
+import argparse
+import sys
+import types
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.logs.logger as lc
+import bitcoin.order_book.gdax_order_book as ob
+import bitcoin.order_book.order_book as base_ob
+
+
+logger = lc.config_logger('benchmarks', file_handler=False)
+# shared objects that do not belong to a book
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def get_deep_size(obj, seen=None):
+    """
+    Size in bytes of an object and everything it references. Objects referenced more than once are counted once.
+
+    Parameters
+    ----------
+    obj: object
+    seen: set
+        ids of objects already counted
+
+    Returns
+    -------
+    int
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    size = 0
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIP_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+
+        if hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return size
+
+
+def bytes_per_order(book):
+    """
+    Total size of the book divided by the number of orders.
+
+    Returns
+    -------
+    float
+    """
+    return get_deep_size(book) / float(max(len(book.orders), 1))
+
+
+def run(num_orders=50000, engines=None, tick_size=0.01):
+    """
+    Build a synthetic book for every engine and log its size.
+
+    Returns
+    -------
+    dict[engine, bytes per order]
+    """
+    engines = engines or base_ob.ENGINES
+    data = bob.synthetic_book(num_orders=num_orders, tick_size=tick_size)
+    result = {}
+
+    for engine in engines:
+        book = ob.GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], engine=engine,
+                                tick_size=tick_size)
+        total = get_deep_size(book)
+        result[engine] = total / float(len(book.orders))
+        num_levels = len(book.bids) + len(book.asks)
+        logger.info('{}: {:,} orders in {:,} levels use {:.1f} MB ({:.0f} bytes/order)'.format(
+            engine, len(book.orders), num_levels, total / 1e6, result[engine])
+        )
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Order book memory benchmark')
+    parser.add_argument('--orders', type=int, default=50000, help='number of orders in the synthetic book')
+    parser.add_argument('--engine', action='append', choices=base_ob.ENGINES, help='engines to benchmark')
+    parser.add_argument('--tick-size', type=float, default=0.01)
+    args = parser.parse_args()
+    run(num_orders=args.orders, engines=args.engine, tick_size=args.tick_size)
@@ -0,0 +1,300 @@
+"""
+Replay benchmark for GdaxOrderBook.
+
+Replays a message stream through `GdaxOrderBook.process_message` and reports messages per second. The stream is
+either a dataset stored with `storage.api.store_dataset` or a synthetic full channel feed.
+
+Usage:
+    python -m bitcoin.benchmarks.order_book --messages 200000
+    python -m bitcoin.benchmarks.order_book --dataset 2017-11-10_00_to_2017-11-10_03
+    python -m bitcoin.benchmarks.order_book --fixed-point
+    python -m bitcoin.benchmarks.order_book --batch
+    python -m bitcoin.benchmarks.order_book --level2
+"""
+import argparse
+import random
+import time
+import uuid
+
+import numpy as np
+
+import bitcoin.logs.logger as lc
+import bitcoin.order_book.batch as batch
+import bitcoin.order_book.gdax_order_book as ob
+import bitcoin.order_book.l2_order_book as l2
+import bitcoin.order_book.order_book as base_ob
+import bitcoin.params as pms
+import bitcoin.util as util
+
+
+logger = lc.config_logger('benchmarks', file_handler=False)
+
+
+def _random_price(rng, side, mid, tick_size):
+    """
+    Price away from the mid. Most orders are a few ticks from the touch and the rest are spread deep in the book.
+    """
+    if rng.random() < 0.8:
+        ticks = int(rng.expovariate(1 / 50.)) + 1
+    else:
+        ticks = rng.randint(1, int(0.2 * mid / tick_size))
+    offset = ticks * tick_size
+    price = mid - offset if side == 'buy' else mid + offset
+    return round(price, 8)
+
+
+def _order_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def synthetic_book(num_orders=20000, mid=10000., tick_size=0.01, seed=0):
+    """
+    Level 3 book data in the format of `PublicClient.get_product_order_book(level=3)`.
+
+    Returns
+    -------
+    dict
+        keys: [sequence, bids, asks]
+    """
+    rng = random.Random(seed)
+    data = {'sequence': 0, 'bids': [], 'asks': []}
+    for _ in range(num_orders):
+        side = rng.choice(['buy', 'sell'])
+        price = _random_price(rng, side, mid, tick_size)
+        size = round(rng.uniform(0.01, 2), 8)
+        key = 'bids' if side == 'buy' else 'asks'
+        data[key].append([price, size, _order_id(rng)])
+    return data
+
+
+def synthetic_messages(data, num_messages, mid=10000., tick_size=0.01, seed=1):
+    """
+    Parsed full channel messages for a book created from `data`. The mix of message types is similar to a BTC-USD
+    feed: most orders are received, opened and cancelled, and some are matched or changed.
+
+    Parameters
+    ----------
+    data: dict
+        output of synthetic_book
+    num_messages: int
+    mid: float
+    tick_size: float
+    seed: int
+
+    Returns
+    -------
+    list[dict]
+    """
+    rng = random.Random(seed)
+    # live order ids are kept in a list so that a random order can be picked and removed in O(1)
+    live_ids = []
+    live = {}  # dict[order_id, [side, price, size]]
+    for side, key in [('buy', 'bids'), ('sell', 'asks')]:
+        for price, size, order_id in data[key]:
+            live_ids.append(order_id)
+            live[order_id] = [side, price, size]
+
+    def _remove(idx):
+        live_ids[idx] = live_ids[-1]
+        live_ids.pop()
+
+    sequence = data['sequence']
+    start = np.datetime64('2017-12-01T00:00:00.000000')
+    messages = []
+
+    for i in range(num_messages):
+        sequence += 1
+        msg = {'sequence': sequence, 'time': start + np.timedelta64(i * 10, 'ms')}
+        roll = rng.random()
+
+        if roll < 0.35 or not live_ids:
+            side = rng.choice(['buy', 'sell'])
+            msg.update(type='received', order_id=_order_id(rng), side=side, order_type='limit',
+                       price=_random_price(rng, side, mid, tick_size), size=round(rng.uniform(0.01, 2), 8))
+        elif roll < 0.65:
+            side = rng.choice(['buy', 'sell'])
+            order_id = _order_id(rng)
+            price = _random_price(rng, side, mid, tick_size)
+            size = round(rng.uniform(0.01, 2), 8)
+            live_ids.append(order_id)
+            live[order_id] = [side, price, size]
+            msg.update(type='open', order_id=order_id, side=side, price=price, remaining_size=size)
+        elif roll < 0.92:
+            idx = rng.randrange(len(live_ids))
+            order_id = live_ids[idx]
+            side, price, size = live.pop(order_id)
+            _remove(idx)
+            msg.update(type='done', order_id=order_id, side=side, price=price, remaining_size=size,
+                       reason='canceled')
+        elif roll < 0.97:
+            idx = rng.randrange(len(live_ids))
+            order_id = live_ids[idx]
+            side, price, size = live[order_id]
+            trade_size = size if rng.random() < 0.5 else round(size / 2, 8)
+            if trade_size >= size:
+                del live[order_id]
+                _remove(idx)
+            else:
+                live[order_id][2] = size - trade_size
+            msg.update(type='match', maker_order_id=order_id, taker_order_id=_order_id(rng), side=side,
+                       price=price, size=trade_size, trade_id=i)
+        else:
+            idx = rng.randrange(len(live_ids))
+            order_id = live_ids[idx]
+            side, price, size = live[order_id]
+            new_size = round(size / 2, 8)
+            if not new_size:
+                msg.update(type='heartbeat')
+            else:
+                live[order_id][2] = new_size
+                msg.update(type='change', order_id=order_id, side=side, price=price, new_size=new_size,
+                           old_size=size)
+        messages.append(msg)
+    return messages
+
+
+def to_fixed_messages(messages):
+    """
+    Copy of parsed messages with prices and sizes converted to fixed point, see `util.parse_message`.
+    """
+    result = []
+    for msg in messages:
+        msg = dict(msg)
+        for field in pms.FIXED_POINT_FIELDS:
+            if field in msg:
+                msg[field] = util.to_fixed(msg[field])
+        result.append(msg)
+    return result
+
+
+def load_dataset(name, engine=None, tick_size=None, fixed_point=False):
+    """
+    Book from the first snapshot of a stored dataset and the messages after it.
+
+    Returns
+    -------
+    tuple(GdaxOrderBook, list[dict])
+    """
+    # imported here since storage connects to the database on import
+    import bitcoin.storage.api as api
+    import bitcoin.storage.util as sutil
+
+    dataset = api.get_dataset(name)
+    first_sequence = dataset.books['sequence'].min()
+    book_df = dataset.books[dataset.books['sequence'] == first_sequence]
+    book = sutil.df_to_book(book_df, engine=engine, tick_size=tick_size, fixed_point=fixed_point)
+    messages = [msg for msg in dataset.messages if msg['sequence'] > book.sequence]
+    if fixed_point:
+        messages = to_fixed_messages(messages)
+    return book, messages
+
+
+def replay(book, messages):
+    """
+    Apply messages to the book.
+
+    Returns
+    -------
+    float
+        elapsed seconds
+    """
+    start = time.time()
+    for msg in messages:
+        book.process_message(msg)
+    return time.time() - start
+
+
+def replay_batch(book, columns):
+    """
+    Apply a batch of messages to the book with `GdaxOrderBook.apply_batch`.
+
+    Returns
+    -------
+    float
+        elapsed seconds
+    """
+    start = time.time()
+    book.apply_batch(columns)
+    return time.time() - start
+
+
+def run(num_messages=200000, num_orders=20000, dataset=None, engines=None, tick_size=0.01, fixed_point=False,
+        use_batch=False):
+    """
+    Replay the same stream for every engine and log the throughput.
+
+    Returns
+    -------
+    dict[engine, messages per second]
+    """
+    engines = engines or base_ob.ENGINES
+    result = {}
+
+    if dataset is None:
+        data = synthetic_book(num_orders=num_orders, tick_size=tick_size)
+        messages = synthetic_messages(data, num_messages, tick_size=tick_size)
+        if fixed_point:
+            messages = to_fixed_messages(messages)
+
+    for engine in engines:
+        if dataset is None:
+            book = ob.GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], engine=engine,
+                                    tick_size=tick_size, fixed_point=fixed_point)
+        else:
+            book, messages = load_dataset(dataset, engine=engine, tick_size=tick_size, fixed_point=fixed_point)
+
+        if use_batch:
+            elapsed = replay_batch(book, batch.messages_to_columns(messages, fixed_point=fixed_point))
+        else:
+            elapsed = replay(book, messages)
+        result[engine] = len(messages) / elapsed
+        logger.info('{}: {:,} messages in {:.2f}s ({:,.0f} msgs/s)'.format(engine, len(messages), elapsed,
+                                                                           result[engine]))
+    return result
+
+
+def run_level2(num_messages=200000, num_orders=20000, tick_size=0.01, fixed_point=False):
+    """
+    Replay a synthetic full channel feed through GdaxOrderBook and the equivalent level2 feed (see
+    `l2_order_book.l3_to_l2_feed`) through L2OrderBook and log the time of each.
+
+    Returns
+    -------
+    dict[str, float]
+        elapsed seconds of each book
+    """
+    data = synthetic_book(num_orders=num_orders, tick_size=tick_size)
+    messages = synthetic_messages(data, num_messages, tick_size=tick_size)
+    if fixed_point:
+        messages = to_fixed_messages(messages)
+
+    def _create_book():
+        return ob.GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], tick_size=tick_size,
+                                fixed_point=fixed_point)
+
+    feed = [l2.parse_message(msg, fixed_point=fixed_point) for msg in l2.l3_to_l2_feed(_create_book(), messages)]
+    result = {'level3': replay(_create_book(), messages),
+              'level2': replay(l2.L2OrderBook(tick_size=tick_size, fixed_point=fixed_point), feed)}
+    logger.info('level3: {:,} messages in {:.2f}s'.format(len(messages), result['level3']))
+    logger.info('level2: {:,} messages in {:.2f}s ({:.1f}x less time)'.format(len(feed), result['level2'],
+                                                                             result['level3'] / result['level2']))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Order book replay benchmark')
+    parser.add_argument('--messages', type=int, default=200000, help='number of synthetic messages')
+    parser.add_argument('--orders', type=int, default=20000, help='number of orders in the synthetic book')
+    parser.add_argument('--dataset', help='name of a stored dataset to replay instead of synthetic messages')
+    parser.add_argument('--engine', action='append', choices=base_ob.ENGINES, help='engines to benchmark')
+    parser.add_argument('--tick-size', type=float, default=0.01)
+    parser.add_argument('--fixed-point', action='store_true', help='use fixed point prices and sizes')
+    parser.add_argument('--batch', action='store_true', help='replay with GdaxOrderBook.apply_batch')
+    parser.add_argument('--level2', action='store_true', help='compare with L2OrderBook on the level2 feed')
+    args = parser.parse_args()
+    if args.level2:
+        run_level2(num_messages=args.messages, num_orders=args.orders, tick_size=args.tick_size,
+                   fixed_point=args.fixed_point)
+    else:
+        run(num_messages=args.messages, num_orders=args.orders, dataset=args.dataset, engines=args.engine,
+            tick_size=args.tick_size, fixed_point=args.fixed_point, use_batch=args.batch)
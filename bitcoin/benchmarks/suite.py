@@ -0,0 +1,256 @@
+"""
+Order book benchmark suite.
+
+Runs the order book benchmarks for every engine and writes the results to a JSON file so that engine changes can be
+compared run over run:
+    build: creating a GdaxOrderBook from a level 3 snapshot
+    replay: messages per second through `GdaxOrderBook.process_message` and per message latency percentiles
+    reads: average time of to_df, to_arrays, get_best_bid_ask and get_vwap on the book after the replay
+
+The snapshot and messages are either a dataset stored with `storage.api.store_dataset` or synthetic, see
+`benchmarks.order_book`.
+
+Usage:
+    python -m bitcoin.benchmarks.suite --messages 1000000
+    python -m bitcoin.benchmarks.suite --mode trusted
+    python -m bitcoin.benchmarks.suite --dataset 2017-11-10_00_to_2017-11-10_03 --output results.json
+    python -m bitcoin.benchmarks.suite --compare benchmark_results/order_book_20171201_000000.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+from timeit import default_timer
+
+import numpy as np
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.logs.logger as lc
+import bitcoin.order_book.gdax_order_book as ob
+import bitcoin.order_book.order_book as base_ob
+import bitcoin.util as util
+
+
+logger = lc.config_logger('benchmarks', file_handler=False)
+PERCENTILES = [50, 99, 99.9]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=util.get_project_root()).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_snapshot(dataset=None, num_orders=20000, tick_size=0.01):
+    """
+    Level 3 snapshot and the messages after it
+
+    Returns
+    -------
+    tuple(dict, list[dict])
+        snapshot keys: [sequence, bids, asks], see `benchmarks.order_book.synthetic_book`. Messages are parsed with
+        float prices and sizes and are generated separately for synthetic snapshots, see `run`.
+    """
+    if dataset is None:
+        return bob.synthetic_book(num_orders=num_orders, tick_size=tick_size), None
+
+    # imported here since storage connects to the database on import
+    import bitcoin.storage.api as api
+
+    data = api.get_dataset(dataset)
+    sequence = data.books['sequence'].min()
+    book_df = data.books[data.books['sequence'] == sequence]
+    snapshot = {'sequence': int(sequence), 'bids': [], 'asks': []}
+    for side, key in [('bid', 'bids'), ('ask', 'asks')]:
+        orders = book_df[book_df['side'] == side]
+        snapshot[key] = orders[['price', 'size', 'order_id']].values.tolist()
+    messages = [msg for msg in data.messages if msg['sequence'] > sequence]
+    return snapshot, messages
+
+
+def bench_build(snapshot, repeat=3, **kwargs):
+    """
+    Time creating a book from a snapshot. The best of `repeat` runs is kept.
+
+    Parameters
+    ----------
+    snapshot: dict
+    repeat: int
+    kwargs:
+        see GdaxOrderBook
+
+    Returns
+    -------
+    tuple(GdaxOrderBook, dict)
+    """
+    best = None
+    for _ in range(repeat):
+        start = default_timer()
+        book = ob.GdaxOrderBook(snapshot['sequence'], bids=snapshot['bids'], asks=snapshot['asks'], **kwargs)
+        elapsed = default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    num_orders = len(snapshot['bids']) + len(snapshot['asks'])
+    return book, {'orders': num_orders, 'seconds': best, 'orders_per_sec': num_orders / best}
+
+
+def bench_replay(book, messages):
+    """
+    Apply messages to the book timing each message
+
+    Returns
+    -------
+    dict
+        messages, seconds, msgs_per_sec and the latency percentiles in microseconds e.g. p50_us, p99_us and p999_us
+    """
+    latencies = np.empty(len(messages), dtype=np.float_)
+    process_message = book.process_message
+    timer = default_timer
+
+    for idx, msg in enumerate(messages):
+        start = timer()
+        process_message(msg)
+        latencies[idx] = timer() - start
+
+    elapsed = latencies.sum()
+    result = {'messages': len(messages), 'seconds': elapsed, 'msgs_per_sec': len(messages) / elapsed,
+              'max_us': latencies.max() * 1e6}
+    for pct, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+        result['p{}_us'.format(str(pct).replace('.', ''))] = value * 1e6
+    return result
+
+
+def _time_call(func, repeat):
+    """
+    Average microseconds per call
+    """
+    start = default_timer()
+    for _ in range(repeat):
+        func()
+    return (default_timer() - start) / repeat * 1e6
+
+
+def bench_reads(book, depth=50, vwap_size=10., repeat=1000):
+    """
+    Average microseconds of the book reads
+
+    Returns
+    -------
+    dict
+    """
+    if book.fixed_point:
+        vwap_size = util.to_fixed(vwap_size)
+    slow_repeat = max(repeat // 100, 1)
+    arrays = book.to_arrays(level_type=2, depth=depth)
+    return {
+        'to_df_level_2_us': _time_call(lambda: book.to_df(level_type=2, depth=depth), slow_repeat),
+        'to_df_level_3_us': _time_call(lambda: book.to_df(level_type=3), slow_repeat),
+        'to_arrays_level_2_us': _time_call(lambda: book.to_arrays(level_type=2, depth=depth, out=arrays), repeat),
+        'get_best_bid_ask_us': _time_call(book.get_best_bid_ask, repeat),
+        'get_vwap_us': _time_call(lambda: book.get_vwap('buy', vwap_size), repeat),
+    }
+
+
+def run(num_messages=200000, num_orders=20000, dataset=None, engines=None, tick_size=0.01, fixed_point=False,
+        mode='strict', output=None):
+    """
+    Run the suite for every engine, log the results and write them to `output`
+
+    Returns
+    -------
+    dict
+        keys: [time, commit, python, params, results] where results is dict[engine, dict[benchmark, dict]]
+    """
+    engines = engines or base_ob.ENGINES
+    snapshot, messages = load_snapshot(dataset, num_orders=num_orders, tick_size=tick_size)
+    if messages is None:
+        messages = bob.synthetic_messages(snapshot, num_messages, tick_size=tick_size)
+    if fixed_point:
+        messages = bob.to_fixed_messages(messages)
+
+    report = {
+        'time': datetime.utcnow().isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'params': {'dataset': dataset, 'messages': len(messages), 'orders': num_orders, 'tick_size': tick_size,
+                   'fixed_point': fixed_point, 'mode': mode},
+        'results': {},
+    }
+
+    for engine in engines:
+        book, build = bench_build(snapshot, engine=engine, tick_size=tick_size, fixed_point=fixed_point, mode=mode)
+        replay = bench_replay(book, messages)
+        reads = bench_reads(book)
+        report['results'][engine] = {'build': build, 'replay': replay, 'reads': reads}
+        logger.info('{}: build {:,} orders in {:.3f}s'.format(engine, build['orders'], build['seconds']))
+        logger.info('{}: replay {:,} messages at {:,.0f} msgs/s, p50 {:.1f}us p99 {:.1f}us p999 {:.1f}us'.format(
+            engine, replay['messages'], replay['msgs_per_sec'], replay['p50_us'], replay['p99_us'], replay['p999_us'])
+        )
+        logger.info('{}: reads {}'.format(engine, ', '.join('{} {:.1f}'.format(name, value)
+                                                            for name, value in sorted(reads.iteritems()))))
+
+    if output is None:
+        name = 'order_book_{}.json'.format(datetime.utcnow().strftime('%Y%m%d_%H%M%S'))
+        output = os.path.join('benchmark_results', name)
+    directory = os.path.dirname(output)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    logger.info('Results written to {}'.format(output))
+    return report
+
+
+def compare(old, new):
+    """
+    Ratio of new to old for every metric of two reports
+
+    Parameters
+    ----------
+    old: dict or str
+        report returned by `run` or the path of its JSON file
+    new: dict or str
+
+    Returns
+    -------
+    dict[(engine, benchmark, metric), float]
+    """
+    reports = []
+    for report in [old, new]:
+        if isinstance(report, basestring):
+            with open(report) as f:
+                report = json.load(f)
+        reports.append(report)
+    old, new = reports
+
+    result = {}
+    for engine, benchmarks in new['results'].iteritems():
+        for name, metrics in benchmarks.iteritems():
+            old_metrics = old['results'].get(engine, {}).get(name, {})
+            for metric, value in metrics.iteritems():
+                if old_metrics.get(metric):
+                    result[engine, name, metric] = value / float(old_metrics[metric])
+    for key, ratio in sorted(result.iteritems()):
+        logger.info('{} {} {}: {:.2f}x'.format(key[0], key[1], key[2], ratio))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Order book benchmark suite')
+    parser.add_argument('--messages', type=int, default=200000, help='number of synthetic messages')
+    parser.add_argument('--orders', type=int, default=20000, help='number of orders in the synthetic book')
+    parser.add_argument('--dataset', help='name of a stored dataset to use instead of synthetic data')
+    parser.add_argument('--engine', action='append', choices=base_ob.ENGINES, help='engines to benchmark')
+    parser.add_argument('--tick-size', type=float, default=0.01)
+    parser.add_argument('--fixed-point', action='store_true', help='use fixed point prices and sizes')
+    parser.add_argument('--mode', default='strict', choices=ob.MODES, help='GdaxOrderBook message processing mode')
+    parser.add_argument('--output', help='JSON file for the results, by default benchmark_results/order_book_*.json')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare the results with')
+    args = parser.parse_args()
+    report = run(num_messages=args.messages, num_orders=args.orders, dataset=args.dataset, engines=args.engine,
+                 tick_size=args.tick_size, fixed_point=args.fixed_point, mode=args.mode,
+                 output=args.output)
+    if args.compare:
+        compare(args.compare, report)
@@ -4,6 +4,9 @@
 #
 # Live order book updated from the gdax Websocket Feed
 
+from collections import OrderedDict
+from threading import RLock
+
 from bintrees import RBTree
 import pickle
 
@@ -11,11 +14,24 @@ from bitcoin.gdax.public_client import PublicClient
 from bitcoin.gdax.websocket_client import WebsocketClient
 
 
+SIZE_EPSILON = 1e-10  # remaining sizes below this are float residue of fills e.g. 0.4 - 0.1 - 0.3
+
+
 class OrderBook(WebsocketClient):
+    """
+    Each side is an RBTree of price -> OrderedDict of order id -> order in arrival order, and every order on the book
+    is indexed by id, so open, done, match and change messages are O(1) apart from creating or removing a price level.
+    Messages are applied under a lock that get_current_book also takes, so snapshots are consistent while the
+    websocket thread updates the book.
+
+    Prices and sizes are stored as floats.
+    """
     def __init__(self, product_id='BTC-USD', log_to=None):
         super(OrderBook, self).__init__(products=product_id)
         self._asks = RBTree()
         self._bids = RBTree()
+        self._orders = {}  # dict[order id, order]
+        self._lock = RLock()
         self._client = PublicClient()
         self._sequence = -1
         self._log_to = log_to
@@ -32,27 +48,15 @@ class OrderBook(WebsocketClient):
         if self._log_to:
             pickle.dump(message, self._log_to)
 
+        with self._lock:
+            self._process_message(message)
+
+    def _process_message(self, message):
         sequence = message['sequence']
         # initialize the order book from REST api
         if self._sequence == -1:
-            self._asks = RBTree()
-            self._bids = RBTree()
             res = self._client.get_product_order_book(product_id=self.product_id, level=3)
-            for bid in res['bids']:
-                self.add({
-                    'id': bid[2],
-                    'side': 'buy',
-                    'price': bid[0],
-                    'size': bid[1]
-                })
-            for ask in res['asks']:
-                self.add({
-                    'id': ask[2],
-                    'side': 'sell',
-                    'price': ask[0],
-                    'size': ask[1]
-                })
-            self._sequence = res['sequence']
+            self.reset(res)
 
         if sequence <= self._sequence:
             # ignore older messages (e.g. before order book initialization from getProductOrderBook)
@@ -78,14 +82,6 @@ class OrderBook(WebsocketClient):
 
         self._sequence = sequence
 
-        # bid = self.get_bid()
-        # bids = self.get_bids(bid)
-        # bid_depth = sum([b['size'] for b in bids])
-        # ask = self.get_ask()
-        # asks = self.get_asks(ask)
-        # ask_depth = sum([a['size'] for a in asks])
-        # print('bid: %f @ %f - ask: %f @ %f' % (bid_depth, bid, ask_depth, ask))
-
     def on_error(self, e):
         print 'error!'
         print e
@@ -93,73 +89,59 @@ class OrderBook(WebsocketClient):
         self.close()
         self.start()
 
+    def reset(self, book):
+        """
+        Replace the book with a level 3 snapshot from `PublicClient.get_product_order_book`
+        """
+        with self._lock:
+            self._asks = RBTree()
+            self._bids = RBTree()
+            self._orders = {}
+            for side, orders in [('buy', book['bids']), ('sell', book['asks'])]:
+                for price, size, order_id in orders:
+                    self.add({'id': order_id, 'side': side, 'price': price, 'size': size})
+            self._sequence = book['sequence']
+
+    def _get_tree(self, side):
+        return self._bids if side == 'buy' else self._asks
+
     def add(self, order):
         order = {
             'id': order.get('order_id') or order['id'],
             'side': order['side'],
-            'price': order['price'],
-            'size': order.get('size') or order['remaining_size']
+            'price': float(order['price']),
+            'size': float(order.get('size') or order['remaining_size'])
         }
-        if order['side'] == 'buy':
-            bids = self.get_bids(order['price'])
-            if bids is None:
-                bids = [order]
-            else:
-                bids.append(order)
-            self.set_bids(order['price'], bids)
-        else:
-            asks = self.get_asks(order['price'])
-            if asks is None:
-                asks = [order]
-            else:
-                asks.append(order)
-            self.set_asks(order['price'], asks)
+        tree = self._get_tree(order['side'])
+        level = tree.get(order['price'])
+        if level is None:
+            level = OrderedDict()
+            tree.insert(order['price'], level)
+        level[order['id']] = order
+        self._orders[order['id']] = order
+
+    def _remove_order(self, order):
+        tree = self._get_tree(order['side'])
+        level = tree[order['price']]
+        del level[order['id']]
+        # no orders left at this price. remove this price from the book
+        if not level:
+            tree.remove(order['price'])
 
     def remove(self, order):
-        price = order['price']
-        if order['side'] == 'buy':
-            bids = self.get_bids(price)
-            if bids is not None:
-                bids = [o for o in bids if o['id'] != order['order_id']]
-                # remove this order from the bids at this price
-                if len(bids) > 0:
-                    self.set_bids(price, bids)
-                # no bids besides this order at this price. remove this price from the book
-                else:
-                    self.remove_bids(price)
-        else:
-            asks = self.get_asks(price)
-            if asks is not None:
-                asks = [o for o in asks if o['id'] != order['order_id']]
-                if len(asks) > 0:
-                    self.set_asks(price, asks)
-                else:
-                    self.remove_asks(price)
+        order = self._orders.pop(order['order_id'], None)
+        if order is not None:
+            self._remove_order(order)
 
     def match(self, order):
-        size = order['size']
-        price = order['price']
-
-        if order['side'] == 'buy':
-            bids = self.get_bids(price)
-            if not bids:
-                return
-            assert bids[0]['id'] == order['maker_order_id']
-            if bids[0]['size'] == size:
-                self.set_bids(price, bids[1:])
-            else:
-                bids[0]['size'] -= size
-                self.set_bids(price, bids)
-        else:
-            asks = self.get_asks(price)
-            if not asks:
-                return
-            assert asks[0]['id'] == order['maker_order_id']
-            if asks[0]['size'] == size:
-                self.set_asks(price, asks[1:])
-            else:
-                asks[0]['size'] -= size
-                self.set_asks(price, asks)
+        maker = self._orders.get(order['maker_order_id'])
+        if maker is None:
+            return
+        maker['size'] -= float(order['size'])
+        if maker['size'] < SIZE_EPSILON:
+            # the done message of the maker is ignored
+            del self._orders[maker['id']]
+            self._remove_order(maker)
 
     def change(self, order):
         try:
@@ -167,83 +149,77 @@ class OrderBook(WebsocketClient):
         except KeyError:
             return
 
-        price = order['price']
-
-        if order['side'] == 'buy':
-            bids = self.get_bids(price)
-            if bids is None or not any(o['id'] == order['order_id'] for o in bids):
-                return
-            index = [b['id'] for b in bids].index(order['order_id'])
-            bids[index]['size'] = new_size
-            self.set_bids(price, bids)
-        else:
-            asks = self.get_asks(price)
-            if asks is None or not any(o['id'] == order['order_id'] for o in asks):
-                return
-            index = [a['id'] for a in asks].index(order['order_id'])
-            asks[index]['size'] = new_size
-            self.set_asks(price, asks)
-
-        tree = self._asks if order['side'] == 'sell' else self._bids
-        node = tree.get(price)
-
-        if node is None or not any(o['id'] == order['order_id'] for o in node):
-            return
+        current = self._orders.get(order['order_id'])
+        if current is not None:
+            current['size'] = float(new_size)
 
     def get_current_ticker(self):
         """last match message"""
         return self._current_ticker
 
     def get_current_book(self):
-        result = {
-            'sequence': self._sequence,
-            'asks': [],
-            'bids': [],
-        }
-        for ask in self._asks:
-            try:
-                # There can be a race condition here, where a price point is removed
-                # between these two ops
-                this_ask = self._asks[ask]
-            except KeyError:
-                continue
-            for order in this_ask:
-                result['asks'].append([order['price'], order['size'], order['id']])
-        for bid in self._bids:
-            try:
-                # There can be a race condition here, where a price point is removed
-                # between these two ops
-                this_bid = self._bids[bid]
-            except KeyError:
-                continue
-
-            for order in this_bid:
-                result['bids'].append([order['price'], order['size'], order['id']])
-        return result
+        """
+        Level 3 snapshot of the book in the format of `PublicClient.get_product_order_book`, best prices first.
+        The book is locked while it is copied so the snapshot is consistent with its sequence.
+        """
+        with self._lock:
+            return {
+                'sequence': self._sequence,
+                'asks': [[order['price'], order['size'], order['id']]
+                         for level in self._asks.values() for order in level.itervalues()],
+                'bids': [[order['price'], order['size'], order['id']]
+                         for level in self._bids.values(reverse=True) for order in level.itervalues()],
+            }
 
     def get_ask(self):
         return self._asks.min_key()
 
     def get_asks(self, price):
-        return self._asks.get(price)
+        """
+        Orders at a price in arrival order, None if there are no asks at the price
+        """
+        level = self._asks.get(price)
+        return None if level is None else level.values()
 
     def remove_asks(self, price):
-        self._asks.remove(price)
+        with self._lock:
+            for order_id in self._asks.pop(price):
+                del self._orders[order_id]
 
     def set_asks(self, price, asks):
-        self._asks.insert(price, asks)
+        self._set_level(self._asks, price, asks)
 
     def get_bid(self):
         return self._bids.max_key()
 
     def get_bids(self, price):
-        return self._bids.get(price)
+        """
+        Orders at a price in arrival order, None if there are no bids at the price
+        """
+        level = self._bids.get(price)
+        return None if level is None else level.values()
 
     def remove_bids(self, price):
-        self._bids.remove(price)
+        with self._lock:
+            for order_id in self._bids.pop(price):
+                del self._orders[order_id]
 
     def set_bids(self, price, bids):
-        self._bids.insert(price, bids)
+        self._set_level(self._bids, price, bids)
+
+    def _set_level(self, tree, price, orders):
+        """
+        Replace the orders at a price with a list of orders
+        """
+        with self._lock:
+            for order_id in tree.get(price, ()):
+                del self._orders[order_id]
+            level = OrderedDict((order['id'], order) for order in orders)
+            if level:
+                tree.insert(price, level)
+                self._orders.update(level)
+            else:
+                tree.discard(price)
 
 
 if __name__ == '__main__':
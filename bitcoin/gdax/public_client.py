@@ -103,6 +103,42 @@ class PublicClient(object):
                 logger.error('Sleeping for {}s before trying again'.format(self.sleep_time))
                 time.sleep(self.sleep_time)
 
+    def stream_product_order_book(self, product_id, level=3, chunk_size=65536):
+        """Get the order book of a product as the body is downloaded.
+
+        Unlike `get_product_order_book` the body is not decoded, see
+        `bitcoin.order_book.stream` to parse it incrementally. Failed
+        requests are retried like `get_product_order_book`, errors
+        while reading the body are raised.
+
+        Args:
+            product_id (str): Product
+            level (Optional[int]): Order book level (1, 2, or 3).
+                Default is 3.
+            chunk_size (Optional[int]): Bytes per chunk.
+
+        Returns:
+            generator: JSON body in chunks of str.
+
+        """
+        while True:
+            try:
+                params = {'level': level}
+                url = self.url + '/products/{}/book'.format(product_id)
+                response = requests.get(url, params=params, stream=True)
+                response.raise_for_status()
+                break
+            except Exception as e:
+                logger.error('Failed to get gdax order book: {}'.format(e))
+                logger.error('Sleeping for {}s before trying again'.format(self.sleep_time))
+                time.sleep(self.sleep_time)
+
+        try:
+            for chunk in response.iter_content(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+
     def get_product_ticker(self, product_id):
         """Snapshot about the last trade (tick), best bid/ask and 24h volume.
 
@@ -0,0 +1,107 @@
+"""
+Columnar format for GDAX messages used by `GdaxOrderBook.apply_batch`.
+
+A batch is a dict of numpy arrays with one row per message, ordered by sequence:
+    sequence: int64
+    time: datetime64[ns]
+    type: int8, one of the type codes below
+    side: int8, BUY or SELL. For match messages this is the maker side
+    price: float64, 0 if missing. int64 for fixed point messages
+    size: float64, remaining_size for open, size for match, new_size for change and 0 otherwise. int64 for fixed point
+    order: int64, index into `order_ids` of order_id or maker_order_id for match, -1 if missing
+and `order_ids`, an object array of the distinct order ids or their integer handles, see OrderIds.
+"""
+import numpy as np
+import pandas as pd
+
+
+# type codes
+RECEIVED = 0
+OPEN = 1
+DONE = 2
+MATCH = 3
+CHANGE = 4
+OTHER = 5  # heartbeat, error, etc.
+
+TYPE_CODES = {
+    'received': RECEIVED,
+    'open': OPEN,
+    'done': DONE,
+    'match': MATCH,
+    'change': CHANGE,
+}
+TYPES = {code: _type for _type, code in TYPE_CODES.iteritems()}
+
+# side codes
+BUY = 0
+SELL = 1
+SIDES = ['buy', 'sell']
+
+
+def _get_column(df, name):
+    """
+    Column values or NaNs if the column is missing
+    """
+    if name in df:
+        return df[name].values
+    return np.full(len(df), np.nan)
+
+
+def _get_numbers(df, name, fixed_point):
+    values = pd.to_numeric(pd.Series(_get_column(df, name)), errors='coerce').fillna(0).values
+    return values.astype(np.int64) if fixed_point else values.astype(np.float_)
+
+
+def df_to_columns(df, fixed_point=False, order_ids=None):
+    """
+    Convert parsed messages to a batch.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        one row per message with the fields of `util.parse_message`
+    fixed_point: bool
+        prices and sizes are fixed point integers, see `util.parse_message`
+    order_ids: OrderIds
+        convert the distinct order ids to integer handles
+
+    Returns
+    -------
+    dict[str, np.array]
+    """
+    if df.empty:
+        df = pd.DataFrame(columns=['sequence', 'time', 'type'])
+    df = df.sort_values('sequence')
+    types = df['type'].map(TYPE_CODES).fillna(OTHER).values.astype(np.int8)
+    sides = np.full(len(df), BUY, dtype=np.int8)
+    if 'side' in df:
+        sides[df['side'].values == 'sell'] = SELL
+
+    size = _get_numbers(df, 'size', fixed_point)
+    remaining_size = _get_numbers(df, 'remaining_size', fixed_point)
+    new_size = _get_numbers(df, 'new_size', fixed_point)
+    sizes = np.select([types == OPEN, types == MATCH, types == CHANGE], [remaining_size, size, new_size], 0)
+
+    ids = np.where(types == MATCH, _get_column(df, 'maker_order_id'), _get_column(df, 'order_id'))
+    orders, unique_ids = pd.factorize(ids)
+    if order_ids is not None:
+        unique_ids = [order_ids.to_handle(order_id) for order_id in unique_ids]
+
+    columns = {
+        'sequence': df['sequence'].values.astype(np.int64),
+        'time': pd.to_datetime(df['time']).values.astype('datetime64[ns]'),
+        'type': types,
+        'side': sides,
+        'price': _get_numbers(df, 'price', fixed_point),
+        'size': sizes.astype(np.int64 if fixed_point else np.float_),
+        'order': orders.astype(np.int64),
+        'order_ids': np.asarray(unique_ids, dtype=object),
+    }
+    return columns
+
+
+def messages_to_columns(messages, fixed_point=False, order_ids=None):
+    """
+    Convert a list of parsed messages to a batch, see df_to_columns
+    """
+    return df_to_columns(pd.DataFrame(list(messages)), fixed_point=fixed_point, order_ids=order_ids)
@@ -1,47 +1,148 @@
+import json
+
 import bitcoin.order_book.order_book as ob
+import bitcoin.util as util
+
+
+SIDES = ['buy', 'sell']  # side of each Bitstamp order_type
+
+
+def parse_message(msg, fixed_point=False):
+    """
+    Flatten a live_orders message. The pusher `data` field is a JSON string.
+
+    Parameters
+    ----------
+    msg: dict
+        e.g.
+        {
+            "event": "order_created",
+            "channel": "live_orders",
+            "data": '{"price": 4063.01, "amount": 3.1302, "datetime": "1503261585", "id": 237361666, "order_type": 1}'
+        }
+    fixed_point: bool
+        convert prices and amounts to fixed point integers, see util.to_fixed
+
+    Returns
+    -------
+    dict
+        event, id, side, price, amount and datetime for order events, only the event for other events
+    """
+    event = msg['event']
+    if not event.startswith('order_'):
+        return {'event': event}
+    data = msg['data']
+    if isinstance(data, basestring):
+        data = json.loads(data)
+    to_number = util.to_fixed if fixed_point else float
+    return {
+        'event': event,
+        'id': data['id'],
+        'side': SIDES[data['order_type']],
+        'price': to_number(data['price']),
+        'amount': to_number(data['amount']),
+        'datetime': int(data['datetime']),
+    }
+
+
+def snapshot_to_orders(orders):
+    """
+    Convert the orders of `bitstamp.client.Public.order_book(group=2)` i.e. [price, amount, order id] strings to the
+    (price, size, order_id) rows taken by OrderBook with integer order ids like live_orders messages.
+    """
+    return [[price, amount, int(order_id)] for price, amount, order_id in orders]
 
 
 class BtOrderBook(ob.OrderBook):
     """
-    Processes Bitstamp messages to maintain an order book.
+    Processes Bitstamp live_orders messages to maintain an order book.
     """
-    def __init__(self, sequence, bids=None, asks=None, timestamp=None):
-        super(BtOrderBook, self).__init__(sequence=sequence, bids=bids, asks=asks, timestamp=timestamp)
-        self.exchange = 'GDAX'
+    def __init__(self, sequence, bids=None, asks=None, timestamp=None, **kwargs):
+        """
+        Bitstamp messages have no sequence numbers, so `sequence` counts the messages applied to the book.
+
+        The stream is not synchronised with the REST snapshot, so the book is built to tolerate messages from before
+        the snapshot: a created or changed order sets the size of an order already in the book and deletes of unknown
+        orders are ignored.
+
+        Parameters
+        ----------
+        kwargs:
+            see OrderBook
+        """
+        super(BtOrderBook, self).__init__(sequence=sequence, bids=bids, asks=asks, timestamp=timestamp, **kwargs)
+        self.exchange = 'BITSTAMP'
 
     def process_message(self, msg, book=None):
+        """
+        Apply a message parsed with `parse_message`
+        """
         book = book or self
         event = msg['event']
-        data = msg['data']
 
         if event == 'order_created':
-            self.create_order(data, book)
+            self.create_order(msg, book)
 
         elif event == 'order_deleted':
-            self.delete_order(data, book, delete=True)
+            self.delete_order(msg, book)
 
         elif event == 'order_changed':
-            self.change_order(data, book, delete=False)
+            self.change_order(msg, book)
         else:
-            pass
+            return
 
-        book.sequence = data.get('id')
-        book.timestamp = data.get('datetime')
+        book.sequence += 1
+        book.timestamp = msg['datetime']
 
     @staticmethod
-    def create_order(data, book):
-        side = 'buy' if data['order_type'] == 0 else 'sell'
-        price = data['price']
-        size = data['amount']
-        order_id = data['id']
-        book.add(side, price, size, order_id)
+    def _set_order(msg, book):
+        """
+        Add the order or set its size if it is already in the book
+        """
+        order_id = msg['id']
+        price = msg['price']
+        if order_id in book.orders:
+            if book.orders[order_id].price == price:
+                book.update(order_id, msg['amount'])
+                return
+            book.update(order_id, 0)
+        if msg['amount']:
+            book.add(msg['side'], price, msg['amount'], order_id)
 
     @staticmethod
-    def update_order(data, book, delete):
-        order_id = data['id']
-        size = data['amount']
-        price = data['price']
-        new_size = 0 if delete else size
-        old_price, old_size, order_id = book.update(order_id, new_size)
-        assert price == old_price, '{} == {}'.format(price, old_price)
-        assert size == old_size, '{} == {}'.format(size, old_size)
+    def create_order(msg, book):
+        """
+        A new order is on the book.
+
+        Parameters
+        ----------
+        msg: dict
+        book: ob.OrderBook
+        """
+        BtOrderBook._set_order(msg, book)
+
+    @staticmethod
+    def change_order(msg, book):
+        """
+        An order was partially filled. `amount` is the amount left.
+
+        Parameters
+        ----------
+        msg: dict
+        book: ob.OrderBook
+        """
+        BtOrderBook._set_order(msg, book)
+
+    @staticmethod
+    def delete_order(msg, book):
+        """
+        An order was filled or cancelled.
+
+        Parameters
+        ----------
+        msg: dict
+        book: ob.OrderBook
+        """
+        order_id = msg['id']
+        if order_id in book.orders:
+            book.update(order_id, 0)
@@ -0,0 +1,196 @@
+from __future__ import division
+
+
+class DepthIndex(object):
+    def __init__(self, side, tick_size, bits=16):
+        """
+        Cumulative depth of one side of the book. Level sizes and notionals (price * size) are kept in two binary
+        indexed trees over price ticks, ordered from the best price, so that the size or notional up to a price and
+        the price at which the cumulative size reaches a target are answered in O(log n) without walking levels.
+
+        The trees are stored in dicts so only the ticks that had a level use memory. They cover 2 ** bits ticks from
+        `_base` and are rebuilt with more bits when a price falls outside. Prices must be on the tick grid.
+
+        Parameters
+        ----------
+        side: str
+            buy or sell
+        tick_size: float or int
+            minimum price increment, an int for fixed point prices
+        bits: int
+            log2 of the initial number of ticks covered
+        """
+        self.side = side
+        self.tick_size = tick_size
+        self._sign = -1 if side == 'buy' else 1
+        self._bits = bits
+        self._base = None  # key of the first tick
+        self._sizes = {}  # dict[key, level size]
+        self._prices = {}  # dict[key, level price]
+        self._size_tree = {}
+        self._notional_tree = {}
+        self.size = 0
+        self.notional = 0
+
+    def _key(self, price):
+        # the best price has the smallest key on both sides
+        return self._sign * int(round(price / self.tick_size))
+
+    def set(self, price, size):
+        """
+        Set the size of the level at price, 0 for a removed level
+        """
+        key = self._key(price)
+        num_ticks = 1 << self._bits
+        if self._base is None:
+            self._base = key - num_ticks // 4
+        elif not 0 <= key - self._base < num_ticks:
+            self._grow(key)
+            num_ticks = 1 << self._bits
+
+        old_size = self._sizes.get(key, 0)
+        if size:
+            self._sizes[key] = size
+            self._prices[key] = price
+        elif key in self._sizes:
+            del self._sizes[key]
+            del self._prices[key]
+        size_delta = size - old_size
+        notional_delta = price * size_delta
+        self.size += size_delta
+        self.notional += notional_delta
+
+        size_tree = self._size_tree
+        notional_tree = self._notional_tree
+        idx = key - self._base + 1
+        while idx <= num_ticks:
+            size_tree[idx] = size_tree.get(idx, 0) + size_delta
+            notional_tree[idx] = notional_tree.get(idx, 0) + notional_delta
+            idx += idx & -idx
+
+    def reset(self, levels):
+        """
+        Rebuild the index from a side of the book
+        """
+        self._base = None
+        self._sizes = {}
+        self._prices = {}
+        self._size_tree = {}
+        self._notional_tree = {}
+        self.size = 0
+        self.notional = 0
+        for level in levels:
+            self.set(level.price, level.size)
+
+    def _grow(self, key):
+        """
+        Cover `key` and the current ticks, then re-insert the levels
+        """
+        low = min(key, self._base)
+        high = max(key, self._base + (1 << self._bits) - 1)
+        self._bits = max(self._bits, (high - low).bit_length() + 1)
+        levels = [(self._prices[level_key], size) for level_key, size in self._sizes.iteritems()]
+        self._base = low - ((1 << self._bits) - (high - low)) // 2
+        self._sizes = {}
+        self._prices = {}
+        self._size_tree = {}
+        self._notional_tree = {}
+        self.size = 0
+        self.notional = 0
+        for price, size in levels:
+            self.set(price, size)
+
+    def _prefix(self, key):
+        """
+        Size and notional of the levels with a key <= `key`
+        """
+        if self._base is None or key < self._base:
+            return 0, 0
+        idx = key - self._base + 1
+        if idx >= 1 << self._bits:
+            return self.size, self.notional
+        size_tree = self._size_tree
+        notional_tree = self._notional_tree
+        size = notional = 0
+        while idx > 0:
+            size += size_tree.get(idx, 0)
+            notional += notional_tree.get(idx, 0)
+            idx -= idx & -idx
+        return size, notional
+
+    def _search(self, size):
+        """
+        Key of the level at which the cumulative size reaches `size` and the size and notional of the levels before
+        it, or None if the side has less than `size`
+        """
+        if self._base is None or size > self.size or size <= 0:
+            return None
+        size_tree = self._size_tree
+        notional_tree = self._notional_tree
+        idx = 0
+        size_before = notional_before = 0
+        step = 1 << self._bits
+        while step:
+            node_size = size_tree.get(idx + step, 0)
+            if size_before + node_size < size:
+                idx += step
+                size_before += node_size
+                notional_before += notional_tree.get(idx, 0)
+            step >>= 1
+        if idx >= 1 << self._bits:
+            # rounding left a total just short of `size`
+            return None
+        return self._base + idx, size_before, notional_before
+
+    def get_cumulative_size(self, price):
+        """
+        Total size of the levels at `price` or better
+        """
+        return self._prefix(self._key(price))[0]
+
+    def get_cumulative_notional(self, price):
+        """
+        Total price * size of the levels at `price` or better
+        """
+        return self._prefix(self._key(price))[1]
+
+    def get_price_for_size(self, size):
+        """
+        Price of the level at which the cumulative size from the best price reaches `size` or None if the side is
+        not deep enough
+        """
+        result = self._search(size)
+        return None if result is None else self._prices[result[0]]
+
+    def get_vwap(self, size):
+        """
+        Average price paid to take `size` from the best price or None if the side is not deep enough
+        """
+        result = self._search(size)
+        if result is None:
+            return None
+        key, size_before, notional_before = result
+        return (notional_before + self._prices[key] * (size - size_before)) / size
+
+    def copy(self):
+        result = DepthIndex(self.side, self.tick_size, bits=self._bits)
+        result._base = self._base
+        result._sizes = self._sizes.copy()
+        result._prices = self._prices.copy()
+        result._size_tree = self._size_tree.copy()
+        result._notional_tree = self._notional_tree.copy()
+        result.size = self.size
+        result.notional = self.notional
+        return result
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __eq__(self, other):
+        return self.side == other.side and self._sizes == other._sizes and self._prices == other._prices
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'DepthIndex({}, size={}, levels={})'.format(self.side, self.size, len(self))
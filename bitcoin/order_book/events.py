@@ -0,0 +1,109 @@
+"""
+Top of book change events.
+
+BookEvents compares the top of a book with the last state it saw after every message and calls the subscribers of
+each kind of event that changed. Only the kinds that have subscribers are checked, and the checks read the level 2
+views of the book (see TopLevels), so a message that does not change a view is skipped by comparing its version.
+
+Event kinds are the namedtuples below:
+    BestPrice: the best bid or ask price changed
+    BestSize: the size of the best bid or ask level changed, including when the best price changed
+    TopDepth: the prices or sizes of the best `depth` levels of a side changed. depth_hash identifies the state
+Prices and sizes are in the units of the book, i.e. integers for fixed point books. price is None for an empty side.
+The first check after subscribing emits the current state.
+"""
+from collections import namedtuple
+
+
+BestPrice = namedtuple('BestPrice', ['side', 'price', 'sequence'])
+BestSize = namedtuple('BestSize', ['side', 'price', 'size', 'sequence'])
+TopDepth = namedtuple('TopDepth', ['side', 'depth_hash', 'sequence'])
+KINDS = [BestPrice, BestSize, TopDepth]
+SIDES = ['buy', 'sell']
+
+
+class BookEvents(object):
+    def __init__(self, depth=5):
+        """
+        Parameters
+        ----------
+        depth: int
+            number of levels covered by TopDepth events
+        """
+        self.depth = depth
+        self._callbacks = {kind: [] for kind in KINDS}
+        self._last = {}  # dict[(kind, side), last value]
+        self._seen = {}  # dict[side, (TopLevels, version)] of the last check
+
+    def subscribe(self, kind, callback):
+        """
+        Call `callback(event)` for every event of a kind
+
+        Parameters
+        ----------
+        kind: type
+            BestPrice, BestSize or TopDepth
+        callback: function
+        """
+        assert kind in self._callbacks, 'Invalid event kind: {}'.format(kind)
+        self._callbacks[kind].append(callback)
+        self._seen = {}
+
+    def unsubscribe(self, kind, callback):
+        self._callbacks[kind].remove(callback)
+        self._last = {key: value for key, value in self._last.iteritems() if self._callbacks[key[0]]}
+
+    def _changed(self, kind, side, value):
+        """
+        Is `value` different from the last value of the kind and side
+        """
+        key = kind, side
+        last = self._last
+        if key in last and last[key] == value:
+            return False
+        last[key] = value
+        return True
+
+    def _emit(self, event):
+        for callback in self._callbacks[type(event)]:
+            callback(event)
+
+    def check(self, book):
+        """
+        Emit the events for the changes since the last check. Call after every message applied to the book.
+
+        Parameters
+        ----------
+        book: OrderBook
+        """
+        callbacks = self._callbacks
+        best_price, best_size, top_depth = callbacks[BestPrice], callbacks[BestSize], callbacks[TopDepth]
+        if not (best_price or best_size or top_depth):
+            return
+        sequence = book.sequence
+
+        for side in SIDES:
+            top = book.top_bids if side == 'buy' else book.top_asks
+            if top is not None:
+                seen = self._seen.get(side)
+                if seen is not None and seen[0] is top and seen[1] == top.version:
+                    continue
+                self._seen[side] = top, top.version
+                price, size = (top.prices[0].item(), top.sizes[0].item()) if len(top) else (None, None)
+            else:
+                levels = book.bids if side == 'buy' else book.asks
+                price, size = (levels[0].price, levels[0].size) if len(levels) else (None, None)
+
+            if best_price and self._changed(BestPrice, side, price):
+                self._emit(BestPrice(side, price, sequence))
+            if best_size and self._changed(BestSize, side, (price, size)):
+                self._emit(BestSize(side, price, size, sequence))
+            if top_depth:
+                if top is not None and top.depth >= self.depth:
+                    prices, sizes, _ = top.to_arrays(self.depth)
+                    depth_hash = hash((prices.tostring(), sizes.tostring()))
+                else:
+                    levels = book.bids if side == 'buy' else book.asks
+                    depth_hash = hash(tuple((level.price, level.size) for level in levels[:self.depth]))
+                if self._changed(TopDepth, side, depth_hash):
+                    self._emit(TopDepth(side, depth_hash, sequence))
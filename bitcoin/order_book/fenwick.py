@@ -0,0 +1,61 @@
+from array import array
+
+
+class FenwickTree(object):
+    __slots__ = ('_tree',)
+
+    def __init__(self, values=(), typecode='d'):
+        """
+        Binary indexed tree over a list of values. Changing a value and summing a prefix of the values both take
+        O(log n), appending a value takes O(log n) and building the tree takes O(n).
+
+        Parameters
+        ----------
+        values: sequence
+        typecode: str
+            array typecode of the sums, 'l' for fixed point sizes
+        """
+        tree = array(typecode, [0])
+        tree.extend(values)
+        num_values = len(tree) - 1
+        for idx in xrange(1, num_values + 1):
+            parent = idx + (idx & -idx)
+            if parent <= num_values:
+                tree[parent] += tree[idx]
+        self._tree = tree  # 1-indexed, tree[idx] is the sum of values (idx - lowbit(idx), idx]
+
+    def add(self, idx, delta):
+        """
+        Add delta to the value at idx
+        """
+        tree = self._tree
+        num_values = len(tree) - 1
+        idx += 1
+        while idx <= num_values:
+            tree[idx] += delta
+            idx += idx & -idx
+
+    def append(self, value):
+        tree = self._tree
+        idx = len(tree)
+        # the new node also covers the values (idx - lowbit(idx), idx)
+        stop = idx - (idx & -idx)
+        child = idx - 1
+        while child > stop:
+            value += tree[child]
+            child -= child & -child
+        tree.append(value)
+
+    def prefix_sum(self, idx):
+        """
+        Sum of the first idx values
+        """
+        tree = self._tree
+        total = 0
+        while idx > 0:
+            total += tree[idx]
+            idx -= idx & -idx
+        return total
+
+    def __len__(self):
+        return len(self._tree) - 1
@@ -1,26 +1,166 @@
+from collections import deque
+from itertools import izip
+
+import numpy as np
+import pandas as pd
+
+import bitcoin.order_book.batch as batch
 import bitcoin.order_book.order_book as ob
+import bitcoin.order_book.order_index as order_index
 import bitcoin.util as util
 
 
+MODES = ['strict', 'trusted']
+
+
+class BookError(AssertionError):
+    """
+    A message that is inconsistent with the book, raised by GdaxOrderBook in strict mode before the book is changed.
+    It is an AssertionError so code that handled the previous asserts still works.
+    """
+    def __init__(self, check, msg, expected=None, actual=None):
+        """
+        Parameters
+        ----------
+        check: str
+            name of the failed check e.g. price, size, side, sequence, unknown_order, duplicate_order, type
+        msg: dict
+            parsed message
+        expected:
+            value from the book
+        actual:
+            value from the message
+        """
+        self.check = check
+        self.sequence = msg.get('sequence')
+        self.type = msg.get('type')
+        self.order_id = msg.get('maker_order_id') if self.type == 'match' else msg.get('order_id')
+        self.expected = expected
+        self.actual = actual
+        super(BookError, self).__init__('{} message {} failed {} check for order {}: expected {}, got {}'.format(
+            self.type, self.sequence, check, self.order_id, expected, actual)
+        )
+
+    def to_dict(self):
+        """
+        Report of the error e.g. for logs
+
+        Returns
+        -------
+        dict
+            keys: [check, sequence, type, order_id, expected, actual]
+        """
+        return {'check': self.check, 'sequence': self.sequence, 'type': self.type, 'order_id': self.order_id,
+                'expected': self.expected, 'actual': self.actual}
+
+
 class GdaxOrderBook(ob.OrderBook):
     """
     Processes GDAX messages to maintain an order book.
     """
-    def __init__(self, sequence, bids=None, asks=None, timestamp=None):
-        super(GdaxOrderBook, self).__init__(sequence=sequence, bids=bids, asks=asks, timestamp=timestamp)
+    def __init__(self, sequence, bids=None, asks=None, timestamp=None, max_undo=0, mode='strict', **kwargs):
+        """
+        Parameters
+        ----------
+        max_undo: int
+            number of messages kept in the undo log, see rewind. 0 disables the log.
+        mode: str
+            strict: every message is checked against the book (see validate) and a BookError is raised before an
+                inconsistent message is applied
+            trusted: no checks, for replaying stored messages that were already verified. An inconsistent message
+                corrupts the book or raises an arbitrary error.
+            Both modes build the same book from consistent messages.
+        kwargs:
+            see OrderBook
+        """
+        assert mode in MODES, 'Invalid mode: {}'.format(mode)
+        super(GdaxOrderBook, self).__init__(sequence=sequence, bids=bids, asks=asks, timestamp=timestamp, **kwargs)
+        self.mode = mode
         # dict[order id, time str]. timestamp is used in backtester to match orders
         self.order_to_time = {}
         self.exchange = 'GDAX'
+        # deque of (sequence, timestamp, order_id, order_time, ops) with the book state before each message
+        self.undo_log = deque(maxlen=max_undo) if max_undo else None
+
+    def clone(self):
+        book = super(GdaxOrderBook, self).clone()
+        order_to_time = self.order_to_time
+        self.order_to_time, book.order_to_time = order_index.share(order_to_time), order_index.share(order_to_time)
+        if self.undo_log is not None:
+            book.undo_log = deque(self.undo_log, maxlen=self.undo_log.maxlen)
+        return book
+
+    def _own_order_times(self):
+        """
+        Replace order_to_time of a clone by a dict once it has merged its changes, see OrderBook._own_orders. Only
+        called between messages since apply_batch keeps a reference to it.
+        """
+        if self.order_to_time.owned:
+            self.order_to_time = self.order_to_time.merge()
+
+    def _log_message(self, order_id=None):
+        """
+        Start an undo log entry for a message. Changes to the book are added to the entry until the next message.
+
+        Parameters
+        ----------
+        order_id: str
+            order whose order_to_time entry is changed by the message
+        """
+        order_time = None if order_id is None else self.order_to_time.get(order_id)
+        self._undo_ops = []
+        self.undo_log.append((self.sequence, self.timestamp, order_id, order_time, self._undo_ops))
+
+    def rewind(self, n=1):
+        """
+        Undo the last n messages using the undo log. Messages skipped by apply_batch (received, heartbeat) are
+        not in the log.
+        """
+        assert self.undo_log is not None, 'Undo log is not enabled'
+        assert n <= len(self.undo_log), 'Only {} messages can be undone'.format(len(self.undo_log))
+        self._undo_ops = None
+
+        for _ in range(n):
+            sequence, timestamp, order_id, order_time, ops = self.undo_log.pop()
+            self._undo(ops)
+            self.sequence = sequence
+            self.timestamp = timestamp
+            if order_id is not None:
+                if order_time is None:
+                    self.order_to_time.pop(order_id, None)
+                else:
+                    self.order_to_time[order_id] = order_time
+
+    def rewind_to(self, sequence):
+        """
+        Undo messages until the book is at or before `sequence`
+        """
+        assert self.undo_log is not None, 'Undo log is not enabled'
+        num_messages = 0
+        current = self.sequence
+        for entry in reversed(self.undo_log):
+            if current <= sequence:
+                break
+            num_messages += 1
+            current = entry[0]
+        self.rewind(num_messages)
+        assert self.sequence <= sequence, 'Cannot rewind to {}, oldest sequence is {}'.format(sequence, self.sequence)
 
     def process_message(self, msg, book=None):
         book = book or self
+        if self.mode == 'trusted':
+            return self._process_trusted(msg, book)
         sequence = int(msg['sequence'])
 
         if sequence <= book.sequence:
             return
-        assert sequence <= book.sequence + 2, '{} != {} + 2'.format(sequence, book.sequence)
+        if sequence > book.sequence + 2:
+            raise BookError('sequence', msg, expected=book.sequence + 1, actual=sequence)
 
+        self.validate(msg, book)
         _type = msg['type']
+        if book.undo_log is not None:
+            book._log_message(msg['order_id'] if _type == 'open' or _type == 'done' else None)
         if _type == 'open':
             self.open_order(msg, book)
             self.order_to_time[msg['order_id']] = msg['time']
@@ -34,13 +174,222 @@ class GdaxOrderBook(ob.OrderBook):
 
         elif _type == 'change':
             self.change_order(msg, book)
-        elif _type == 'received' or _type == 'heartbeat':
-            pass
-        else:
-            assert _type == 'error'
 
-        book.sequence = int(msg['sequence'])
+        book.sequence = sequence
+        book.timestamp = msg['time']
+        book._undo_ops = None
+        if type(self.order_to_time) is not dict:
+            self._own_order_times()
+
+    def _process_trusted(self, msg, book):
+        """
+        process_message without checks, see `mode`
+        """
+        sequence = msg['sequence']
+        if sequence <= book.sequence:
+            return
+
+        _type = msg['type']
+        if book.undo_log is not None:
+            book._log_message(msg['order_id'] if _type == 'open' or _type == 'done' else None)
+        if _type == 'open':
+            order_id = msg['order_id']
+            book.add(msg['side'], msg['price'], msg['remaining_size'], order_id)
+            self.order_to_time[order_id] = msg['time']
+
+        elif _type == 'done':
+            order_id = msg['order_id']
+            if order_id in book.orders:
+                book.update(order_id, 0)
+            self.order_to_time.pop(order_id, None)
+
+        elif _type == 'match':
+            order_id = msg['maker_order_id']
+            book.update(order_id, book.orders[order_id].get_size(order_id) - msg['size'])
+
+        elif _type == 'change':
+            self.change_order(msg, book)
+
+        book.sequence = sequence
         book.timestamp = msg['time']
+        book._undo_ops = None
+        if type(self.order_to_time) is not dict:
+            self._own_order_times()
+
+    @staticmethod
+    def validate(msg, book):
+        """
+        Check that a message is consistent with the book before it is applied. Messages for orders that are not on
+        the book (done, and change of received orders) are valid, see done_order and change_order.
+
+        Raises
+        ------
+        BookError
+        """
+        _type = msg['type']
+        if _type == 'open':
+            order_id = msg['order_id']
+            if order_id in book.orders:
+                raise BookError('duplicate_order', msg, actual=order_id)
+            if msg.get('side') not in batch.SIDES:
+                raise BookError('side', msg, expected=batch.SIDES, actual=msg.get('side'))
+            if not msg.get('price', 0) > 0:
+                raise BookError('price', msg, expected='> 0', actual=msg.get('price'))
+            if not msg.get('remaining_size', 0) > 0:
+                raise BookError('size', msg, expected='> 0', actual=msg.get('remaining_size'))
+
+        elif _type == 'done':
+            level = book.orders.get(msg['order_id'])
+            if level is not None:
+                GdaxOrderBook._validate_order(msg, level, msg.get('price'))
+
+        elif _type == 'match':
+            order_id = msg['maker_order_id']
+            level = book.orders.get(order_id)
+            if level is None:
+                raise BookError('unknown_order', msg, actual=order_id)
+            GdaxOrderBook._validate_order(msg, level, msg['price'])
+            old_size = level.get_size(order_id)
+            if not util.is_less(msg['size'], old_size):
+                raise BookError('size', msg, expected='<= {}'.format(old_size), actual=msg['size'])
+
+        elif _type == 'change':
+            order_id = msg['order_id']
+            level = book.orders.get(order_id)
+            new_size = msg.get('new_size')
+            if level is not None and msg.get('price') and new_size:
+                GdaxOrderBook._validate_order(msg, level, msg['price'])
+                # orders can only decrease in size
+                old_size = level.get_size(order_id)
+                if not util.is_less(new_size, old_size):
+                    raise BookError('size', msg, expected='<= {}'.format(old_size), actual=new_size)
+
+        elif _type not in ('received', 'heartbeat', 'error'):
+            raise BookError('type', msg, actual=_type)
+
+    @staticmethod
+    def _validate_order(msg, level, price):
+        """
+        Check the side and price of a message against the level of its order. price is not checked when it is None.
+        """
+        if 'side' in msg and msg['side'] != level.side:
+            raise BookError('side', msg, expected=level.side, actual=msg['side'])
+        if price is not None and not util.is_close(price, level.price):
+            raise BookError('price', msg, expected=level.price, actual=price)
+
+    def apply_batch(self, columns, start=0, end_sequence=None, end_time=None):
+        """
+        Apply a batch of messages, see `order_book.batch`. Rows that do not change the book (received, heartbeat)
+        are skipped up front and the rest are applied in a single loop.
+
+        Rows are applied from `start` until the first row after `end_sequence` or `end_time`, or the first row
+        that skips more than one sequence number, which process_message rejects too. Rows at or before the book
+        sequence are ignored. Times are stored as np.datetime64 like process_message stores parsed message times.
+        In strict mode every applied row is checked like a message, see validate.
+
+        Parameters
+        ----------
+        columns: dict[str, np.array]
+        start: int
+            first row to apply
+        end_sequence: int
+            apply rows with sequence <= end_sequence
+        end_time: pd.datetime
+            apply rows with time <= end_time
+
+        Returns
+        -------
+        int
+            index of the first row not applied, len(sequence) if all rows were applied
+        """
+        sequences = columns['sequence']
+        times = columns['time']
+
+        # rows to apply
+        start = max(start, np.searchsorted(sequences, self.sequence, side='right'))
+        stop = len(sequences)
+        if end_sequence is not None:
+            stop = min(stop, np.searchsorted(sequences, end_sequence, side='right'))
+        if end_time is not None:
+            stop = min(stop, np.searchsorted(times, np.datetime64(pd.Timestamp(end_time)), side='right'))
+        if start >= stop:
+            return start
+
+        # stop at the first gap that process_message does not accept
+        previous = np.r_[self.sequence, sequences[start:stop - 1]]
+        gaps = np.flatnonzero(sequences[start:stop] - previous > 2)
+        if len(gaps):
+            stop = start + gaps[0]
+            if start == stop:
+                return start
+
+        # skip rows that do not change the book
+        types = columns['type'][start:stop]
+        rows = np.flatnonzero((types >= batch.OPEN) & (types <= batch.CHANGE)) + start
+        order_ids = columns['order_ids']
+        orders = self.orders
+        order_to_time = self.order_to_time
+        sides = batch.SIDES
+        undo_log = self.undo_log
+        strict = self.mode == 'strict'
+        # only the applied rows are converted so that applying a window of a large batch costs the window
+        row_times = list(times[rows].astype('datetime64[us]'))
+
+        for sequence, code, side, price, size, order, time in izip(sequences[rows].tolist(),
+                                                                   columns['type'][rows].tolist(),
+                                                                   columns['side'][rows].tolist(),
+                                                                   columns['price'][rows].tolist(),
+                                                                   columns['size'][rows].tolist(),
+                                                                   columns['order'][rows].tolist(),
+                                                                   row_times):
+            order_id = order_ids[order]
+            if strict:
+                self.validate(self._row_message(sequence, code, side, price, size, order_id), self)
+            if undo_log is not None:
+                self._log_message(order_id if code == batch.OPEN or code == batch.DONE else None)
+                self.sequence = sequence
+                self.timestamp = time
+
+            if code == batch.OPEN:
+                self.add(sides[side], price, size, order_id)
+                order_to_time[order_id] = time
+
+            elif code == batch.DONE:
+                if order_id in orders:
+                    self.update(order_id, 0)
+                order_to_time.pop(order_id, None)
+
+            elif code == batch.MATCH:
+                self.update(order_id, orders[order_id].get_size(order_id) - size)
+
+            elif order_id in orders and price > 0 and size:
+                # change, market orders have no price: NaN or 0 in fixed point batches
+                self.update(order_id, size)
+
+        self.sequence = int(sequences[stop - 1])
+        self.timestamp = times[stop - 1].astype('datetime64[us]')
+        self._undo_ops = None
+        if type(self.order_to_time) is not dict:
+            self._own_order_times()
+        return stop
+
+    @staticmethod
+    def _row_message(sequence, code, side, price, size, order_id):
+        """
+        Message with the fields of a batch row that validate checks
+        """
+        msg = {'sequence': sequence, 'type': batch.TYPES[code], 'side': batch.SIDES[side],
+               'price': price if price > 0 else None}
+        if code == batch.MATCH:
+            msg['maker_order_id'] = order_id
+            msg['size'] = size
+        else:
+            msg['order_id'] = order_id
+            if code == batch.OPEN:
+                msg['remaining_size'] = size
+            elif code == batch.CHANGE:
+                msg['new_size'] = size
+        return msg
 
     @staticmethod
     def open_order(msg, book):
@@ -135,14 +484,11 @@ class GdaxOrderBook(ob.OrderBook):
         }
         book: ob.OrderBook
         """
-        price = msg['price']
         trade_size = msg['size']
         order_id = msg['maker_order_id']
 
         # get original order size
-        old_price, old_size, order_id = book.get(order_id)
-        assert util.is_close(price, old_price), '{} == {}'.format(price, old_price)
-        assert util.is_less(trade_size, old_size), '{} <= {}'.format(trade_size, old_size)
+        old_size = book.orders[order_id].get_size(order_id)
 
         # update order to new size
         new_size = old_size - trade_size
@@ -189,5 +535,4 @@ class GdaxOrderBook(ob.OrderBook):
         if order_id not in book.orders or not price or not new_size:
             return
 
-        result = book.update(order_id, new_size)
-        assert price == result[0], '{} == {}'.format(price, result[0])
+        book.update(order_id, new_size)
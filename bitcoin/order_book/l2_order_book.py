@@ -0,0 +1,350 @@
+"""
+Level 2 order book driven by the GDAX level2 channel.
+
+The level2 channel sends a snapshot of the aggregated book followed by l2update messages with the new size of every
+level that changed:
+
+    {"type": "snapshot", "product_id": "BTC-USD", "bids": [["10000.01", "1.5"]], "asks": [["10000.02", "0.3"]]}
+    {"type": "l2update", "product_id": "BTC-USD", "time": "2017-12-01T00:00:00.123Z",
+     "changes": [["buy", "10000.01", "0.5"], ["sell", "10000.02", "0"]]}
+
+L2OrderBook keeps only price -> size per side, so it needs a fraction of the memory and work of a level 3 book, and
+has the level 2 read methods of OrderBook (see BookReads) for strategies that only need aggregated depth. Feeds can
+be recorded to JSON lines files (see GdaxL2WebSocket) and replayed with load_feed, and l3_to_l2_feed derives a level2
+feed from full channel messages to test the book against GdaxOrderBook.
+"""
+import json
+
+import numpy as np
+from sortedcontainers import SortedList
+
+import bitcoin.params as pms
+import bitcoin.util as util
+from depth_index import DepthIndex
+from order_book import BookReads
+from top_levels import TopLevels
+
+
+def parse_message(msg, fixed_point=False):
+    """
+    Convert the prices and sizes of a level2 channel message to floats or fixed point integers
+
+    Parameters
+    ----------
+    msg: dict
+    fixed_point: bool
+        see util.to_fixed
+
+    Returns
+    -------
+    dict
+        snapshot: type, product_id, bids and asks as (price, size) tuples
+        l2update: type, product_id, time and changes as (side, price, size) tuples
+        other messages are returned as they are
+    """
+    to_number = util.to_fixed if fixed_point else float
+    msg_type = msg.get('type')
+    if msg_type == 'snapshot':
+        result = {key: [(to_number(price), to_number(size)) for price, size in msg[key]] for key in ['bids', 'asks']}
+    elif msg_type == 'l2update':
+        result = {'changes': [(side, to_number(price), to_number(size)) for side, price, size in msg['changes']]}
+        if msg.get('time'):
+            result['time'] = np.datetime64(msg['time'])
+    else:
+        return msg
+    result['type'] = msg_type
+    result['product_id'] = msg.get('product_id')
+    return result
+
+
+def load_feed(path, fixed_point=False):
+    """
+    Parsed messages of a level2 feed recorded as one JSON message per line
+    """
+    with open(path) as f:
+        return [parse_message(json.loads(line), fixed_point=fixed_point) for line in f if line.strip()]
+
+
+def l3_to_l2_feed(book, messages, product_id=pms.DEFAULT_PRODUCT):
+    """
+    Level2 channel messages equivalent to applying full channel messages to a level 3 book
+
+    Parameters
+    ----------
+    book: GdaxOrderBook
+        book the messages apply to. It is updated.
+    messages: list[dict]
+        parsed full channel messages
+    product_id: str
+
+    Returns
+    -------
+    generator of dict
+        unparsed level2 messages, a snapshot of the book first and then an l2update for every message that changed
+        the size of a level
+    """
+    def _format(value):
+        return '{:.8f}'.format(util.from_fixed(value)) if book.fixed_point else repr(value)
+
+    def _size(side, price):
+        level = book._get_levels_from_side(side).get(price)
+        return 0 if level is None else level.size
+
+    yield {'type': 'snapshot', 'product_id': product_id,
+           'bids': [[_format(level.price), _format(level.size)] for level in book.bids],
+           'asks': [[_format(level.price), _format(level.size)] for level in book.asks]}
+
+    for msg in messages:
+        # levels the message can change: its price and the levels of the orders it refers to
+        touched = set()
+        if 'price' in msg and 'side' in msg:
+            touched.add((msg['side'], msg['price']))
+        for field in ['order_id', 'maker_order_id']:
+            level = book.orders.get(msg.get(field))
+            if level is not None:
+                touched.add((level.side, level.price))
+        before = {key: _size(*key) for key in touched}
+
+        book.process_message(msg)
+        changes = []
+        for (side, price), old_size in sorted(before.iteritems()):
+            size = _size(side, price)
+            if size != old_size:
+                changes.append([side, _format(price), _format(size)])
+        if changes:
+            update = {'type': 'l2update', 'product_id': product_id, 'changes': changes}
+            if msg.get('time') is not None:
+                update['time'] = str(msg['time'])
+            yield update
+
+
+class L2Level(object):
+    """
+    Aggregated price level with the interface of PriceLevel used by the read methods
+    """
+    __slots__ = ['price', 'size']
+
+    def __init__(self, price, size):
+        self.price = price
+        self.size = size
+
+    def __len__(self):
+        # the number of orders is not known from level 2 data, each level counts as one order
+        return 1
+
+    def __eq__(self, other):
+        return self.price == other.price and self.size == other.size
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'L2Level({}, {})'.format(self.price, self.size)
+
+
+class L2Levels(object):
+    def __init__(self, side):
+        """
+        One side of a level 2 book: the size of each price and the prices sorted best first. Indexing and iterating
+        yield L2Level objects like the levels of OrderBook.
+
+        Parameters
+        ----------
+        side: str
+            buy or sell
+        """
+        self.side = side
+        self._sign = -1 if side == 'buy' else 1
+        self._keys = SortedList()  # sign * price so that the best price comes first
+        self.sizes = {}  # dict[price, size]
+
+    def get(self, price):
+        size = self.sizes.get(price)
+        return None if size is None else L2Level(price, size)
+
+    def set(self, price, size):
+        """
+        Set the size of the level at price, 0 removes the level
+
+        Returns
+        -------
+        float
+            previous size, 0 for a new level
+        """
+        sizes = self.sizes
+        old_size = sizes.get(price, 0)
+        if size:
+            if not old_size:
+                self._keys.add(self._sign * price)
+            sizes[price] = size
+        elif old_size:
+            del sizes[price]
+            self._keys.remove(self._sign * price)
+        return old_size
+
+    def reset(self, levels):
+        """
+        Replace the side with (price, size) rows
+        """
+        self.sizes = {price: size for price, size in levels if size}
+        self._keys = SortedList(self._sign * price for price in self.sizes)
+
+    def copy(self):
+        result = L2Levels(self.side)
+        result.sizes = self.sizes.copy()
+        result._keys = SortedList(self._keys)
+        return result
+
+    def _level(self, key):
+        price = self._sign * key
+        return L2Level(price, self.sizes[price])
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __nonzero__(self):
+        return bool(self.sizes)
+
+    def __iter__(self):
+        for key in self._keys:
+            yield self._level(key)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._level(key) for key in self._keys[idx]]
+        return self._level(self._keys[idx])
+
+    def __eq__(self, other):
+        return self.side == other.side and self.sizes == other.sizes
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'L2Levels({}, {})'.format(self.side, [(level.price, level.size) for level in self])
+
+
+class L2OrderBook(util.BaseObject, BookReads):
+    """
+    Processes GDAX level2 channel messages to maintain a level 2 order book.
+    """
+    def __init__(self, sequence=0, bids=None, asks=None, timestamp=None, tick_size=None, fixed_point=False,
+                 top_depth=None, depth_index=False):
+        """
+        The level2 channel has no sequence numbers, so `sequence` counts the messages applied to the book.
+
+        Parameters
+        ----------
+        sequence: int
+        bids: list
+            (price, size) rows in the units of the book
+        asks: list
+        timestamp: pd.datetime
+        tick_size: float
+        fixed_point: bool
+            prices and sizes are fixed point integers, messages must be parsed with `fixed_point=True`
+        top_depth: int
+            see OrderBook
+        depth_index: bool
+            see OrderBook
+        """
+        self.exchange = 'GDAX'
+        self.sequence = int(sequence)
+        self.timestamp = timestamp
+        self.tick_size = tick_size or pms.DEFAULT_TICK_SIZE
+        self.fixed_point = fixed_point
+        self.order_ids = None
+        self.bids = L2Levels('buy')
+        self.asks = L2Levels('sell')
+        self.top_depth = pms.DEFAULT_TOP_DEPTH if top_depth is None else top_depth
+        self.top_bids = None
+        self.top_asks = None
+        self.bid_depth = None
+        self.ask_depth = None
+
+        if self.top_depth:
+            dtype = np.int_ if fixed_point else np.float_
+            self.top_bids = TopLevels('buy', self.top_depth, dtype=dtype)
+            self.top_asks = TopLevels('sell', self.top_depth, dtype=dtype)
+        if depth_index:
+            tick_size = util.to_fixed(self.tick_size) if fixed_point else self.tick_size
+            self.bid_depth = DepthIndex('buy', tick_size)
+            self.ask_depth = DepthIndex('sell', tick_size)
+        self.reset(bids or [], asks or [])
+
+    def reset(self, bids, asks):
+        """
+        Replace the book with (price, size) rows of each side e.g. from a snapshot message
+        """
+        self.bids.reset(bids)
+        self.asks.reset(asks)
+        if self.top_bids is not None:
+            self.top_bids.reset(self.bids)
+            self.top_asks.reset(self.asks)
+        if self.bid_depth is not None:
+            self.bid_depth.reset(self.bids)
+            self.ask_depth.reset(self.asks)
+
+    def set(self, side, price, size):
+        """
+        Set the size of a level, 0 removes the level
+        """
+        levels = self._get_levels_from_side(side)
+        old_size = levels.set(price, size)
+        if old_size == size:
+            return
+
+        top = self.top_bids if side == 'buy' else self.top_asks
+        if top is not None:
+            if not old_size:
+                top.add(L2Level(price, size))
+            elif size:
+                top.update(L2Level(price, size))
+            else:
+                top.remove(L2Level(price, old_size), levels)
+        depth = self.bid_depth if side == 'buy' else self.ask_depth
+        if depth is not None:
+            depth.set(price, size)
+
+    def process_message(self, msg, book=None):
+        """
+        Apply a message parsed with `parse_message`. Snapshots replace the book.
+        """
+        book = book or self
+        msg_type = msg['type']
+        if msg_type == 'l2update':
+            for side, price, size in msg['changes']:
+                book.set(side, price, size)
+            book.timestamp = msg.get('time', book.timestamp)
+        elif msg_type == 'snapshot':
+            book.reset(msg['bids'], msg['asks'])
+        else:
+            return
+        book.sequence += 1
+
+    def clone(self):
+        """
+        Copy of the book that can be changed independently
+        """
+        book = L2OrderBook.__new__(L2OrderBook)
+        book.__dict__.update(self.__dict__)
+        book.bids = self.bids.copy()
+        book.asks = self.asks.copy()
+        if self.top_bids is not None:
+            book.top_bids = self.top_bids.copy()
+            book.top_asks = self.top_asks.copy()
+        if self.bid_depth is not None:
+            book.bid_depth = self.bid_depth.copy()
+            book.ask_depth = self.ask_depth.copy()
+        return book
+
+    def to_df(self, level_type=2, depth=None):
+        assert level_type == 2, 'Level 2 book'
+        return super(L2OrderBook, self).to_df(level_type, depth=depth)
+
+    def to_arrays(self, level_type=2, depth=None, out=None):
+        """
+        See OrderBook.to_arrays, count is 1 for every level
+        """
+        assert level_type == 2, 'Level 2 book'
+        return super(L2OrderBook, self).to_arrays(level_type, depth=depth, out=out)
@@ -0,0 +1,220 @@
+from __future__ import division
+
+from itertools import islice
+
+from sortedcontainers import SortedList
+
+
+class PriceLadder(object):
+    def __init__(self, side, tick_size, capacity=4096):
+        """
+        Price levels for one side of the book indexed by tick. Levels close to the best price live in a dense array
+        (the window) so lookups are a list index and the best level is always `window[best]`. Levels that are too far
+        from the best price to fit in the window are kept in a sorted overflow. The window is recentred whenever the
+        best price moves out of it.
+
+        Levels are keyed by `sign * tick` so that the best price always has the smallest key for both sides. The
+        class implements the parts of SortedListWithKey used on book sides i.e. add, remove, len, iteration, indexing
+        and bisect_left, so it can be used in place of one.
+
+        Parameters
+        ----------
+        side: str
+            buy or sell
+        tick_size: float or int
+            minimum price increment of the product, an int for fixed point prices
+        capacity: int
+            number of ticks in the window
+        """
+        self.side = side
+        self.tick_size = tick_size
+        self.capacity = capacity
+        self._sign = -1 if side == 'buy' else 1
+        self._window = [None] * capacity
+        self._base = None  # key of window[0]
+        self._best = capacity  # index of the best level in the window or capacity if the window is empty
+        self._num_window = 0
+        self._overflow_keys = SortedList()  # keys >= base + capacity
+        self._overflow = {}  # dict[key, PriceLevel]
+
+    def _key(self, price):
+        return self._sign * int(round(price / self.tick_size))
+
+    def get(self, price):
+        """
+        Get PriceLevel at price or None
+        """
+        if self._base is None:
+            return None
+        key = self._key(price)
+        idx = key - self._base
+        if 0 <= idx < self.capacity:
+            level = self._window[idx]
+        else:
+            level = self._overflow.get(key)
+        if level is not None and level.price != price:
+            raise ValueError('Price {} is not on the tick grid {}'.format(price, self.tick_size))
+        return level
+
+    def add(self, level):
+        """
+        Add a new PriceLevel. There must not be a level at the same price.
+        """
+        key = self._key(level.price)
+        if not self:
+            self._recentre(key)
+        elif key < self._base:
+            # new best price before the window
+            self._recentre(key)
+
+        idx = key - self._base
+        if idx < self.capacity:
+            assert self._window[idx] is None, 'Level {} already exists'.format(level.price)
+            self._window[idx] = level
+            self._num_window += 1
+            if idx < self._best:
+                self._best = idx
+        else:
+            assert key not in self._overflow, 'Level {} already exists'.format(level.price)
+            self._overflow_keys.add(key)
+            self._overflow[key] = level
+
+    def remove(self, level):
+        """
+        Remove an existing PriceLevel.
+        """
+        key = self._key(level.price)
+        idx = key - self._base
+        if 0 <= idx < self.capacity:
+            if self._window[idx] is None:
+                raise ValueError('{} not in ladder'.format(level.price))
+            self._window[idx] = None
+            self._num_window -= 1
+            if idx == self._best:
+                self._best = self._next_best(idx)
+            if not self._num_window and self._overflow_keys:
+                # window is empty, move it to the overflow
+                self._recentre(self._overflow_keys[0])
+        else:
+            if key not in self._overflow:
+                raise ValueError('{} not in ladder'.format(level.price))
+            self._overflow_keys.remove(key)
+            del self._overflow[key]
+
+    def replace(self, old, new):
+        """
+        Replace a level with another level at the same price
+        """
+        key = self._key(old.price)
+        idx = key - self._base
+        if 0 <= idx < self.capacity:
+            assert self._window[idx] is old
+            self._window[idx] = new
+        else:
+            assert self._overflow[key] is old
+            self._overflow[key] = new
+
+    def copy(self):
+        """
+        Copy of the ladder that shares the PriceLevel objects
+        """
+        ladder = PriceLadder(self.side, self.tick_size, capacity=0)
+        ladder.capacity = self.capacity
+        ladder._window = self._window[:]
+        ladder._base = self._base
+        ladder._best = self._best
+        ladder._num_window = self._num_window
+        ladder._overflow_keys = self._overflow_keys.copy()
+        ladder._overflow = self._overflow.copy()
+        return ladder
+
+    def _next_best(self, idx):
+        """
+        Index of the first level in the window after idx or capacity
+        """
+        window = self._window
+        capacity = self.capacity
+        idx += 1
+        while idx < capacity and window[idx] is None:
+            idx += 1
+        return idx
+
+    def _recentre(self, best_key):
+        """
+        Move the window so that `best_key` is a quarter of the way into it. Levels that no longer fit go to the
+        overflow and overflow levels that now fit move into the window.
+        """
+        levels = [level for level in self._window if level is not None]
+        self._base = best_key - self.capacity // 4
+        self._window = [None] * self.capacity
+        self._best = self.capacity
+        self._num_window = 0
+        end = self._base + self.capacity
+
+        # move overflow levels into the window
+        while self._overflow_keys and self._overflow_keys[0] < end:
+            key = self._overflow_keys.pop(0)
+            levels.append(self._overflow.pop(key))
+
+        for level in levels:
+            key = self._key(level.price)
+            if key < end:
+                idx = key - self._base
+                self._window[idx] = level
+                self._num_window += 1
+                self._best = min(self._best, idx)
+            else:
+                self._overflow_keys.add(key)
+                self._overflow[key] = level
+
+    def __len__(self):
+        return self._num_window + len(self._overflow_keys)
+
+    def __nonzero__(self):
+        return self._num_window > 0 or bool(self._overflow_keys)
+
+    def __iter__(self):
+        """
+        Iterate over levels from the best price
+        """
+        for level in islice(self._window, self._best, None):
+            if level is not None:
+                yield level
+        for key in self._overflow_keys:
+            yield self._overflow[key]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            assert step == 1, 'Only contiguous slices are supported'
+            return list(islice(self, start, max(start, stop)))
+
+        if idx < 0:
+            idx += len(self)
+        if idx == 0 and self._num_window:
+            return self._window[self._best]
+        if not 0 <= idx < len(self):
+            raise IndexError('PriceLadder index out of range')
+        return next(islice(self, idx, None))
+
+    def bisect_left(self, level):
+        """
+        Number of levels with a better price than `level.price`
+        """
+        key = self._key(level.price)
+        if not self or key < self._base:
+            return 0
+        idx = min(key - self._base, self.capacity)
+        count = sum(1 for l in islice(self._window, self._best, idx) if l is not None)
+        count += self._overflow_keys.bisect_left(key)
+        return count
+
+    def __eq__(self, other):
+        # the window placement depends on the order of changes, only the levels are compared
+        return self.side == other.side and len(self) == len(other) and list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'PriceLadder({}, {})'.format(self.side, list(self))
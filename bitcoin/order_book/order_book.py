@@ -1,148 +1,162 @@
+import copy
+import itertools
+import operator
+
+import numpy as np
 import pandas as pd
 
 from sortedcontainers import SortedListWithKey
+import bitcoin.params as pms
 import bitcoin.util as util
+from depth_index import DepthIndex
+from ladder import PriceLadder
+import order_index
 from price_level import PriceLevel
+from top_levels import TopLevels
 
 
-class OrderBook(util.BaseObject):
-    def __init__(self, sequence, bids=None, asks=None, timestamp=None):
-        """
-        Bids and asks are sorted lists of PriceLevel objects. Each PriceLevel corresponds to a price and contains
-        all the orders for that price. The class also maintains a mapping of order_id to price. The can be used to get
-        the corresponding PriceLevel for a given order_id.
+ENGINES = ['sorted', 'ladder']
+_owner_tokens = itertools.count()  # unique book tokens, see OrderBook.clone
+_COW_FIELDS = ['_owner', '_undo_ops']  # attributes ignored by OrderBook.__eq__
 
-        The add, remove and update methods return (price, new_size, order_id).
+# undo log operations, see OrderBook._undo
+_ADD = 0  # (_ADD, order_id)
+_UPDATE = 1  # (_UPDATE, order_id, old_size)
+_REMOVE = 2  # (_REMOVE, order_id, side, price, old_size, rank)
 
-        Parameters
-        ----------
-        sequence: int
-        bids: list[list]
-        asks: list[list]
-        timestamp: pd.datetime
-        """
-        self.sequence = int(sequence)
-        self.timestamp = timestamp
-        self.bids = SortedListWithKey(key=lambda x: -x.price)
-        self.asks = SortedListWithKey(key=lambda x: x.price)
-        self.orders = {}  # dict[order_id, price]
 
-        # initialize bids and asks
-        sides = {'buy': bids, 'sell': asks}
-        for side, orders in sides.iteritems():
-            if orders is None:
-                continue
-            for price, size, order_id in orders:
-                price, size = float(price), float(size)
-                self.add(side=side, price=price, size=size, order_id=order_id)
+def _bid_key(level):
+    return -level.price
 
-    def _get_levels_from_side(self, side):
+
+def _ask_key(level):
+    return level.price
+
+
+class SortedLevels(SortedListWithKey):
+    def __init__(self, side):
         """
-        Get either bids or asks based on the side
+        Price levels for one side of the book in a sorted list, best price first.
         """
-        return self.bids if side == 'buy' else self.asks
+        key = _bid_key if side == 'buy' else _ask_key
+        super(SortedLevels, self).__init__(key=key)
+        self.side = side
 
-    def _get_levels_from_price(self, price):
+    def get(self, price):
         """
-        Get either bids or asks based on the price
+        Get PriceLevel at price or None
         """
-        if not self.asks:
-            assert self.bids, 'Both bids and asks cannot be empty to get levels'
-            return self.bids
-        best_ask = self.asks[0].price
-        levels = self.asks if price >= best_ask else self.bids
-        return levels
+        key = -price if self.side == 'buy' else price
+        idx = self.bisect_key_left(key)
+        if idx < len(self):
+            level = self[idx]
+            if level.price == price:
+                return level
+        return None
 
-    @staticmethod
-    def _get_levels_idx(price, levels):
+    def replace(self, old, new):
         """
-        Gets the index of price in levels or None
+        Replace a level with another level at the same price
         """
-        dummy_price_level = PriceLevel(price, {})
-        idx = levels.bisect_left(dummy_price_level)
-        price_seen = idx < len(levels) and price == levels[idx].price
-        return idx if price_seen else None
+        self.remove(old)
+        self.add(new)
 
-    def _get_level(self, order_id):
+    def copy(self):
         """
-        Get PriceLevel from the order_id
+        Copy of the sorted list that shares the PriceLevel objects. The internal lists are copied directly since
+        SortedListWithKey.copy adds every level again.
         """
-        price = self.orders[order_id]
-        levels = self._get_levels_from_price(price)
-        idx = self._get_levels_idx(price, levels)
-        assert idx is not None
-        level = levels[idx]
-        assert order_id in level.orders
-        return level
+        result = SortedLevels(self.side)
+        result._len = self._len
+        result._lists = [values[:] for values in self._lists]
+        result._keys = [keys[:] for keys in self._keys]
+        result._maxes = self._maxes[:]
+        result._index = self._index[:]
+        result._offset = self._offset
+        return result
 
-    def get(self, order_id):
+
+class BookReads(object):
+    """
+    Read methods shared by OrderBook and L2OrderBook. They only use the levels of each side (bids and asks, best
+    price first, with price, size and the number of orders as len), the level 2 views and the depth indexes.
+    """
+    def _get_levels_from_side(self, side):
         """
-        Get the (price, size, order_id)
+        Get either bids or asks based on the side
         """
-        assert order_id in self.orders
-        level = self._get_level(order_id)
-        price = level.price
-        size = level.orders[order_id]
-        return price, size, order_id
+        return self.bids if side == 'buy' else self.asks
 
-    def add(self, side, price, size, order_id):
+    def get_cumulative_size(self, side, price):
         """
-        Add an order to an existing price level or create a new price level
-        """
-        assert order_id not in self.orders
+        Total size of the levels on `side` at `price` or better
 
-        # get index
-        levels = self._get_levels_from_side(side)
-        idx = self._get_levels_idx(price, levels)
-        if idx is None:
-            # new price level
-            level = PriceLevel(price, orders={order_id: size})
-            # TODO(vidurj) there should be some way to make this more efficient since we are already computing the
-            # location to place this element
-            levels.add(level)  # this is SortedListWithKey.add
-        else:
-            # add to existing price level
-            level = levels[idx]
-            level.add(size, order_id)  # this is PriceLevel.add
-        self.orders[order_id] = price
-        return price, size, order_id
+        Parameters
+        ----------
+        side: str
+            buy or sell
+        price: float
 
-    def update(self, order_id, new_size):
+        Returns
+        -------
+        float
         """
-        Update or remove an order from a price level
+        depth = self.bid_depth if side == 'buy' else self.ask_depth
+        if depth is not None:
+            return depth.get_cumulative_size(price)
+        sign = -1 if side == 'buy' else 1
+        total = 0
+        for level in self._get_levels_from_side(side):
+            if sign * level.price > sign * price:
+                break
+            total += level.size
+        return total
+
+    def get_price_for_size(self, side, size):
         """
-        assert order_id in self.orders
+        Price of the level on `side` at which the cumulative size from the best price reaches `size`
 
-        level = self._get_level(order_id)
-        price, old_size, order_id = level.update(order_id, new_size)
+        Returns
+        -------
+        float or None if the side is not deep enough
+        """
+        depth = self.bid_depth if side == 'buy' else self.ask_depth
+        if depth is not None:
+            return depth.get_price_for_size(size)
+        total = 0
+        for level in self._get_levels_from_side(side):
+            total += level.size
+            if total >= size:
+                return level.price
+        return None
 
-        # remove level
-        if util.is_close(level.size, 0):
-            levels = self._get_levels_from_price(price)
-            levels.remove(level)  # this is SortedListWithKey.remove
+    def get_vwap(self, side, size):
+        """
+        Average price of taking `size` from `side` starting at the best price
 
-        # remove order
-        if util.is_close(new_size, 0):
-            del self.orders[order_id]
-        return price, old_size, order_id
+        Returns
+        -------
+        float or None if the side is not deep enough
+        """
+        depth = self.bid_depth if side == 'buy' else self.ask_depth
+        if depth is not None:
+            return depth.get_vwap(size)
+        if size <= 0:
+            return None
+        total = notional = 0
+        for level in self._get_levels_from_side(side):
+            fill = min(level.size, size - total)
+            total += fill
+            notional += level.price * fill
+            if total >= size:
+                return notional / float(size)
+        return None
 
     def get_best_bid_ask(self):
         best_bid = self.bids[0].price
         best_ask = self.asks[0].price
         return best_bid, best_ask
 
-    def to_set(self):
-        """
-        Set of (price, size, order_id) for all orders
-        """
-        bids = [level.to_set() for level in self.bids]
-        asks = [level.to_set() for level in self.asks]
-        orders = bids + asks
-        if not orders:
-            return set()
-        result = set.union(*orders)
-        return result
-
     def to_df(self, level_type, depth=None):
         """
         Get level 2 or level 3 book as a DataFrame
@@ -156,6 +170,7 @@ class OrderBook(util.BaseObject):
         Returns
         -------
         pd.DataFrame
+            prices and sizes are floats, fixed point books are converted back
             if level_type is 2:
                 columns: [bid, bid_size, ask, ask_size]
             if level_type is 3:
@@ -169,11 +184,14 @@ class OrderBook(util.BaseObject):
             else:
                 data = [(level.price, order_size, order_id)
                         for level in levels[:depth]
-                        for order_id, order_size in level.orders.iteritems()]
+                        for order_id, order_size in level.iteritems()]
                 data = pd.DataFrame(data, columns=['price', 'size', 'order_id'])
             return data
 
         assert level_type in [2, 3]
+        if level_type == 2 and self.top_depth and depth is not None and depth <= self.top_depth:
+            return self._top_to_df(depth)
+
         bids = _get_data(self.bids, 'bid')
         asks = _get_data(self.asks, 'ask')
 
@@ -185,4 +203,481 @@ class OrderBook(util.BaseObject):
             df = pd.concat([bids, asks])
             df['sequence'] = self.sequence
             df['received_time'] = util.time_to_str(self.timestamp)
+            if self.order_ids is not None:
+                df['order_id'] = [self.order_ids.to_id(handle) for handle in df['order_id']]
+
+        if self.fixed_point:
+            columns = ['bid', 'bid_size', 'ask', 'ask_size'] if level_type == 2 else ['price', 'size']
+            df[columns] = util.from_fixed(df[columns])
         return df
+
+    def arrays_dtype(self, level_type):
+        """
+        Structured dtype of `to_arrays`, prices and sizes are integers for fixed point books
+        """
+        number = np.int_ if self.fixed_point else np.float_
+        if level_type == 2:
+            return np.dtype([('price', number), ('size', number), ('count', np.int_)])
+        return np.dtype([('side', np.int8), ('level', np.int_), ('price', number), ('size', number),
+                         ('order_id', np.object_)])
+
+    def to_arrays(self, level_type, depth=None, out=None):
+        """
+        Get level 2 or level 3 book as a structured numpy array filled in place. Unlike `to_df`, prices and sizes are
+        in the units of the book and no DataFrame is built, so passing the array returned by a previous call as `out`
+        exports the book without allocating a new buffer.
+
+        Parameters
+        ----------
+        level_type: int
+        depth: int
+            number of levels per side, all levels by default
+        out: np.array
+            buffer to fill, see below. Allocated when None.
+
+        Returns
+        -------
+        np.array
+            dtype is `arrays_dtype(level_type)`
+            if level_type is 2:
+                shape (2, depth) with bids in row 0 and asks in row 1, best price first. fields: [price, size, count]
+                where count is the number of orders. Sides with fewer than `depth` levels are padded with zeros so
+                count == 0 marks the end of a side.
+            if level_type is 3:
+                shape (num_orders,) with bids then asks, best price first and then in arrival order.
+                fields: [side, level, price, size, order_id] where side is 0 for bids and 1 for asks, level is the
+                index of the price level in its side and order_id is the id (or handle) used by the book. Extra rows of
+                `out` are padded with level == -1.
+        """
+        assert level_type in [2, 3]
+        sides = [(self.bids, self.top_bids), (self.asks, self.top_asks)]
+
+        if level_type == 2:
+            if depth is None:
+                depth = max(len(self.bids), len(self.asks))
+            if out is None:
+                out = np.empty((2, depth), dtype=self.arrays_dtype(level_type))
+            assert out.shape == (2, depth), 'out has shape {}, expected {}'.format(out.shape, (2, depth))
+            for row, (levels, top) in zip(out, sides):
+                if top is not None and depth <= top.depth:
+                    num_levels = min(depth, len(top))
+                    row['price'][:num_levels] = top.prices[:num_levels]
+                    row['size'][:num_levels] = top.sizes[:num_levels]
+                    row['count'][:num_levels] = top.counts[:num_levels]
+                else:
+                    num_levels = 0
+                    for level in itertools.islice(levels, depth):
+                        row[num_levels] = level.price, level.size, len(level)
+                        num_levels += 1
+                row[num_levels:] = 0
+            return out
+
+        sides = [itertools.islice(levels, depth) for levels, _ in sides]
+        if out is None:
+            sides = [list(levels) for levels in sides]
+            num_orders = sum(len(level) for levels in sides for level in levels)
+            out = np.empty(num_orders, dtype=self.arrays_dtype(level_type))
+
+        start = 0
+        for side_idx, levels in enumerate(sides):
+            for level_idx, level in enumerate(levels):
+                order_ids, sizes = level.to_lists()
+                stop = start + len(order_ids)
+                if stop > len(out):
+                    raise ValueError('out holds {} orders, the book has more'.format(len(out)))
+                rows = out[start:stop]
+                rows['side'] = side_idx
+                rows['level'] = level_idx
+                rows['price'] = level.price
+                rows['size'] = sizes
+                rows['order_id'] = order_ids
+                start = stop
+        out[start:]['level'] = -1
+        return out
+
+    def _top_to_df(self, depth):
+        """
+        Level 2 DataFrame from the top levels views, same format as `to_df(level_type=2)`
+        """
+        data = {}
+        for name, top in [('bid', self.top_bids), ('ask', self.top_asks)]:
+            prices, sizes, _ = top.to_arrays(depth)
+            if self.fixed_point:
+                prices, sizes = util.from_fixed(prices), util.from_fixed(sizes)
+            data[name] = pd.Series(prices, dtype=np.float_)
+            data['{}_size'.format(name)] = pd.Series(sizes, dtype=np.float_)
+        return pd.DataFrame(data, columns=['bid', 'bid_size', 'ask', 'ask_size'])
+
+
+class OrderBook(util.BaseObject, BookReads):
+    def __init__(self, sequence, bids=None, asks=None, timestamp=None, engine=None, tick_size=None,
+                 fixed_point=False, top_depth=None, depth_index=False, order_ids=None):
+        """
+        Bids and asks are sorted lists of PriceLevel objects. Each PriceLevel corresponds to a price and contains
+        all the orders for that price. The class also maintains a mapping of order_id to its PriceLevel so that
+        updates and lookups by order_id do not need to search the book.
+
+        `checksum` is the xor of hash((price, size, order_id)) over all orders. It is updated on every add and
+        update so that two books can be compared in O(1), see `order_book.util.compare_books`.
+
+        The add, remove and update methods return (price, new_size, order_id).
+
+        Parameters
+        ----------
+        sequence: int
+        bids: list[list]
+        asks: list[list]
+        timestamp: pd.datetime
+        engine: str
+            sorted: levels are kept in sorted lists (default)
+            ladder: levels are kept in tick indexed arrays, see PriceLadder
+        tick_size: float
+            minimum price increment, used by the ladder engine
+        fixed_point: bool
+            store prices and sizes as integer multiples of 1e-8 (see util.to_fixed) so that sizes add up exactly and
+            levels are removed when their size is exactly 0. Messages must be parsed with `fixed_point=True`.
+        top_depth: int
+            number of levels kept in the level 2 views `top_bids` and `top_asks`, see TopLevels. 0 disables them.
+        depth_index: bool
+            maintain `bid_depth` and `ask_depth` so that cumulative size and vwap queries take O(log n), see
+            DepthIndex. Without them the queries walk the levels.
+        order_ids: OrderIds
+            key orders on integer handles instead of order id strings. The initial orders are converted, messages
+            must be parsed with the same table (see util.parse_message) and to_df converts the handles back.
+
+        The initial bids and asks are (price, size, order_id) rows in arrival order with string or float prices and
+        sizes. They are loaded in bulk, see from_arrays.
+        """
+        self.sequence = int(sequence)
+        self.timestamp = timestamp
+        self.engine = engine or pms.DEFAULT_ENGINE
+        self.tick_size = tick_size or pms.DEFAULT_TICK_SIZE
+        self.fixed_point = fixed_point
+        self.order_ids = order_ids
+        assert self.engine in ENGINES, 'Invalid engine: {}'.format(self.engine)
+        self.bids = self._create_levels('buy')
+        self.asks = self._create_levels('sell')
+        self.orders = {}  # dict[order_id, PriceLevel], an OrderIndex after cloning
+        self.checksum = 0
+        self._owner = next(_owner_tokens)  # levels with this owner can be changed in place
+        self._undo_ops = None  # list of undo operations of the current message when the undo log is enabled
+        self.top_depth = pms.DEFAULT_TOP_DEPTH if top_depth is None else top_depth
+        # created after the initial orders are added
+        self.top_bids = None
+        self.top_asks = None
+        self.bid_depth = None
+        self.ask_depth = None
+
+        # initialize bids and asks
+        for side, orders in [('buy', bids), ('sell', asks)]:
+            if orders is not None and len(orders):
+                self._load(side, *self._rows_to_arrays(orders))
+
+        if self.top_depth:
+            dtype = np.int_ if fixed_point else np.float_
+            self.top_bids = TopLevels('buy', self.top_depth, dtype=dtype)
+            self.top_asks = TopLevels('sell', self.top_depth, dtype=dtype)
+        if depth_index:
+            tick_size = util.to_fixed(self.tick_size) if fixed_point else self.tick_size
+            self.bid_depth = DepthIndex('buy', tick_size)
+            self.ask_depth = DepthIndex('sell', tick_size)
+        self._reset_views()
+
+    @classmethod
+    def from_arrays(cls, sequence, bids=None, asks=None, **kwargs):
+        """
+        Create a book from arrays of the orders of each side, e.g. from a binary snapshot (see order_book.snapshot)
+
+        The orders of a side are sorted by price once, grouped into levels and the levels are built in a single
+        pass, instead of adding and bisecting one order at a time.
+
+        Parameters
+        ----------
+        sequence: int
+        bids: tuple(np.array, np.array, list)
+            prices, sizes and order ids in arrival order. Prices and sizes are in the units of the book i.e. fixed
+            point integers for fixed point books. Order ids are converted to handles if the book has an OrderIds
+            table. The arrays need not be sorted by price.
+        asks: tuple(np.array, np.array, list)
+        kwargs:
+            see the class constructor
+
+        Returns
+        -------
+        OrderBook
+        """
+        book = cls(sequence, **kwargs)
+        for side, arrays in [('buy', bids), ('sell', asks)]:
+            if arrays is not None:
+                book._load(side, *arrays)
+        book._reset_views()
+        return book
+
+    def _rows_to_arrays(self, rows):
+        """
+        Prices and sizes in the units of the book and order ids of (price, size, order_id) rows
+        """
+        prices, sizes, order_ids = zip(*rows)
+        to_array = util.to_fixed_array if self.fixed_point else lambda values: np.array(values, dtype=np.float_)
+        return to_array(prices), to_array(sizes), order_ids
+
+    def _load(self, side, prices, sizes, order_ids):
+        """
+        Add the orders of one side of an empty book in bulk, see from_arrays
+        """
+        prices = np.asarray(prices)
+        if not len(prices):
+            return
+        levels = self._get_levels_from_side(side)
+        assert not levels, 'Orders can only be loaded into an empty side'
+        if self.order_ids is not None:
+            order_ids = [self.order_ids.to_handle(order_id) for order_id in order_ids]
+        num_orders = len(self.orders) + len(prices)
+
+        # stable sort so that orders keep their arrival order within a level
+        order = np.argsort(-prices if side == 'buy' else prices, kind='mergesort')
+        prices = prices[order]
+        starts = np.flatnonzero(np.r_[True, prices[1:] != prices[:-1]])
+        stops = np.r_[starts[1:], len(prices)]
+        sizes = np.asarray(sizes)[order].tolist()
+        order = order.tolist()
+        order_ids = [order_ids[idx] for idx in order]
+
+        orders = self.orders
+        checksum = self.checksum
+        new_levels = []
+        for price, start, stop in itertools.izip(prices[starts].tolist(), starts.tolist(), stops.tolist()):
+            level_ids = order_ids[start:stop]
+            level_sizes = sizes[start:stop]
+            level = PriceLevel.from_lists(price, level_ids, level_sizes, side=side, fixed_point=self.fixed_point)
+            level.owner = self._owner
+            new_levels.append(level)
+            orders.update(itertools.izip(level_ids, itertools.repeat(level)))
+            checksum = reduce(operator.xor, itertools.imap(hash, itertools.izip(
+                itertools.repeat(price), level_sizes, level_ids)), checksum)
+        assert len(orders) == num_orders, 'Duplicate order ids'
+        self.checksum = checksum
+
+        if self.engine == 'ladder':
+            for level in new_levels:
+                levels.add(level)
+        else:
+            levels.update(new_levels)
+
+    def _reset_views(self):
+        """
+        Rebuild the top levels views and depth indexes from the levels
+        """
+        if self.top_bids is not None:
+            self.top_bids.reset(self.bids)
+            self.top_asks.reset(self.asks)
+        if self.bid_depth is not None:
+            self.bid_depth.reset(self.bids)
+            self.ask_depth.reset(self.asks)
+
+    def _create_levels(self, side):
+        """
+        Create an empty side of the book for the engine
+        """
+        if self.engine == 'ladder':
+            tick_size = util.to_fixed(self.tick_size) if self.fixed_point else self.tick_size
+            return PriceLadder(side, tick_size)
+        return SortedLevels(side)
+
+    def get(self, order_id):
+        """
+        Get the (price, size, order_id)
+        """
+        assert order_id in self.orders
+        level = self.orders[order_id]
+        return level.price, level.get_size(order_id), order_id
+
+    def get_volume_ahead(self, order_id=None, side=None, price=None):
+        """
+        Size queued ahead of an order in its price level, or ahead of an order placed now at `price` on `side`.
+
+        Parameters
+        ----------
+        order_id: str
+        side: str
+            buy or sell, used when order_id is None
+        price: float
+
+        Returns
+        -------
+        float
+        """
+        if order_id is not None:
+            return self.orders[order_id].volume_ahead(order_id)
+        level = self._get_levels_from_side(side).get(price)
+        return 0 if level is None else level.volume_ahead()
+
+    def add(self, side, price, size, order_id):
+        """
+        Add an order to an existing price level or create a new price level
+        """
+        assert order_id not in self.orders
+
+        # get level
+        levels = self._get_levels_from_side(side)
+        top = self.top_bids if side == 'buy' else self.top_asks
+        level = levels.get(price)
+        if level is None:
+            # new price level
+            level = PriceLevel(price, orders={order_id: size}, side=side, fixed_point=self.fixed_point)
+            level.owner = self._owner
+            levels.add(level)  # this is SortedLevels.add or PriceLadder.add
+            if top is not None:
+                top.add(level)
+        else:
+            # add to existing price level
+            if level.owner != self._owner:
+                level = self._own_level(level)
+            level.add(size, order_id)  # this is PriceLevel.add
+            if top is not None:
+                top.update(level)
+        depth = self.bid_depth if side == 'buy' else self.ask_depth
+        if depth is not None:
+            depth.set(price, level.size)
+        self.orders[order_id] = level
+        if type(self.orders) is not dict:
+            self._own_orders()
+        self.checksum ^= hash((price, size, order_id))
+        if self._undo_ops is not None:
+            self._undo_ops.append((_ADD, order_id))
+        return price, size, order_id
+
+    def update(self, order_id, new_size):
+        """
+        Update or remove an order from a price level
+        """
+        assert order_id in self.orders
+
+        level = self.orders[order_id]
+        if level.owner != self._owner:
+            level = self._own_level(level)
+        if not self.fixed_point and util.is_close(new_size, 0):
+            # remove orders left with a rounding error
+            new_size = 0
+        if self._undo_ops is not None:
+            if new_size == 0:
+                op = (_REMOVE, order_id, level.side, level.price, level.get_size(order_id), level.get_rank(order_id))
+            else:
+                op = (_UPDATE, order_id, level.get_size(order_id))
+            self._undo_ops.append(op)
+        price, old_size, order_id = level.update(order_id, new_size)
+        top = self.top_bids if level.side == 'buy' else self.top_asks
+        depth = self.bid_depth if level.side == 'buy' else self.ask_depth
+        self.checksum ^= hash((price, old_size, order_id))
+
+        # remove level
+        if level.size == 0 if self.fixed_point else util.is_close(level.size, 0):
+            levels = self._get_levels_from_side(level.side)
+            levels.remove(level)  # this is SortedLevels.remove or PriceLadder.remove
+            if top is not None:
+                top.remove(level, levels)
+            if depth is not None:
+                depth.set(price, 0)
+        else:
+            if top is not None:
+                top.update(level)
+            if depth is not None:
+                depth.set(price, level.size)
+
+        # remove order
+        if new_size == 0:
+            del self.orders[order_id]
+            if type(self.orders) is not dict:
+                self._own_orders()
+        else:
+            self.checksum ^= hash((price, new_size, order_id))
+        return price, old_size, order_id
+
+    def _undo(self, ops):
+        """
+        Revert a list of operations recorded by add and update, most recent last
+        """
+        assert self._undo_ops is None
+        for op in reversed(ops):
+            if op[0] == _ADD:
+                self.update(op[1], 0)
+            elif op[0] == _UPDATE:
+                self.update(op[1], op[2])
+            else:
+                _, order_id, side, price, size, rank = op
+                self.add(side, price, size, order_id)
+                level = self.orders[order_id]
+                if rank < len(level) - 1:
+                    level.move(order_id, rank)
+
+    def _own_level(self, level):
+        """
+        Replace a level shared with a clone by a copy owned by this book
+        """
+        new_level = level.copy()
+        new_level.owner = self._owner
+        self._get_levels_from_side(level.side).replace(level, new_level)
+        for order_id, _ in new_level.iteritems():
+            self.orders[order_id] = new_level
+        if type(self.orders) is not dict:
+            self._own_orders()
+        return new_level
+
+    def _own_orders(self):
+        """
+        Replace the order index of a clone by a dict once it has merged its changes into a dict it owns. The old
+        index still reads the same orders, so references to it (e.g. in apply_batch) stay valid for lookups.
+        """
+        if self.orders.owned:
+            self.orders = self.orders.merge()
+
+    def clone(self):
+        """
+        Copy of the book that can be changed independently. Price levels are shared by both books and copied by
+        whichever book changes them first, and the order index is shared through an OrderIndex for each book that
+        keeps the orders changed since the clone. Cloning copies the level containers, O(number of levels), and the
+        order index changes of a book cloned before, but not the orders.
+
+        Returns
+        -------
+        OrderBook
+        """
+        book = copy.copy(self)
+        book.bids = self.bids.copy()
+        book.asks = self.asks.copy()
+        self.orders, book.orders = order_index.share(self.orders), order_index.share(self.orders)
+        if self.top_depth:
+            book.top_bids = self.top_bids.copy()
+            book.top_asks = self.top_asks.copy()
+        if self.bid_depth is not None:
+            book.bid_depth = self.bid_depth.copy()
+            book.ask_depth = self.ask_depth.copy()
+        # existing levels are now shared so neither book owns them
+        self._owner = next(_owner_tokens)
+        book._owner = next(_owner_tokens)
+        return book
+
+    def __setstate__(self, state):
+        # owner tokens are only unique within a process, so an unpickled book (e.g. from a get_books worker) gets a
+        # new token. Its levels are unpickled without an owner since they may be shared with other unpickled books.
+        self.__dict__.update(state)
+        self._owner = next(_owner_tokens)
+
+    def __eq__(self, other):
+        # the copy-on-write token and the undo operations of the current message are not part of the book's state
+        def _state(book):
+            return {key: value for key, value in book.__dict__.iteritems() if key not in _COW_FIELDS}
+        return _state(self) == _state(other)
+
+    def to_set(self):
+        """
+        Set of (price, size, order_id) for all orders
+        """
+        bids = [level.to_set() for level in self.bids]
+        asks = [level.to_set() for level in self.asks]
+        orders = bids + asks
+        if not orders:
+            return set()
+        result = set.union(*orders)
+        return result
+
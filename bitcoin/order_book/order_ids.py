@@ -0,0 +1,65 @@
+class OrderIds(object):
+    def __init__(self):
+        """
+        Maps order ids to integer handles and back so that books can key their orders on integers instead of
+        36 character UUID strings.
+
+        UUIDs (e.g. GDAX order ids) are encoded as the 128 bit integer of their hex digits, so they need no table
+        and the handle is all that is kept per order. Other ids are numbered in a table with negative handles.
+        Decoded UUIDs are lower case.
+        """
+        self._handles = {}  # dict[order_id, handle] for ids that are not UUIDs
+        self._ids = []  # order_id of handle -1, -2, ...
+
+    def to_handle(self, order_id):
+        """
+        Integer handle of an order id
+
+        Parameters
+        ----------
+        order_id: str or int
+            ids that are not strings e.g. integer ids are numbered in the table
+
+        Returns
+        -------
+        int
+        """
+        if isinstance(order_id, basestring) and len(order_id) == 36 and order_id[8] == '-':
+            try:
+                return int(order_id.replace('-', ''), 16)
+            except ValueError:
+                pass
+        handle = self._handles.get(order_id)
+        if handle is None:
+            self._ids.append(order_id)
+            handle = self._handles[order_id] = -len(self._ids)
+        return handle
+
+    def to_id(self, handle):
+        """
+        Order id of a handle
+
+        Parameters
+        ----------
+        handle: int
+
+        Returns
+        -------
+        str
+        """
+        if handle < 0:
+            return self._ids[-handle - 1]
+        digits = '%032x' % handle
+        return '-'.join([digits[:8], digits[8:12], digits[12:16], digits[16:20], digits[20:]])
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __eq__(self, other):
+        return self._ids == other._ids
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'OrderIds(num_table_ids={})'.format(len(self._ids))
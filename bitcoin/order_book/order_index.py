@@ -0,0 +1,157 @@
+_MISSING = object()
+_REMOVED = object()  # value of removed orders in OrderIndex.changes
+
+
+def share(index):
+    """
+    OrderIndex over the entries of a dict or OrderIndex that can be changed without changing it or the other
+    indexes shared from it. The dict must not be changed afterwards.
+    """
+    if type(index) is dict:
+        return OrderIndex(index)
+    return OrderIndex(index.base, dict(index.changes), len(index))
+
+
+class OrderIndex(object):
+    def __init__(self, base, changes=None, length=None):
+        """
+        Dict keyed by order id for cloned books, e.g. OrderBook.orders. The entries changed since the clone are kept
+        in `changes` over a `base` dict that is shared with the other clones and never changed, so cloning does not
+        copy the dict. Removed entries are marked in `changes`.
+
+        Once the changes outgrow a fraction of the base they are merged into a copy of it that the index owns, so
+        lookups never go through more than two dicts and the merge costs O(1) per change on average. OrderBook then
+        replaces its order index by that dict, see OrderBook.add.
+
+        Parameters
+        ----------
+        base: dict
+        changes: dict
+            changes of an index cloned from the same base, taken over by the index
+        length: int
+            number of entries, computed when None
+        """
+        self.base = base
+        self.changes = {} if changes is None else changes
+        self.owned = False  # base is private to the index
+        if length is None:
+            length = len(base) + sum((value is not _REMOVED) - (key in base)
+                                     for key, value in self.changes.iteritems())
+        self._len = length
+
+    def get(self, order_id, default=None):
+        value = self.changes.get(order_id, _MISSING)
+        if value is _MISSING:
+            return self.base.get(order_id, default)
+        return default if value is _REMOVED else value
+
+    def __contains__(self, order_id):
+        value = self.changes.get(order_id, _MISSING)
+        if value is _MISSING:
+            return order_id in self.base
+        return value is not _REMOVED
+
+    def __getitem__(self, order_id):
+        value = self.get(order_id, _MISSING)
+        if value is _MISSING:
+            raise KeyError(order_id)
+        return value
+
+    def __setitem__(self, order_id, value):
+        if order_id not in self:
+            self._len += 1
+        self.changes[order_id] = value
+        self._check_size()
+
+    def __delitem__(self, order_id):
+        if order_id not in self:
+            raise KeyError(order_id)
+        self._len -= 1
+        self.changes[order_id] = _REMOVED
+        self._check_size()
+
+    def pop(self, order_id, *default):
+        value = self.get(order_id, _MISSING)
+        if value is _MISSING:
+            if default:
+                return default[0]
+            raise KeyError(order_id)
+        del self[order_id]
+        return value
+
+    def update(self, items):
+        for order_id, value in items:
+            self[order_id] = value
+
+    def _check_size(self):
+        if len(self.changes) > len(self.base) // 8 + 64:
+            self.merge()
+
+    def merge(self):
+        """
+        Merge the changes into the base, copying the base first if it is shared
+
+        Returns
+        -------
+        dict
+            the base
+        """
+        base = self.base if self.owned else self.base.copy()
+        for order_id, value in self.changes.iteritems():
+            if value is _REMOVED:
+                base.pop(order_id, None)
+            else:
+                base[order_id] = value
+        self.base = base
+        self.changes = {}
+        self.owned = True
+        return base
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        changes = self.changes
+        for order_id in self.base:
+            if order_id not in changes:
+                yield order_id
+        for order_id, value in changes.iteritems():
+            if value is not _REMOVED:
+                yield order_id
+
+    iterkeys = __iter__
+
+    def iteritems(self):
+        for order_id in self:
+            yield order_id, self[order_id]
+
+    def itervalues(self):
+        for order_id in self:
+            yield self[order_id]
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def copy(self):
+        return dict(self.iteritems())
+
+    def __eq__(self, other):
+        if isinstance(other, OrderIndex):
+            other = other.copy()
+        return self.copy() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __reduce__(self):
+        # pickled as a dict since the removed marker is only unique within a process
+        return dict, (self.items(),)
+
+    def __repr__(self):
+        return 'OrderIndex({})'.format(self.copy())
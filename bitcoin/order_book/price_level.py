@@ -1,39 +1,290 @@
-import bitcoin.util as util
+from array import array
 
+from fenwick import FenwickTree
 
-class PriceLevel(util.BaseObject):
-    def __init__(self, price, orders):
+
+SMALL_LEVEL = 8  # levels with at most this many slots do not keep an order_id to slot mapping
+
+
+class PriceLevel(object):
+    __slots__ = ('price', 'side', 'size', 'owner', '_slots', '_ids', '_sizes', '_num_dead', '_fenwick')
+
+    def __init__(self, price, orders, side=None, fixed_point=False):
         """
         Contains sll the bid or ask orders for a corresponding price.
         The add, remove and update methods return (price, new_size, order_id).
 
+        Orders are stored in arrival order. Each order gets a slot in `_ids` and `_sizes`. Levels with more than
+        `SMALL_LEVEL` slots also keep `_slots`, a mapping of order_id to slot; smaller levels find the slot by
+        scanning `_ids`, which is faster than a dict lookup at that size and saves a dict per level. Removed orders
+        leave an empty slot which is reclaimed when the level is compacted.
+
+        The volume ahead of an order is a prefix sum of `_sizes`. Once a large level is queried, `_fenwick` keeps
+        the prefix sums up to date so later queries take O(log n). It is dropped when slots are moved.
+
+        `owner` is the token of the book that may change the level in place. Levels shared between cloned books are
+        copied before they are changed, see OrderBook.clone.
+
         Parameters
         ----------
         price: float
         orders: dict[order_id, size]
+        side: str
+            buy or sell
+        fixed_point: bool
+            sizes are integers, see OrderBook
         """
         self.price = price
-        self.orders = orders
-        self.size = sum(self.orders.values())
+        self.side = side
+        self.owner = None
+        self._ids = orders.keys()  # order_id for each slot, None for removed orders
+        self._sizes = array('l' if fixed_point else 'd', orders.values())  # size for each slot
+        self._num_dead = 0  # number of removed slots
+        self._slots = None  # dict[order_id, slot] for large levels
+        self._fenwick = None  # FenwickTree over _sizes, created by volume_ahead
+        if len(self._ids) > SMALL_LEVEL:
+            self._index_slots()
+        self.size = sum(self._sizes)
+
+    @classmethod
+    def from_lists(cls, price, order_ids, sizes, side=None, fixed_point=False):
+        """
+        Create a level from order ids and sizes in arrival order, see OrderBook.from_arrays
+
+        Parameters
+        ----------
+        price: float
+        order_ids: list
+        sizes: list
+        side: str
+        fixed_point: bool
+        """
+        level = cls.__new__(cls)
+        level.price = price
+        level.side = side
+        level.owner = None
+        level._set_items(zip(order_ids, sizes), typecode='l' if fixed_point else 'd')
+        level.size = sum(sizes)
+        return level
+
+    @property
+    def orders(self):
+        """
+        dict[order_id, size]
+        """
+        return dict(self.iteritems())
+
+    def iteritems(self):
+        """
+        Iterate over (order_id, size) in arrival order
+        """
+        sizes = self._sizes
+        for slot, order_id in enumerate(self._ids):
+            if order_id is not None:
+                yield order_id, sizes[slot]
+
+    def to_lists(self):
+        """
+        Order ids and sizes in arrival order. The internal lists are returned when the level has no empty slots so
+        they must not be changed.
+
+        Returns
+        -------
+        tuple(list, sequence)
+        """
+        if not self._num_dead:
+            return self._ids, self._sizes
+        items = list(self.iteritems())
+        return [order_id for order_id, _ in items], [size for _, size in items]
+
+    def get_size(self, order_id):
+        slots = self._slots
+        slot = self._ids.index(order_id) if slots is None else slots[order_id]
+        return self._sizes[slot]
+
+    def get_rank(self, order_id):
+        """
+        Number of orders ahead of the order in the queue
+        """
+        slots = self._slots
+        ids = self._ids
+        slot = ids.index(order_id) if slots is None else slots[order_id]
+        return slot - ids[:slot].count(None) if self._num_dead else slot
+
+    def volume_ahead(self, order_id=None):
+        """
+        Size of the orders ahead of an order in the queue.
+
+        Parameters
+        ----------
+        order_id: str
+            order in the level or None for an order placed now
+
+        Returns
+        -------
+        float
+        """
+        if order_id is None:
+            return self.size
+        slots = self._slots
+        slot = self._ids.index(order_id) if slots is None else slots[order_id]
+        if slot <= SMALL_LEVEL:
+            return sum(self._sizes[:slot])
+        if self._fenwick is None:
+            self._fenwick = FenwickTree(self._sizes, typecode=self._sizes.typecode)
+        return self._fenwick.prefix_sum(slot)
+
+    def move(self, order_id, rank):
+        """
+        Move an order to position `rank` in the queue. Used to put an order that was removed and added again back
+        in its place.
+        """
+        ids = self._ids
+        sizes = self._sizes
+        slots = self._slots
+        slot = ids.index(order_id) if slots is None else slots[order_id]
+        self._fenwick = None
+
+        if self._num_dead and slot == len(ids) - 1:
+            # find the slot of the order at `rank`
+            num_live = 0
+            for target, item_id in enumerate(ids):
+                if item_id is not None:
+                    if num_live == rank:
+                        break
+                    num_live += 1
+            if target > 0 and ids[target - 1] is None:
+                # reuse the empty slot in front of it, usually the slot the order was removed from
+                ids[target - 1] = order_id
+                sizes[target - 1] = sizes[slot]
+                ids.pop()
+                sizes.pop()
+                self._num_dead -= 1
+                if slots is not None:
+                    slots[order_id] = target - 1
+                return
+
+        if self._num_dead:
+            self._compact()
+            ids = self._ids
+            sizes = self._sizes
+            slots = self._slots
+            slot = ids.index(order_id) if slots is None else slots[order_id]
+        size = sizes[slot]
+        del ids[slot]
+        sizes.pop(slot)
+        ids.insert(rank, order_id)
+        sizes.insert(rank, size)
+        if slots is not None:
+            for slot in range(min(rank, slot), max(rank, slot) + 1):
+                slots[ids[slot]] = slot
 
     def add(self, size, order_id):
         # add size and order_id
         self.size += size
-        self.orders[order_id] = size
+        ids = self._ids
+        slots = self._slots
+        if slots is not None:
+            slots[order_id] = len(ids)
+        ids.append(order_id)
+        self._sizes.append(size)
+        if self._fenwick is not None:
+            self._fenwick.append(size)
+        if slots is None and len(ids) > SMALL_LEVEL:
+            self._index_slots()
         return self.price, size, order_id
 
     def update(self, order_id, new_size):
-        assert order_id in self.orders
         # subtract the size change
-        old_size = self.orders[order_id]
+        slots = self._slots
+        slot = self._ids.index(order_id) if slots is None else slots[order_id]
+        sizes = self._sizes
+        old_size = sizes[slot]
         self.size += (new_size - old_size)
         # update order
-        self.orders[order_id] = new_size
+        sizes[slot] = new_size
+        if self._fenwick is not None:
+            self._fenwick.add(slot, new_size - old_size)
         # remove order if needed
         if new_size == 0:
-            del self.orders[order_id]
+            if slots is not None:
+                del slots[order_id]
+            self._ids[slot] = None
+            self._num_dead += 1
+            if self._num_dead > SMALL_LEVEL and 2 * self._num_dead > len(self._ids):
+                self._compact()
         return self.price, old_size, order_id
 
+    def copy(self):
+        """
+        Copy of the level with no owner
+        """
+        level = PriceLevel.__new__(PriceLevel)
+        level.price = self.price
+        level.side = self.side
+        level.size = self.size
+        level.owner = None
+        level._ids = self._ids[:]
+        level._sizes = self._sizes[:]
+        level._num_dead = self._num_dead
+        level._slots = None if self._slots is None else self._slots.copy()
+        level._fenwick = None
+        return level
+
+    def _index_slots(self):
+        """
+        Create the order_id to slot mapping once the level is too large to scan
+        """
+        self._slots = {order_id: slot for slot, order_id in enumerate(self._ids) if order_id is not None}
+
+    def _compact(self):
+        """
+        Remove empty slots while keeping arrival order
+        """
+        self._set_items(list(self.iteritems()))
+
+    def _set_items(self, items, typecode=None):
+        """
+        Replace the orders with a list of (order_id, size) in arrival order. The level size is not changed.
+        """
+        typecode = typecode or self._sizes.typecode
+        self._ids = [order_id for order_id, _ in items]
+        self._sizes = array(typecode, [size for _, size in items])
+        self._num_dead = 0
+        self._slots = None
+        self._fenwick = None
+        if len(self._ids) > SMALL_LEVEL:
+            self._index_slots()
+
     def to_set(self):
         return {(self.price, size, order_id)
-                for order_id, size in self.orders.iteritems()}
+                for order_id, size in self.iteritems()}
+
+    def __contains__(self, order_id):
+        if self._slots is None:
+            return order_id in self._ids
+        return order_id in self._slots
+
+    def __len__(self):
+        return len(self._ids) - self._num_dead
+
+    def __getstate__(self):
+        return self.price, self.side, self.size, self._sizes.typecode, list(self.iteritems())
+
+    def __setstate__(self, state):
+        # the owner is not restored since owner tokens are per process, see OrderBook.__setstate__
+        price, side, size, typecode, items = state
+        self.__init__(price, {}, side=side)
+        self._set_items(items, typecode=typecode)
+        self.size = size
+
+    def __eq__(self, other):
+        return (self.price == other.price and self.side == other.side and self.size == other.size and
+                self.orders == other.orders)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'PriceLevel(price={}, side={}, size={}, orders={})'.format(self.price, self.side, self.size,
+                                                                          self.orders)
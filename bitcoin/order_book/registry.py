@@ -0,0 +1,137 @@
+import bitcoin.params as params
+import bitcoin.util as util
+from gdax_order_book import GdaxOrderBook
+
+
+class BookRegistry(object):
+    def __init__(self, product_ids, exchange='GDAX', **kwargs):
+        """
+        Hosts one GdaxOrderBook per product in a single process and dispatches messages by `product_id`, so a single
+        websocket can feed all the books and reads across products see the books at the same point in the feed.
+
+        Order ids are interned in a table shared by all the books: parsed messages and snapshots use the table's copy
+        of each id, so the book, its price levels and order_to_time hold one string per order. Ids are dropped from
+        the table when their done message is processed. With an OrderIds table (the `order_ids` argument) the books
+        key on integer handles instead and no strings are interned.
+
+        Parameters
+        ----------
+        product_ids: list[str]
+        exchange: str
+        kwargs:
+            see GdaxOrderBook, e.g. engine, fixed_point and order_ids
+        """
+        self.exchange = exchange
+        self.product_ids = list(product_ids)
+        self.fixed_point = kwargs.get('fixed_point', False)
+        self.order_ids = kwargs.get('order_ids')  # OrderIds shared by all books
+        self._kwargs = kwargs
+        self._order_ids = {}  # dict[order_id, order_id] shared by all books when there is no OrderIds table
+        self.books = {product_id: self.create_book(product_id, sequence=-1) for product_id in self.product_ids}
+
+    def intern(self, order_id):
+        """
+        The table's copy of an order id
+        """
+        return self._order_ids.setdefault(order_id, order_id)
+
+    def create_book(self, product_id, sequence, bids=None, asks=None, arrays=False):
+        """
+        Create a book for a product from a level 3 snapshot with interned order ids. With `arrays` the sides are
+        (prices, sizes, order_ids) arrays instead of rows, see GdaxOrderBook.from_arrays.
+        """
+        # the book converts the snapshot ids to handles when it has an OrderIds table
+        intern = self.intern if self.order_ids is None else lambda order_id: order_id
+        sides = []
+        for orders in [bids, asks]:
+            if orders is not None and arrays:
+                prices, sizes, order_ids = orders
+                orders = prices, sizes, [intern(order_id) for order_id in order_ids]
+            elif orders is not None:
+                orders = [[price, size, intern(order_id)] for price, size, order_id in orders]
+            sides.append(orders)
+        kwargs = dict(self._kwargs)
+        kwargs.setdefault('tick_size', params.TICK_SIZE[self.exchange][product_id])
+        create = GdaxOrderBook.from_arrays if arrays else GdaxOrderBook
+        return create(sequence, bids=sides[0], asks=sides[1], **kwargs)
+
+    def set_book(self, product_id, sequence, bids, asks, arrays=False):
+        """
+        Replace the book of a product with a level 3 snapshot e.g. from PublicClient.get_product_order_book or
+        stream.read_arrays (with `arrays`)
+
+        Returns
+        -------
+        GdaxOrderBook
+        """
+        book = self.create_book(product_id, sequence=sequence, bids=bids, asks=asks, arrays=arrays)
+        self.books[product_id] = book
+        if self.order_ids is None:
+            self._prune()
+        return book
+
+    def _prune(self):
+        """
+        Drop ids that are no longer in any book e.g. orders of a replaced book
+        """
+        live = {}
+        for book in self.books.itervalues():
+            for order_id in book.orders:
+                live[order_id] = order_id
+            for order_id in book.order_to_time:
+                live[order_id] = order_id
+        self._order_ids = live
+
+    def parse_message(self, msg):
+        """
+        Convert message dtypes (see util.parse_message) and intern its order ids
+        """
+        msg = util.parse_message(msg, exchange=self.exchange, fixed_point=self.fixed_point, order_ids=self.order_ids)
+        if self.order_ids is not None:
+            return msg
+        order_ids = self._order_ids
+        for field in params.ORDER_ID_FIELDS:
+            order_id = msg.get(field)
+            if order_id is not None:
+                msg[field] = order_ids.setdefault(order_id, order_id)
+        return msg
+
+    def process_message(self, msg):
+        """
+        Apply a parsed message to the book of its product
+
+        Returns
+        -------
+        GdaxOrderBook
+        """
+        book = self.books[msg['product_id']]
+        book.process_message(msg)
+        if msg['type'] == 'done' and self.order_ids is None:
+            self._order_ids.pop(msg['order_id'], None)
+        return book
+
+    def get_implied_bid_ask(self, product_id, via='USD'):
+        """
+        Best bid and ask of a cross product implied by the books of both currencies against `via`, e.g. ETH-BTC from
+        ETH-USD and BTC-USD. Selling ETH-BTC is selling ETH-USD and buying BTC-USD.
+
+        Returns
+        -------
+        tuple(float, float)
+        """
+        base, quote = product_id.split('-')
+        base_bid, base_ask = self.books['{}-{}'.format(base, via)].get_best_bid_ask()
+        quote_bid, quote_ask = self.books['{}-{}'.format(quote, via)].get_best_bid_ask()
+        return base_bid / float(quote_ask), base_ask / float(quote_bid)
+
+    def __getitem__(self, product_id):
+        return self.books[product_id]
+
+    def __contains__(self, product_id):
+        return product_id in self.books
+
+    def __len__(self):
+        return len(self.books)
+
+    def __repr__(self):
+        return 'BookRegistry({})'.format({product_id: book.sequence for product_id, book in self.books.iteritems()})
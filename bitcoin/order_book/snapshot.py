@@ -0,0 +1,302 @@
+"""
+Binary level 3 order book snapshots.
+
+A snapshot file is a fixed size header followed by the orders of each side as three arrays, bids first:
+
+    header: HEADER_DTYPE, 64 bytes with the sequence, timestamp, number of orders of each side and how prices, sizes
+        and order ids are encoded
+    bids: prices, sizes, order ids
+    asks: prices, sizes, order ids
+
+Orders are sorted best price first and in arrival order within a price. Prices and sizes are little endian float64,
+or int64 for fixed point books (see util.to_fixed). Order ids are encoded by kind:
+    ID_UUID: 16 bytes per id, e.g. GDAX order ids
+    ID_INT: int64, e.g. Bitstamp order ids
+    ID_STR: fixed width strings for any other ids
+
+Files are read with `np.memmap` so the arrays are only paged in as they are used. Snapshots serve hourly snapshots
+(see storage.gdax_msgs), backtest checkpoints (see save_book and load_book) and fast restarts of GdaxWebSocket.
+"""
+import binascii
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import bitcoin.util as util
+from gdax_order_book import GdaxOrderBook
+
+
+MAGIC = 'BOOKSNAP'
+VERSION = 1
+FIXED_POINT = 1  # header flag
+
+ID_UUID = 0
+ID_INT = 1
+ID_STR = 2
+
+NAT = np.iinfo(np.int64).min  # missing timestamp
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('flags', '<u4'),
+    ('sequence', '<i8'),
+    ('timestamp', '<i8'),  # ns since epoch
+    ('num_bids', '<i8'),
+    ('num_asks', '<i8'),
+    ('id_kind', '<u4'),
+    ('id_width', '<u4'),  # bytes per order id
+    ('reserved', 'V8'),
+])
+
+Snapshot = namedtuple('Snapshot', ['sequence', 'timestamp', 'fixed_point', 'id_kind', 'bids', 'asks'])
+Side = namedtuple('Side', ['prices', 'sizes', 'order_ids'])
+
+
+def _is_uuid(order_id):
+    return isinstance(order_id, basestring) and len(order_id) == 36 and order_id[8] == '-'
+
+
+def encode_ids(order_ids):
+    """
+    Encode order ids as an array of the most compact kind that fits all of them
+
+    Parameters
+    ----------
+    order_ids: list
+
+    Returns
+    -------
+    tuple(int, np.array)
+        id kind and encoded ids
+    """
+    if all(isinstance(order_id, (int, long)) for order_id in order_ids):
+        try:
+            return ID_INT, np.array(order_ids, dtype='<i8')
+        except OverflowError:
+            pass
+    if all(_is_uuid(order_id) for order_id in order_ids):
+        try:
+            data = binascii.unhexlify(''.join(order_id.replace('-', '') for order_id in order_ids))
+            return ID_UUID, np.frombuffer(data, dtype='V16')
+        except TypeError:
+            # not hex digits
+            pass
+    return ID_STR, np.array([str(order_id) for order_id in order_ids], dtype='S')
+
+
+def decode_ids(id_kind, order_ids):
+    """
+    Decode an array of encoded order ids, see encode_ids
+
+    Returns
+    -------
+    list
+    """
+    if id_kind == ID_UUID:
+        digits = binascii.hexlify(order_ids.tobytes())
+        return ['-'.join([digits[i:i + 8], digits[i + 8:i + 12], digits[i + 12:i + 16], digits[i + 16:i + 20],
+                          digits[i + 20:i + 32]])
+                for i in xrange(0, len(digits), 32)]
+    return order_ids.tolist()
+
+
+def _encode_time(timestamp):
+    if timestamp is None:
+        return NAT
+    if isinstance(timestamp, (int, long)):
+        # epoch seconds e.g. BtOrderBook
+        return pd.Timestamp(timestamp, unit='s').value
+    return pd.Timestamp(timestamp).value
+
+
+def _decode_time(value):
+    return None if value == NAT else pd.Timestamp(int(value))
+
+
+def from_book(book):
+    """
+    Snapshot of a book
+
+    Parameters
+    ----------
+    book: OrderBook
+
+    Returns
+    -------
+    Snapshot
+    """
+    arrays = book.to_arrays(level_type=3)
+    order_ids = arrays['order_id'].tolist()
+    if book.order_ids is not None:
+        order_ids = [book.order_ids.to_id(handle) for handle in order_ids]
+    id_kind, order_ids = encode_ids(order_ids)
+    num_bids = int(np.count_nonzero(arrays['side'] == 0))
+
+    sides = []
+    for rows in [slice(None, num_bids), slice(num_bids, None)]:
+        sides.append(Side(arrays['price'][rows], arrays['size'][rows], order_ids[rows]))
+    return Snapshot(book.sequence, _encode_time(book.timestamp), book.fixed_point, id_kind, *sides)
+
+
+def from_rows(sequence, bids, asks, timestamp=None, fixed_point=False):
+    """
+    Snapshot of level 3 rows e.g. from `PublicClient.get_product_order_book(level=3)`
+
+    Parameters
+    ----------
+    sequence: int
+    bids: list
+        [price, size, order_id] rows, best price first
+    asks: list
+    timestamp: pd.datetime
+    fixed_point: bool
+        store fixed point prices and sizes
+
+    Returns
+    -------
+    Snapshot
+    """
+    to_array = util.to_fixed_array if fixed_point else lambda values: np.array(values, dtype=np.float_)
+    sides = []
+    for rows in [bids, asks]:
+        prices, sizes, order_ids = zip(*rows) if len(rows) else ([], [], [])
+        sides.append((to_array(prices), to_array(sizes), order_ids))
+    return from_arrays(sequence, sides[0], sides[1], timestamp=timestamp, fixed_point=fixed_point)
+
+
+def from_arrays(sequence, bids, asks, timestamp=None, fixed_point=False):
+    """
+    Snapshot of the orders of each side as arrays e.g. from `stream.read_arrays`
+
+    Parameters
+    ----------
+    sequence: int
+    bids: tuple(np.array, np.array, list)
+        prices, sizes and order ids, best price first. Prices and sizes are fixed point integers if `fixed_point`.
+    asks: tuple(np.array, np.array, list)
+    timestamp: pd.datetime
+    fixed_point: bool
+
+    Returns
+    -------
+    Snapshot
+    """
+    id_kind, order_ids = encode_ids(list(bids[2]) + list(asks[2]))
+    num_bids = len(bids[2])
+    return Snapshot(sequence, _encode_time(timestamp), fixed_point, id_kind,
+                    Side(np.asarray(bids[0]), np.asarray(bids[1]), order_ids[:num_bids]),
+                    Side(np.asarray(asks[0]), np.asarray(asks[1]), order_ids[num_bids:]))
+
+
+def write(path, snapshot):
+    """
+    Write a snapshot file. The file is replaced atomically so readers never see a partial snapshot.
+    """
+    number_dtype = '<i8' if snapshot.fixed_point else '<f8'
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['flags'] = FIXED_POINT if snapshot.fixed_point else 0
+    header['sequence'] = snapshot.sequence
+    header['timestamp'] = snapshot.timestamp
+    header['num_bids'] = len(snapshot.bids.prices)
+    header['num_asks'] = len(snapshot.asks.prices)
+    header['id_kind'] = snapshot.id_kind
+    header['id_width'] = snapshot.bids.order_ids.dtype.itemsize
+
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'wb') as f:
+        header.tofile(f)
+        for side in [snapshot.bids, snapshot.asks]:
+            np.asarray(side.prices, dtype=number_dtype).tofile(f)
+            np.asarray(side.sizes, dtype=number_dtype).tofile(f)
+            side.order_ids.astype(snapshot.bids.order_ids.dtype).tofile(f)
+    os.rename(tmp_path, path)
+
+
+def read(path, mmap=True):
+    """
+    Read a snapshot file
+
+    Parameters
+    ----------
+    path: str
+    mmap: bool
+        memory map the file instead of reading it
+
+    Returns
+    -------
+    Snapshot
+        the arrays are read only views of the file
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r') if mmap else np.fromfile(path, dtype=np.uint8)
+    if len(data) < HEADER_DTYPE.itemsize:
+        raise ValueError('{} is not an order book snapshot'.format(path))
+    header = data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError('{} is not an order book snapshot'.format(path))
+    if header['version'] != VERSION:
+        raise ValueError('Unsupported snapshot version {} in {}'.format(header['version'], path))
+
+    fixed_point = bool(header['flags'] & FIXED_POINT)
+    number_dtype = np.dtype('<i8' if fixed_point else '<f8')
+    id_kind = int(header['id_kind'])
+    id_dtype = {ID_UUID: np.dtype('V16'), ID_INT: np.dtype('<i8')}.get(id_kind)
+    if id_dtype is None:
+        id_dtype = np.dtype('S{}'.format(header['id_width']))
+
+    offset = HEADER_DTYPE.itemsize
+    sides = []
+    for num_orders in [int(header['num_bids']), int(header['num_asks'])]:
+        arrays = []
+        for dtype in [number_dtype, number_dtype, id_dtype]:
+            end = offset + num_orders * dtype.itemsize
+            if end > len(data):
+                raise ValueError('{} is truncated'.format(path))
+            arrays.append(data[offset:end].view(dtype))
+            offset = end
+        sides.append(Side(*arrays))
+    return Snapshot(int(header['sequence']), int(header['timestamp']), fixed_point, id_kind, *sides)
+
+
+def to_book(snapshot, **kwargs):
+    """
+    Create a book from a snapshot with GdaxOrderBook.from_arrays
+
+    Parameters
+    ----------
+    snapshot: Snapshot
+    kwargs:
+        see GdaxOrderBook. fixed_point defaults to the snapshot's.
+
+    Returns
+    -------
+    GdaxOrderBook
+    """
+    fixed_point = kwargs.setdefault('fixed_point', snapshot.fixed_point)
+    sides = []
+    for side in [snapshot.bids, snapshot.asks]:
+        prices, sizes = side.prices, side.sizes
+        if snapshot.fixed_point and not fixed_point:
+            prices, sizes = util.from_fixed(prices), util.from_fixed(sizes)
+        elif fixed_point and not snapshot.fixed_point:
+            prices, sizes = util.to_fixed_array(prices), util.to_fixed_array(sizes)
+        sides.append((prices, sizes, decode_ids(snapshot.id_kind, side.order_ids)))
+    return GdaxOrderBook.from_arrays(snapshot.sequence, bids=sides[0], asks=sides[1],
+                                     timestamp=_decode_time(snapshot.timestamp), **kwargs)
+
+
+def save_book(path, book):
+    """
+    Write a snapshot of a book e.g. a backtest checkpoint
+    """
+    write(path, from_book(book))
+
+
+def load_book(path, **kwargs):
+    """
+    Create a book from a snapshot file, see to_book
+    """
+    return to_book(read(path), **kwargs)
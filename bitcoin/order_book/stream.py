@@ -0,0 +1,186 @@
+"""
+Incremental parser of level 3 REST order books.
+
+`PublicClient.get_product_order_book(level=3)` decodes the whole JSON body into nested lists of strings, which the
+book then converts again. The parser here reads the body a chunk at a time as it is downloaded (see
+`PublicClient.stream_product_order_book`) and converts the complete [price, size, order_id] rows of each chunk to
+arrays straight away, so only the arrays of the book and one chunk of text are held in memory:
+
+    chunks = client.stream_product_order_book('BTC-USD', level=3)
+    sequence, bids, asks = stream.read_arrays(chunks, fixed_point=True)
+    book = GdaxOrderBook.from_arrays(sequence, bids=bids, asks=asks, fixed_point=True)
+
+read_book and read_snapshot do the same for a book or a binary snapshot (see order_book.snapshot).
+"""
+import json
+import re
+
+import numpy as np
+
+import bitcoin.util as util
+import snapshot
+from gdax_order_book import GdaxOrderBook
+
+
+SIDES = ['bids', 'asks']
+
+_KEY = re.compile(r'\s*[{,]?\s*"([^"\\]*)"\s*:\s*')
+_END = re.compile(r'\s*}')
+_SEQUENCE = re.compile(r'"?(-?\d+)"?(?=\s*[,}])')
+_ARRAY_START = re.compile(r'\s*\[')
+_ARRAY_END = re.compile(r'\s*\]')
+_ROWS = re.compile(r'(?:\s*,?\s*\[\s*"[^"\\]*"\s*,\s*"[^"\\]*"\s*,\s*"[^"\\]*"\s*\])+')  # complete rows
+_ROW = re.compile(r'\[\s*"([^"\\]*)"\s*,\s*"([^"\\]*)"\s*,\s*"([^"\\]*)"\s*\]')
+_DECODER = json.JSONDecoder()
+
+
+def iter_book(chunks):
+    """
+    Parse a level 3 order book JSON body incrementally
+
+    Parameters
+    ----------
+    chunks: iterable of str
+        the body in pieces of any size e.g. `response.iter_content(chunk_size)`
+
+    Returns
+    -------
+    generator of (str, object)
+        ('sequence', int) and (side, rows) for every batch of complete rows of a side, where side is bids or asks
+        and rows a list of (price, size, order_id) strings. Other keys are yielded with their decoded value.
+    """
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    eof = False
+    state = 'key'  # key, rows or done
+    side = None
+
+    while state != 'done':
+        if state == 'key':
+            match = _KEY.match(buf, pos)
+            if match is not None and match.end() < len(buf):
+                key = match.group(1)
+                if key in SIDES:
+                    start = _ARRAY_START.match(buf, match.end())
+                    if start is not None:
+                        pos = start.end()
+                        state, side = 'rows', key
+                        continue
+                elif key == 'sequence':
+                    value = _SEQUENCE.match(buf, match.end())
+                    if value is not None:
+                        pos = value.end()
+                        yield key, int(value.group(1))
+                        continue
+                else:
+                    try:
+                        value, end = _DECODER.raw_decode(buf, match.end())
+                    except ValueError:
+                        # incomplete value
+                        end = len(buf)
+                    if end < len(buf):
+                        pos = end
+                        yield key, value
+                        continue
+            elif _END.match(buf, pos) is not None:
+                state = 'done'
+                continue
+        else:
+            match = _ROWS.match(buf, pos)
+            if match is not None:
+                yield side, _ROW.findall(buf, pos, match.end())
+                pos = match.end()
+            end = _ARRAY_END.match(buf, pos)
+            if end is not None:
+                pos = end.end()
+                state = 'key'
+                continue
+            if match is not None:
+                continue
+
+        # the next token is incomplete
+        if eof:
+            raise ValueError('Invalid order book at: {!r}'.format(buf[pos:pos + 100]))
+        try:
+            buf = buf[pos:] + next(chunks)
+        except StopIteration:
+            buf = buf[pos:]
+            eof = True
+        pos = 0
+
+
+def _to_array(values, fixed_point):
+    return util.to_fixed_array(values) if fixed_point else np.array(values, dtype=np.float_)
+
+
+def _concatenate(arrays, fixed_point):
+    return np.concatenate(arrays) if arrays else _to_array([], fixed_point)
+
+
+def read_arrays(chunks, fixed_point=False):
+    """
+    Read a level 3 order book JSON body into arrays, see iter_book
+
+    Parameters
+    ----------
+    chunks: iterable of str
+    fixed_point: bool
+        convert prices and sizes to fixed point integers, see util.to_fixed
+
+    Returns
+    -------
+    tuple(int, tuple, tuple)
+        sequence, bids and asks. Each side is (prices, sizes, order_ids) in the order of the body, see
+        OrderBook.from_arrays.
+    """
+    columns = {side: ([], [], []) for side in SIDES}
+    sequence = None
+
+    for key, value in iter_book(chunks):
+        if key == 'sequence':
+            sequence = value
+        elif key in columns and value:
+            prices, sizes, order_ids = zip(*value)
+            side = columns[key]
+            side[0].append(_to_array(prices, fixed_point))
+            side[1].append(_to_array(sizes, fixed_point))
+            side[2].extend(order_ids)
+
+    if sequence is None:
+        raise ValueError('Order book without a sequence')
+    result = [sequence]
+    for side in SIDES:
+        prices, sizes, order_ids = columns[side]
+        result.append((_concatenate(prices, fixed_point), _concatenate(sizes, fixed_point), order_ids))
+    return tuple(result)
+
+
+def read_book(chunks, **kwargs):
+    """
+    Create a book from a level 3 order book JSON body, see read_arrays
+
+    Parameters
+    ----------
+    chunks: iterable of str
+    kwargs:
+        see GdaxOrderBook
+
+    Returns
+    -------
+    GdaxOrderBook
+    """
+    sequence, bids, asks = read_arrays(chunks, fixed_point=kwargs.get('fixed_point', False))
+    return GdaxOrderBook.from_arrays(sequence, bids=bids, asks=asks, **kwargs)
+
+
+def read_snapshot(chunks, timestamp=None, fixed_point=False):
+    """
+    Snapshot of a level 3 order book JSON body for snapshot.write, see read_arrays
+
+    Returns
+    -------
+    snapshot.Snapshot
+    """
+    sequence, bids, asks = read_arrays(chunks, fixed_point=fixed_point)
+    return snapshot.from_arrays(sequence, bids, asks, timestamp=timestamp, fixed_point=fixed_point)
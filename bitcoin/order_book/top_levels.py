@@ -0,0 +1,156 @@
+from bisect import bisect_left
+
+import numpy as np
+
+
+class TopLevels(object):
+    def __init__(self, side, depth, dtype=np.float_):
+        """
+        Level 2 view of the best `depth` levels of one side of the book. The view is kept in numpy arrays that are
+        updated in place by OrderBook, so reading the top of the book does not walk the levels. Changes to levels
+        deeper than the view cost a single comparison.
+
+        The view always holds min(depth, number of levels) levels, best price first. `version` is incremented
+        whenever the view changes so readers can skip unchanged views.
+
+        Parameters
+        ----------
+        side: str
+            buy or sell
+        depth: int
+            number of levels in the view
+        dtype: np.dtype
+            dtype of prices and sizes, np.int_ for fixed point books
+        """
+        self.side = side
+        self.depth = depth
+        self._sign = -1 if side == 'buy' else 1
+        self._keys = []  # sign * price for each level in the view so that the best price has the smallest key
+        self.prices = np.zeros(depth, dtype=dtype)
+        self.sizes = np.zeros(depth, dtype=dtype)
+        self.counts = np.zeros(depth, dtype=np.int_)
+        self.version = 0
+
+    def _set(self, idx, level):
+        self.prices[idx] = level.price
+        self.sizes[idx] = level.size
+        self.counts[idx] = len(level)
+
+    def _shift(self, start, stop, offset):
+        """
+        Move the levels in [start, stop) by offset
+        """
+        for arr in (self.prices, self.sizes, self.counts):
+            arr[start + offset:stop + offset] = arr[start:stop]
+
+    def add(self, level):
+        """
+        A new level was added to the side
+        """
+        keys = self._keys
+        key = self._sign * level.price
+        num_levels = len(keys)
+        if num_levels == self.depth:
+            if key > keys[-1]:
+                return
+            # the last level drops out of the view
+            keys.pop()
+            num_levels -= 1
+
+        idx = bisect_left(keys, key)
+        keys.insert(idx, key)
+        self._shift(idx, num_levels, 1)
+        self._set(idx, level)
+        self.version += 1
+
+    def update(self, level):
+        """
+        The size or number of orders of an existing level changed
+        """
+        keys = self._keys
+        key = self._sign * level.price
+        if not keys or key > keys[-1]:
+            return
+        idx = bisect_left(keys, key)
+        self.sizes[idx] = level.size
+        self.counts[idx] = len(level)
+        self.version += 1
+
+    def remove(self, level, levels):
+        """
+        A level was removed from the side. The next level of `levels` moves into the view.
+
+        Parameters
+        ----------
+        level: PriceLevel
+        levels: SortedLevels or PriceLadder
+            side of the book after the level was removed
+        """
+        keys = self._keys
+        key = self._sign * level.price
+        if not keys or key > keys[-1]:
+            return
+        idx = bisect_left(keys, key)
+        self.version += 1
+        del keys[idx]
+        num_levels = len(keys)
+        self._shift(idx + 1, num_levels + 1, -1)
+
+        if len(levels) > num_levels:
+            next_level = levels[num_levels]
+            keys.append(self._sign * next_level.price)
+            self._set(num_levels, next_level)
+
+    def reset(self, levels):
+        """
+        Rebuild the view from a side of the book
+        """
+        self._keys = []
+        self.version += 1
+        for idx, level in enumerate(levels[:self.depth]):
+            self._keys.append(self._sign * level.price)
+            self._set(idx, level)
+
+    def copy(self):
+        result = TopLevels(self.side, 0)
+        result.depth = self.depth
+        result._keys = self._keys[:]
+        result.prices = self.prices.copy()
+        result.sizes = self.sizes.copy()
+        result.counts = self.counts.copy()
+        result.version = self.version
+        return result
+
+    def to_arrays(self, depth=None):
+        """
+        Views of the prices, sizes and number of orders of the best `depth` levels. The arrays are not copied and
+        change as the book is updated.
+
+        Returns
+        -------
+        tuple(np.array, np.array, np.array)
+        """
+        num_levels = len(self._keys) if depth is None else min(depth, len(self._keys))
+        return self.prices[:num_levels], self.sizes[:num_levels], self.counts[:num_levels]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __getitem__(self, idx):
+        """
+        (price, size, number of orders) of a level in the view
+        """
+        if not -len(self._keys) <= idx < len(self._keys):
+            raise IndexError('TopLevels index out of range')
+        return self.prices[idx], self.sizes[idx], self.counts[idx]
+
+    def __eq__(self, other):
+        return (self.side == other.side and self.depth == other.depth and self._keys == other._keys and
+                all(np.array_equal(a, b) for a, b in zip(self.to_arrays(), other.to_arrays())))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        prices, sizes, counts = self.to_arrays()
+        return 'TopLevels({}, {})'.format(self.side, zip(prices.tolist(), sizes.tolist(), counts.tolist()))
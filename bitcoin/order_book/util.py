@@ -1,3 +1,9 @@
+import numpy as np
+import pandas as pd
+
+
+BID = 0
+ASK = 1
 
 
 def order_book_data_to_set(data):
@@ -7,10 +13,168 @@ def order_book_data_to_set(data):
     return result
 
 
+def get_checksum(orders):
+    """
+    Checksum of (price, size, order_id) tuples, same as `OrderBook.checksum` for a book with these orders.
+    Prices and sizes must be converted the same way as in the book e.g. floats or fixed point integers.
+
+    Parameters
+    ----------
+    orders: iterable of (price, size, order_id)
+
+    Returns
+    -------
+    int
+    """
+    checksum = 0
+    for order in orders:
+        checksum ^= hash(tuple(order))
+    return checksum
+
+
 def compare_books(actual, expected):
+    """
+    Number of orders that differ between two books. Books with the same checksum are assumed to be equal.
+    """
+    if actual.checksum == expected.checksum:
+        return 0
     actual = actual.to_set()
     expected = expected.to_set()
     extra = actual.difference(expected)
     missing = expected.difference(actual)
     result = len(extra.union(missing))
     return result
+
+
+def aggregate_orders(prices, sizes):
+    """
+    Aggregate level 3 orders to level 2 without a python loop. Prices must compare exactly, which fixed point books
+    guarantee, so that orders at the same price are grouped together.
+
+    Parameters
+    ----------
+    prices: np.array
+    sizes: np.array
+
+    Returns
+    -------
+    tuple(np.array, np.array, np.array)
+        level prices in ascending order, total size and number of orders at each level
+    """
+    prices = np.asarray(prices)
+    sizes = np.asarray(sizes)
+    if not len(prices):
+        return prices, sizes, np.zeros(0, dtype=np.int_)
+    order = np.argsort(prices, kind='mergesort')
+    prices = prices[order]
+    starts = np.flatnonzero(np.r_[True, prices[1:] != prices[:-1]])
+    total = np.add.reduceat(sizes[order], starts)
+    counts = np.diff(np.r_[starts, len(prices)])
+    return prices[starts], total, counts
+
+
+def book_to_records(book):
+    """
+    Level 3 book as a structured array sorted by order_id.
+
+    Returns
+    -------
+    np.recarray
+        fields: [order_id, side, price, size, depth, distance]
+        side is BID or ASK, depth is the number of levels between the order and the touch and distance is the
+        absolute price difference to the touch
+    """
+    order_ids, sides, prices, sizes, depths, distances = [], [], [], [], [], []
+    for side, levels in [(BID, book.bids), (ASK, book.asks)]:
+        best_price = None
+        for depth, level in enumerate(levels):
+            best_price = level.price if best_price is None else best_price
+            level_ids, level_sizes = level.to_lists()
+            order_ids.extend(level_ids)
+            sizes.extend(level_sizes)
+            num_orders = len(level_ids)
+            sides.extend([side] * num_orders)
+            prices.extend([level.price] * num_orders)
+            depths.extend([depth] * num_orders)
+            distances.extend([abs(level.price - best_price)] * num_orders)
+
+    order_ids = np.array(order_ids) if order_ids else np.array([], dtype=str)
+    records = np.rec.fromarrays([order_ids, np.array(sides, dtype=np.int8), np.array(prices),
+                                 np.array(sizes), np.array(depths, dtype=np.int_), np.array(distances)],
+                                names=['order_id', 'side', 'price', 'size', 'depth', 'distance'])
+    records = records[np.argsort(records['order_id'], kind='mergesort')]
+    return records
+
+
+def diff_books(actual, expected):
+    """
+    Orders that are missing, extra or have a different price or size in `actual` compared to `expected`. Both books
+    are exported with book_to_records and matched on order_id with a single sorted merge.
+
+    Parameters
+    ----------
+    actual: OrderBook
+    expected: OrderBook
+
+    Returns
+    -------
+    pd.DataFrame
+        columns: [kind, side, depth, distance, price, order_id, actual_size, expected_size]
+        kind is missing, extra or changed. side, depth, distance and price are from the expected book except for
+        extra orders. Sorted by side and depth.
+    """
+    actual = book_to_records(actual)
+    expected = book_to_records(expected)
+    # both are sorted by order_id. np.intersect1d(return_indices=True) needs numpy >= 1.15
+    actual_idx = np.flatnonzero(np.in1d(actual['order_id'], expected['order_id'], assume_unique=True))
+    expected_idx = np.searchsorted(expected['order_id'], actual['order_id'][actual_idx])
+    extra = np.ones(len(actual), dtype=bool)
+    extra[actual_idx] = False
+    missing = np.ones(len(expected), dtype=bool)
+    missing[expected_idx] = False
+    changed = ((actual['size'][actual_idx] != expected['size'][expected_idx]) |
+               (actual['price'][actual_idx] != expected['price'][expected_idx]) |
+               (actual['side'][actual_idx] != expected['side'][expected_idx]))
+    actual_changed = actual[actual_idx[changed]]
+    expected_changed = expected[expected_idx[changed]]
+
+    def _to_df(kind, records, actual_size, expected_size):
+        return pd.DataFrame({'kind': kind,
+                             'side': np.where(records['side'] == BID, 'bid', 'ask'),
+                             'depth': records['depth'],
+                             'distance': records['distance'],
+                             'price': records['price'],
+                             'order_id': records['order_id'],
+                             'actual_size': actual_size,
+                             'expected_size': expected_size})
+
+    nan_extra = np.full(extra.sum(), np.nan)
+    nan_missing = np.full(missing.sum(), np.nan)
+    frames = [
+        _to_df('missing', expected[missing], nan_missing, expected['size'][missing]),
+        _to_df('extra', actual[extra], actual['size'][extra], nan_extra),
+        _to_df('changed', expected_changed, actual_changed['size'], expected_changed['size']),
+    ]
+    columns = ['kind', 'side', 'depth', 'distance', 'price', 'order_id', 'actual_size', 'expected_size']
+    df = pd.concat(frames, ignore_index=True)[columns]
+    df = df.sort_values(['side', 'depth'], kind='mergesort').reset_index(drop=True)
+    return df
+
+
+def summarize_diff(diff):
+    """
+    Number of differences of each kind by price level
+
+    Parameters
+    ----------
+    diff: pd.DataFrame
+        output of diff_books
+
+    Returns
+    -------
+    pd.DataFrame
+        index: [side, depth, price]
+        columns: [missing, extra, changed]
+    """
+    summary = diff.groupby(['side', 'depth', 'price', 'kind']).size().unstack('kind', fill_value=0)
+    return summary.reindex(columns=['missing', 'extra', 'changed'], fill_value=0)
@@ -3,6 +3,10 @@ import numpy as np
 
 DEFAULT_EXCHANGE = 'GDAX'
 DEFAULT_PRODUCT = 'BTC-USD'
+DEFAULT_ENGINE = 'sorted'
+DEFAULT_TICK_SIZE = 0.01
+DEFAULT_TOP_DEPTH = 10  # levels kept in OrderBook.top_bids and top_asks
+FIXED_POINT_SCALE = 10 ** 8  # fixed point prices and sizes are integer multiples of 1e-8
 
 WS_URL = {
     'GDAX': 'wss://ws-feed.gdax.com',
@@ -21,6 +25,17 @@ CHANNEL = {
     }
 }
 
+TICK_SIZE = {
+    'GDAX': {
+        'BTC-USD': 0.01,
+        'ETH-USD': 0.01,
+        'ETH-BTC': 0.00001,
+    },
+    'BITSTAMP': {
+        'BTC-USD': 0.01,
+    }
+}
+
 SNAPSHOT_TBL = {
     'GDAX': {
         'BTC-USD': 'GdaxBtcUsdSnapshot',
@@ -71,4 +86,8 @@ MSG_DTYPE = {
         }
 }
 
+# message fields converted to fixed point integers, see util.parse_message
+FIXED_POINT_FIELDS = ['price', 'size', 'remaining_size', 'new_size', 'old_size']
+ORDER_ID_FIELDS = ['order_id', 'maker_order_id', 'taker_order_id']
+
 DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
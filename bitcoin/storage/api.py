@@ -1,17 +1,22 @@
+import itertools
+import multiprocessing
+import numpy as np
 import pandas as pd
 from collections import namedtuple
 
+import bitcoin.order_book.batch as batch
 import bitcoin.params as pms
 import bitcoin.storage.util as sutil
 import bitcoin.logs.logger as lc
 import bitcoin.util as util
+from bitcoin.order_book.order_ids import OrderIds
 
 
 logger = lc.config_logger('storage_api', level='DEBUG', file_handler=False)
 Dataset = namedtuple('Dataset', ['books', 'messages'])
 
 
-def get_book(at=None, exchange=None, product=None):
+def get_book(at=None, exchange=None, product=None, engine=None, fixed_point=False, intern_ids=False):
     """
     Get order book at a particular time or sequence number.
 
@@ -23,41 +28,194 @@ def get_book(at=None, exchange=None, product=None):
         by default return the latest book
     exchange: str
     product: str
+    engine: str
+        order book engine, see OrderBook
+    fixed_point: bool
+        use fixed point prices and sizes, see OrderBook
+    intern_ids: bool
+        key orders on integer handles, see OrderIds
 
     Returns
     -------
     GdaxOrderBook
     """
     exchange = exchange or pms.DEFAULT_EXCHANGE
+    product = product or pms.DEFAULT_PRODUCT
 
     # get latest snapshot
     snapshot_df = get_closest_snapshot(at=at, exchange=exchange, product=product)
+    book = _snapshot_to_book(snapshot_df, exchange, product, engine=engine, fixed_point=fixed_point,
+                             intern_ids=intern_ids)
+
+    # get and apply messages
+    columns = _get_columns(book, at, exchange, product, fixed_point=fixed_point)
+    _apply_until(book, columns, at)
+    logger.debug('Book ready: {}'.format(book.sequence))
+    return book
+
 
-    # convert to book object
-    book = sutil.df_to_book(snapshot_df)
+def _snapshot_to_book(snapshot_df, exchange, product, engine=None, fixed_point=False, intern_ids=False):
+    """
+    Convert a snapshot to a book object
+    """
+    tick_size = pms.TICK_SIZE[exchange][product]
+    order_ids = OrderIds() if intern_ids else None
+    book = sutil.df_to_book(snapshot_df, engine=engine, tick_size=tick_size, fixed_point=fixed_point,
+                            order_ids=order_ids)
     logger.debug('Got book: {}'.format(book.sequence))
+    return book
 
-    # get messages
-    if isinstance(at, int):
+
+def _get_columns(book, end, exchange, product, fixed_point=False):
+    """
+    Messages from the book until `end` in the columnar format of `order_book.batch`
+    """
+    if isinstance(end, int):
         start = book.sequence
-        end = at
     else:
-        # move start back by 1 sec to get any missing messages
+        # move start back by 1 min to get any missing messages
         start = pd.to_datetime(book.timestamp) - pd.offsets.Timedelta('1m')
-        end = pd.to_datetime(at)
-    messages = get_messages(start=start, end=end, exchange=exchange, product=product)
+        end = pd.to_datetime(end)
+    messages = get_messages(start=start, end=end, exchange=exchange, product=product, fixed_point=fixed_point)
+    return batch.messages_to_columns(messages, fixed_point=fixed_point, order_ids=book.order_ids)
 
-    # apply messages
-    for msg in messages:
-        # break if reached the end
-        if isinstance(at, int) and book.sequence >= at:
-            break
-        elif isinstance(at, pd.datetime) and book.timestamp >= at:
-            break
-        else:
-            book.process_message(msg)
-    logger.debug('Book ready: {}'.format(book.sequence))
-    return book
+
+def _apply_until(book, columns, at, start=0):
+    """
+    Apply messages to the book until time or sequence `at`, see GdaxOrderBook.apply_batch
+
+    Returns
+    -------
+    int
+        first row not applied
+    """
+    if isinstance(at, int):
+        row = book.apply_batch(columns, start=start, end_sequence=at)
+    else:
+        row = book.apply_batch(columns, start=start, end_time=at)
+    if row < len(columns['sequence']) and columns['sequence'][row] > book.sequence + 2:
+        logger.warning('Missing messages after {}'.format(book.sequence))
+    return row
+
+
+def get_books(ats, workers=None, exchange=None, product=None, engine=None, fixed_point=False, intern_ids=False):
+    """
+    Get order books at many times or sequence numbers, see get_book.
+
+    The times are grouped by the snapshot before them and each group is built in a worker process from a single
+    snapshot and a single message query: the book is replayed through the group in time order and a clone of the
+    book is taken at each time. Groups are processed in parallel and the books are yielded in time order as soon as
+    their group and all the groups before it are done, so only a few groups are held in memory.
+
+    Parameters
+    ----------
+    ats: list[pd.datetime] or list[int]
+        times or sequence numbers, all of the same type
+    workers: int
+        number of worker processes, by default the number of cores. 1 builds the books in this process.
+    exchange: str
+    product: str
+    engine: str
+    fixed_point: bool
+    intern_ids: bool
+        see get_book
+
+    Returns
+    -------
+    generator
+        yields (at, GdaxOrderBook) sorted by at
+    """
+    exchange = exchange or pms.DEFAULT_EXCHANGE
+    product = product or pms.DEFAULT_PRODUCT
+    ats = list(ats)
+    if not ats:
+        return
+    by_sequence = isinstance(ats[0], (int, long))
+    assert all(isinstance(at, (int, long)) == by_sequence for at in ats), 'Mixed times and sequence numbers'
+    ats = sorted(int(at) for at in ats) if by_sequence else sorted(pd.to_datetime(at) for at in ats)
+
+    # group by covering snapshot
+    snapshots = get_snapshot_index(exchange=exchange, product=product)
+    key = 'sequence' if by_sequence else 'received_time'
+    values = snapshots[key].values if by_sequence else pd.to_datetime(snapshots[key]).values
+    keys = ats if by_sequence else np.array(ats, dtype='datetime64[ns]')
+    idx = np.searchsorted(values, keys, side='right') - 1
+    assert idx[0] >= 0, 'No snapshot found at {}'.format(ats[0])
+
+    groups = []
+    for snapshot_idx, group in itertools.groupby(zip(ats, idx), key=lambda pair: pair[1]):
+        sequence = int(snapshots['sequence'].iloc[snapshot_idx])
+        group = [at for at, _ in group]
+        groups.append((sequence, group, exchange, product, engine, fixed_point, intern_ids))
+    logger.info('Building {:,} books from {:,} snapshots'.format(len(ats), len(groups)))
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers == 1:
+        results = (_get_group_books(group) for group in groups)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes=min(workers, len(groups)), initializer=_init_worker)
+        results = pool.imap(_get_group_books, groups)
+
+    try:
+        for books in results:
+            for at, book in books:
+                yield at, book
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def _init_worker():
+    # database connections cannot be shared with the parent process
+    sutil.ENGINE.dispose()
+
+
+def _get_group_books(group):
+    """
+    Books at each time of a group built from the snapshot at `sequence`, see get_books
+
+    Returns
+    -------
+    list[(at, GdaxOrderBook)]
+    """
+    sequence, ats, exchange, product, engine, fixed_point, intern_ids = group
+    snapshot_df = get_closest_snapshot(at=sequence, exchange=exchange, product=product)
+    book = _snapshot_to_book(snapshot_df, exchange, product, engine=engine, fixed_point=fixed_point,
+                             intern_ids=intern_ids)
+    columns = _get_columns(book, ats[-1], exchange, product, fixed_point=fixed_point)
+
+    result = []
+    row = 0
+    for at in ats:
+        row = _apply_until(book, columns, at, start=row)
+        result.append((at, book.clone()))
+    return result
+
+
+def get_snapshot_index(exchange=None, product=None):
+    """
+    Sequence and time of every stored snapshot.
+
+    Parameters
+    ----------
+    exchange: str
+    product: str
+
+    Returns
+    -------
+    pd.DataFrame
+        columns: [sequence, received_time] sorted by sequence
+    """
+    exchange = exchange or pms.DEFAULT_EXCHANGE
+    product = product or pms.DEFAULT_PRODUCT
+    table_name = pms.SNAPSHOT_TBL[exchange][product]
+    sql = '''
+    SELECT DISTINCT sequence, received_time FROM {table}
+    ORDER BY sequence
+    '''.format(table=table_name)
+    logger.debug(sql)
+    return pd.read_sql(sql, con=sutil.ENGINE)
 
 
 def get_closest_snapshot(at=None, exchange=None, product=None):
@@ -110,7 +268,7 @@ def get_closest_snapshot(at=None, exchange=None, product=None):
     return df
 
 
-def get_messages(start=None, end=None, exchange=None, product=None):
+def get_messages(start=None, end=None, exchange=None, product=None, fixed_point=False):
     """
     Get messages by time or sequence number.
 
@@ -124,6 +282,8 @@ def get_messages(start=None, end=None, exchange=None, product=None):
         int: query by sequence
     exchange: str
     product: str
+    fixed_point: bool
+        parse prices and sizes as fixed point integers
 
     Returns
     -------
@@ -163,7 +323,7 @@ def get_messages(start=None, end=None, exchange=None, product=None):
     messages = sutil.xread_sql(sql)
 
     for msg in messages:
-        msg = util.parse_message(msg, exchange)
+        msg = util.parse_message(msg, exchange, fixed_point=fixed_point)
         yield msg
 
 
@@ -1,3 +1,4 @@
+import os
 import sys
 from datetime import datetime, timedelta
 from threading import Thread
@@ -5,6 +6,7 @@ import pandas as pd
 
 import bitcoin.gdax.public_client as gdax
 import bitcoin.logs.logger as lc
+import bitcoin.order_book.snapshot as snapshot
 import bitcoin.params as params
 import bitcoin.storage.util as sutil
 import bitcoin.util as util
@@ -15,7 +17,14 @@ sys.excepthook = util.handle_exception
 
 
 class GdaxMsgStorage(WebSocket):
-    def __init__(self, product_id):
+    def __init__(self, product_id, snapshot_dir=None):
+        """
+        Parameters
+        ----------
+        product_id: str
+        snapshot_dir: str
+            also write every stored order book to this directory as a binary snapshot, see order_book.snapshot
+        """
         self.exchange = 'GDAX'
         url = params.WS_URL[self.exchange]
         channel = params.CHANNEL[self.exchange][product_id]
@@ -24,6 +33,7 @@ class GdaxMsgStorage(WebSocket):
         self.msgs = []
         self.last_sequence = -1
         self.product_id = product_id
+        self.snapshot_dir = snapshot_dir
 
         self.msg_store_freq = timedelta(minutes=1)  # frequency of storing messages
         self.book_store_freq = timedelta(minutes=60)  # frequency of storing order book
@@ -86,6 +96,10 @@ class GdaxMsgStorage(WebSocket):
         # store
         table_name = params.SNAPSHOT_TBL[self.exchange][self.product_id]
         sutil.store_df(df, table_name)
+        if self.snapshot_dir:
+            path = os.path.join(self.snapshot_dir, '{}_{}.snap'.format(self.product_id, data['sequence']))
+            snapshot.write(path, snapshot.from_rows(data['sequence'], data['bids'], data['asks'], timestamp))
+            logger.info('Wrote snapshot {}'.format(path))
 
         logger.info('=' * 30)
         return
@@ -114,7 +128,8 @@ class GdaxMsgStorage(WebSocket):
 
 if __name__ == '__main__':
     product_id = sys.argv[1]
+    snapshot_dir = sys.argv[2] if len(sys.argv) > 2 else None
     logger = lc.config_logger('gdax_msgs', fsuffix=product_id)
 
-    ws = GdaxMsgStorage(product_id)
+    ws = GdaxMsgStorage(product_id, snapshot_dir=snapshot_dir)
     ws.start()
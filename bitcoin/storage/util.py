@@ -51,7 +51,7 @@ def store_df(df, tbl_name):
     return
 
 
-def df_to_book(df):
+def df_to_book(df, **kwargs):
     """
     Convert DataFrame to order book.
 
@@ -60,6 +60,8 @@ def df_to_book(df):
     df: pd.DataFrame
         index: ordinal
         columns: [sequence, received_time, side, price, size, order_id]
+    kwargs:
+        passed to GdaxOrderBook e.g. engine, tick_size and fixed_point
 
     Returns
     -------
@@ -76,7 +78,7 @@ def df_to_book(df):
     bids = bids[columns].values
     asks = asks[columns].values
     timestamp = pd.to_datetime(df['received_time'].unique()[0])
-    book = ob.GdaxOrderBook(sequence, bids=bids, asks=asks, timestamp=timestamp)
+    book = ob.GdaxOrderBook(sequence, bids=bids, asks=asks, timestamp=timestamp, **kwargs)
     return book
 
 
@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 
 import bitcoin.logs.logger as lc
+import bitcoin.util as util
 
 
 logger = lc.config_logger('strategy_util', level='INFO', file_handler=False)
@@ -16,20 +17,45 @@ def get_vwap(book, size):
     ----------
     book: object
     size: int
+        number of coins, also for fixed point books
 
     Returns
     -------
     float
     """
+    # fixed point prices and sizes are converted to floats, see util.to_fixed
+    fixed_point = getattr(book, 'fixed_point', False)
+    to_float = util.from_fixed if fixed_point else lambda value: value
+
+    if getattr(book, 'bid_depth', None) is not None:
+        # O(log n) per side with the book's depth index
+        book_size = util.to_fixed(size) if fixed_point else size
+        avg_bid = book.get_vwap('buy', book_size)
+        avg_ask = book.get_vwap('sell', book_size)
+        if avg_bid is not None and avg_ask is not None:
+            return to_float((avg_bid + avg_ask) / 2)
+
     all_levels = dict(bids=book.bids, asks=book.asks)
+    all_top = dict(bids=getattr(book, 'top_bids', None), asks=getattr(book, 'top_asks', None))
     vwap = dict(bids=0, asks=0)
 
     for side, levels in all_levels.iteritems():
+        top = all_top[side]
+        if top is not None:
+            prices, sizes, _ = top.to_arrays()
+            prices, sizes = to_float(prices), to_float(sizes)
+            if sizes.sum() > size:
+                # the top levels have enough volume, take min(level size, size left) from each level
+                volume_before = np.cumsum(sizes) - sizes
+                vwap[side] = np.dot(prices, np.clip(size - volume_before, 0, sizes))
+                continue
+
         volume_so_far = 0
         for level in levels:
+            level_size = to_float(level.size)
             # size is min(level size, max size)
-            vwap[side] += level.price * min(level.size, size - volume_so_far)
-            volume_so_far += level.size
+            vwap[side] += to_float(level.price) * min(level_size, size - volume_so_far)
+            volume_so_far += level_size
             if volume_so_far > size:
                 # reached max size
                 break
@@ -1,7 +1,7 @@
 """
 This strategy places an order just before a "wall" e.g. if there are 10 coins within 1 USD of each other.
 """
-from bitcoin.strategies.base import BaseStrategy, CumPriceLevel
+from bitcoin.strategies.base import BaseStrategy
 
 
 class WallStrategy(BaseStrategy):
@@ -13,35 +13,44 @@ class WallStrategy(BaseStrategy):
         self.required_volume = 10
 
     def get_target_prices(self, book):
-        cumulative_volume = self.get_cumulative_volume(book, self.max_volume)
+        """
+        Walk each side until `max_volume` and place the order one tick ahead of the first level with
+        `required_volume` within `price_delta` behind it, i.e. from the level up to but excluding the level
+        `price_delta` away. The volume behind a level comes from OrderBook.get_cumulative_size which is O(log n)
+        when the book has a depth index.
+        """
         best_bid, best_ask = book.get_best_bid_ask()
         target_buy, target_ask = None, None
 
-        for side, levels in cumulative_volume.iteritems():
+        for side, levels in [('buy', book.bids), ('sell', book.asks)]:
+            last_price = levels[-1].price
+            cum_size = 0
             for level in levels:
                 # reached max volume
-                if level.cum_size > self.max_volume:
+                if cum_size > self.max_volume:
                     break
+                # volume before the current level
+                level_cum_size, cum_size = cum_size, cum_size + level.size
 
                 # crossed bid-ask spread
-                min_tick = self.min_tick if side == 'bids' else -self.min_tick
+                min_tick = self.min_tick if side == 'buy' else -self.min_tick
                 price = level.price + min_tick
-                if (side == 'bids' and price >= best_ask) or (side == 'asks' and price <= best_bid):
+                if (side == 'buy' and price >= best_ask) or (side == 'sell' and price <= best_bid):
                     continue
 
                 # get volume behind current level
-                price_delta = -self.price_delta if side == 'bids' else self.price_delta
-                search_price = CumPriceLevel(price + price_delta)
-                new_index = levels.bisect_left(search_price)
-                if new_index < len(levels):
-                    volume_behind = levels[new_index].cum_size - level.cum_size
-                else:
+                price_delta = -self.price_delta if side == 'buy' else self.price_delta
+                search_price = price + price_delta
+                if (side == 'buy' and search_price < last_price) or (side == 'sell' and search_price > last_price):
                     # reached tail end of book
                     break
+                # volume from the current level up to the tick before search_price. The query price lies between
+                # the two ticks so that rounding errors in the prices do not decide whether a level is included.
+                volume_behind = book.get_cumulative_size(side, search_price + 0.75 * min_tick) - level_cum_size
 
                 # update target price if there is enough volume behind
                 if volume_behind >= self.required_volume:
-                    if side == 'bids':
+                    if side == 'buy':
                         target_buy = price
                     else:
                         target_ask = price
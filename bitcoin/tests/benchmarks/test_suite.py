@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+import bitcoin.benchmarks.suite as suite
+import bitcoin.order_book.order_book as base_ob
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_suite_runs(tmpdir, fixed_point):
+    output = str(tmpdir.join('results', 'order_book.json'))
+    report = suite.run(num_messages=500, num_orders=200, fixed_point=fixed_point, output=output)
+    with open(output) as f:
+        assert json.load(f)['params'] == report['params']
+
+    assert sorted(report['results']) == sorted(base_ob.ENGINES)
+    for results in report['results'].values():
+        assert results['build']['orders'] > 0
+        assert results['replay']['messages'] == 500
+        assert results['replay']['msgs_per_sec'] > 0
+        assert all(value > 0 for value in results['reads'].values())
+
+    ratios = suite.compare(output, report)
+    assert ratios
+    assert all(ratio == pytest.approx(1) for ratio in ratios.values())
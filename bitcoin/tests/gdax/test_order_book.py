@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from bitcoin.gdax.order_book import OrderBook
+
+
+SNAPSHOT = {
+    'sequence': 1,
+    'bids': [['100.0', '1.0', 'a'], ['100.0', '2.0', 'b'], ['99.0', '3.0', 'c']],
+    'asks': [['101.0', '1.0', 'd']],
+}
+
+
+def _book():
+    book = OrderBook()
+    book.reset(SNAPSHOT)
+    return book
+
+
+def test_gdax_order_book_snapshot():
+    book = _book()
+    assert book.get_current_book() == {
+        'sequence': 1,
+        'bids': [[100., 1., 'a'], [100., 2., 'b'], [99., 3., 'c']],
+        'asks': [[101., 1., 'd']],
+    }
+    assert book.get_bid() == 100.
+    assert book.get_ask() == 101.
+    assert [order['id'] for order in book.get_bids(100.)] == ['a', 'b']
+
+
+def test_gdax_order_book_messages():
+    book = _book()
+    messages = [
+        {'sequence': 2, 'type': 'open', 'order_id': 'e', 'side': 'sell', 'price': '101.0', 'remaining_size': '2.0'},
+        {'sequence': 3, 'type': 'match', 'maker_order_id': 'a', 'side': 'buy', 'price': '100.0', 'size': '1.0'},
+        {'sequence': 4, 'type': 'done', 'order_id': 'a', 'side': 'buy', 'price': '100.0', 'remaining_size': '0'},
+        {'sequence': 5, 'type': 'change', 'order_id': 'e', 'side': 'sell', 'price': '101.0', 'new_size': '0.5'},
+        {'sequence': 6, 'type': 'done', 'order_id': 'c', 'side': 'buy', 'price': '99.0', 'remaining_size': '3.0'},
+        {'sequence': 7, 'type': 'match', 'maker_order_id': 'b', 'side': 'buy', 'price': '100.0', 'size': '0.5'},
+    ]
+    for msg in messages:
+        book.on_message(msg)
+    assert book.get_current_book() == {
+        'sequence': 7,
+        'bids': [[100., 1.5, 'b']],
+        'asks': [[101., 1., 'd'], [101., .5, 'e']],
+    }
+    assert book.get_bids(99.) is None
+    assert book.get_current_ticker() == messages[-1]
+
+
+def test_gdax_order_book_partial_fills():
+    book = OrderBook()
+    book.reset({'sequence': 1, 'bids': [['100.0', '0.4', 'a'], ['100.0', '0.3', 'b']], 'asks': []})
+    fills = [('a', '0.1'), ('a', '0.3'), ('b', '0.1'), ('b', '0.1')]
+    for sequence, (order_id, size) in enumerate(fills, 2):
+        book.on_message({'sequence': sequence, 'type': 'match', 'maker_order_id': order_id, 'side': 'buy',
+                         'price': '100.0', 'size': size})
+
+    # a is filled despite the float residue of 0.4 - 0.1 - 0.3, b has 0.1 left
+    assert [order['id'] for order in book.get_bids(100.)] == ['b']
+    assert book.get_bids(100.)[0]['size'] == pytest.approx(.1)
+    assert book.get_current_book()['bids'] == [[100., book.get_bids(100.)[0]['size'], 'b']]
+
+
+def test_gdax_order_book_consistent_snapshot():
+    book = _book()
+    stop = threading.Event()
+
+    def _feed():
+        sequence = 1
+        while not stop.is_set():
+            sequence += 1
+            book.on_message({'sequence': sequence, 'type': 'open', 'order_id': str(sequence), 'side': 'buy',
+                             'price': '98.0', 'remaining_size': '1.0'})
+            sequence += 1
+            book.on_message({'sequence': sequence, 'type': 'done', 'order_id': str(sequence - 1), 'side': 'buy',
+                             'price': '98.0', 'remaining_size': '1.0'})
+
+    thread = threading.Thread(target=_feed)
+    thread.start()
+    try:
+        for _ in range(200):
+            snapshot = book.get_current_book()
+            # open and done messages alternate so the fourth bid is on the book at even sequences
+            assert len(snapshot['bids']) == (4 if snapshot['sequence'] % 2 == 0 else 3)
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.batch as batch
+from bitcoin.order_book.gdax_order_book import BookError, GdaxOrderBook
+from bitcoin.order_book.order_ids import OrderIds
+
+
+MESSAGES = [
+    {'sequence': 2, 'time': '2017-12-01T00:00:01', 'type': 'received', 'order_id': 'c', 'side': 'buy'},
+    {'sequence': 3, 'time': '2017-12-01T00:00:01', 'type': 'open', 'order_id': 'c', 'side': 'buy', 'price': 99.,
+     'remaining_size': 2.},
+    {'sequence': 4, 'time': '2017-12-01T00:00:02', 'type': 'match', 'maker_order_id': 'b', 'taker_order_id': 'd',
+     'side': 'sell', 'price': 101., 'size': .5},
+    {'sequence': 5, 'time': '2017-12-01T00:00:03', 'type': 'change', 'order_id': 'a', 'side': 'buy', 'price': 100.,
+     'new_size': .5, 'old_size': 1.},
+    {'sequence': 6, 'time': '2017-12-01T00:00:04', 'type': 'heartbeat'},
+    {'sequence': 7, 'time': '2017-12-01T00:00:05', 'type': 'done', 'order_id': 'c', 'side': 'buy', 'price': 99.,
+     'remaining_size': 2., 'reason': 'canceled'},
+]
+
+
+def _book():
+    return GdaxOrderBook(1, bids=[['100', '1', 'a']], asks=[['101', '1', 'b']])
+
+
+def test_messages_to_columns():
+    columns = batch.messages_to_columns(MESSAGES)
+    assert columns['type'].tolist() == [batch.RECEIVED, batch.OPEN, batch.MATCH, batch.CHANGE, batch.OTHER,
+                                        batch.DONE]
+    assert columns['size'].tolist() == [0, 2., .5, .5, 0, 0]
+    assert columns['order_ids'][columns['order']].tolist()[:4] == ['c', 'c', 'b', 'a']
+    assert columns['order'][4] == -1
+
+
+def test_messages_to_columns_without_side():
+    messages = [{'sequence': sequence, 'time': '2017-12-01T00:00:01', 'type': 'heartbeat'} for sequence in [2, 3]]
+    columns = batch.messages_to_columns(messages)
+    assert columns['side'].tolist() == [batch.BUY, batch.BUY]
+    book = _book()
+    assert book.apply_batch(columns) == 2
+    assert book.sequence == 3
+
+
+def test_apply_batch():
+    columns = batch.messages_to_columns(MESSAGES)
+    book = _book()
+    row = book.apply_batch(columns, end_sequence=4)
+    assert row == 3
+    assert book.sequence == 4
+    assert book.to_set() == {(100., 1., 'a'), (101., .5, 'b'), (99., 2., 'c')}
+
+    row = book.apply_batch(columns, start=row)
+    assert row == len(MESSAGES)
+    assert book.sequence == 7
+    assert book.timestamp == pd.Timestamp('2017-12-01T00:00:05')
+    assert book.to_set() == {(100., .5, 'a'), (101., .5, 'b')}
+    assert book.order_to_time == {}
+
+
+def test_apply_batch_end_time():
+    columns = batch.messages_to_columns(MESSAGES)
+    book = _book()
+    assert book.apply_batch(columns, end_time=pd.Timestamp('2017-12-01T00:00:02')) == 3
+    assert book.order_to_time.keys() == ['c']
+
+
+def test_apply_batch_stops_at_gap():
+    messages = [msg for msg in MESSAGES if msg['sequence'] not in [5, 6]]
+    columns = batch.messages_to_columns(messages)
+    book = _book()
+    row = book.apply_batch(columns)
+    assert book.sequence == 4
+    assert columns['sequence'][row] == 7
+    # the gap is never applied
+    assert book.apply_batch(columns, start=row) == row
+
+
+@pytest.mark.parametrize('missing', [[5], [5, 6]])
+def test_apply_batch_gap_matches_process_message(missing):
+    # a single missing sequence number is accepted by both paths, a longer gap by neither
+    messages = [dict(msg, time=np.datetime64(msg['time'])) for msg in MESSAGES if msg['sequence'] not in missing]
+    expected = _book()
+    for msg in messages:
+        try:
+            expected.process_message(msg)
+        except BookError as e:
+            assert e.check == 'sequence'
+            break
+
+    actual = _book()
+    columns = batch.messages_to_columns(messages)
+    row = actual.apply_batch(columns)
+    assert actual.sequence == expected.sequence
+    assert row == np.searchsorted(columns['sequence'], expected.sequence, side='right')
+    assert actual.to_set() == expected.to_set()
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_apply_batch_matches_process_message(fixed_point):
+    data = bob.synthetic_book(num_orders=500)
+    messages = bob.synthetic_messages(data, 3000)
+    if fixed_point:
+        messages = bob.to_fixed_messages(messages)
+    expected = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], fixed_point=fixed_point)
+    for msg in messages:
+        expected.process_message(msg)
+
+    actual = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], fixed_point=fixed_point)
+    columns = batch.messages_to_columns(messages, fixed_point=fixed_point)
+    assert actual.apply_batch(columns) == len(messages)
+    assert actual.sequence == expected.sequence
+    assert actual.to_set() == expected.to_set()
+    assert actual.order_to_time == expected.order_to_time
+    assert all(isinstance(time, np.datetime64) for time in actual.order_to_time.itervalues())
+    assert actual.timestamp == expected.timestamp
+
+
+@pytest.mark.parametrize('msg, check', [
+    ({'type': 'match', 'maker_order_id': 'x', 'side': 'sell', 'price': 101., 'size': .5}, 'unknown_order'),
+    ({'type': 'match', 'maker_order_id': 'b', 'side': 'sell', 'price': 101., 'size': 2.}, 'size'),
+    ({'type': 'open', 'order_id': 'a', 'side': 'buy', 'price': 99., 'remaining_size': 1.}, 'duplicate_order'),
+    ({'type': 'open', 'order_id': 'c', 'side': 'buy', 'remaining_size': 1.}, 'price'),
+    ({'type': 'done', 'order_id': 'a', 'side': 'sell', 'price': 100., 'reason': 'canceled'}, 'side'),
+    ({'type': 'change', 'order_id': 'a', 'side': 'buy', 'price': 99., 'new_size': .5}, 'price'),
+    ({'type': 'change', 'order_id': 'a', 'side': 'buy', 'price': 100., 'new_size': 2.}, 'size'),
+])
+def test_apply_batch_strict(msg, check):
+    msg = dict(msg, sequence=2, time='2017-12-01T00:00:01')
+    book = _book()
+    with pytest.raises(BookError) as error:
+        book.process_message(msg)
+    assert error.value.check == check
+
+    book = _book()
+    with pytest.raises(BookError) as error:
+        book.apply_batch(batch.messages_to_columns([msg]))
+    assert error.value.check == check
+    assert book.sequence == 1
+
+
+@pytest.mark.parametrize('mode', ['strict', 'trusted'])
+@pytest.mark.parametrize('missing', [0., np.nan])
+def test_apply_batch_change_without_price(mode, missing):
+    # market order changes have no price
+    msg = {'sequence': 2, 'time': '2017-12-01T00:00:01', 'type': 'change', 'order_id': 'a', 'side': 'buy',
+           'new_size': .5}
+    book = GdaxOrderBook(1, bids=[['100', '1', 'a']], asks=[['101', '1', 'b']], mode=mode)
+    columns = batch.messages_to_columns([msg])
+    columns['price'][0] = missing
+    assert book.apply_batch(columns) == 1
+    assert book.sequence == 2
+    assert book.get('a') == (100., 1., 'a')
+
+
+class _Times(np.ndarray):
+    """
+    Time column that records the number of times converted by each astype call
+    """
+    converted = []
+
+    def astype(self, dtype, *args, **kwargs):
+        _Times.converted.append(self.size)
+        return np.asarray(self).astype(dtype, *args, **kwargs)
+
+
+def test_apply_batch_small_steps():
+    data = bob.synthetic_book(num_orders=500)
+    messages = bob.synthetic_messages(data, 3000)
+    expected = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'])
+    for msg in messages:
+        expected.process_message(msg)
+
+    actual = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'])
+    columns = batch.messages_to_columns(messages)
+    columns['time'] = columns['time'].view(_Times)
+    _Times.converted = []
+    row, step = 0, 7
+    while row < len(messages):
+        row = actual.apply_batch(columns, start=row, end_sequence=actual.sequence + step)
+    # only the rows of each step are converted
+    assert len(_Times.converted) >= len(messages) // step
+    assert max(_Times.converted) <= step
+    assert actual.sequence == expected.sequence
+    assert actual.to_set() == expected.to_set()
+    assert actual.order_to_time == expected.order_to_time
+    assert actual.timestamp == expected.timestamp
+
+
+def test_apply_batch_order_ids():
+    data = bob.synthetic_book(num_orders=500)
+    messages = bob.synthetic_messages(data, 2000)
+    expected = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'])
+    for msg in messages:
+        expected.process_message(msg)
+
+    order_ids = OrderIds()
+    actual = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], order_ids=order_ids)
+    actual.apply_batch(batch.messages_to_columns(messages, order_ids=order_ids))
+    assert all(isinstance(order_id, (int, long)) for order_id in actual.orders)
+    columns = ['price', 'size', 'order_id', 'side', 'sequence']
+    assert actual.to_df(level_type=3)[columns].equals(expected.to_df(level_type=3)[columns])
@@ -0,0 +1,49 @@
+import pytest
+
+import bitcoin.benchmarks.bitstamp as bbt
+import bitcoin.order_book.bt_order_book as ob
+
+
+def _msg(event, order_id, price, amount, order_type=0):
+    data = '{{"price": {}, "amount": {}, "datetime": "1503261585", "id": {}, "order_type": {}}}'.format(
+        price, amount, order_id, order_type)
+    return ob.parse_message({'event': event, 'channel': 'live_orders', 'data': data})
+
+
+def test_parse_message():
+    msg = _msg('order_created', 237361666, 4063.0100000000002, 3.1301999999999999, order_type=1)
+    assert msg == {'event': 'order_created', 'id': 237361666, 'side': 'sell', 'price': 4063.01, 'amount': 3.1302,
+                   'datetime': 1503261585}
+    assert ob.parse_message({'event': 'pusher:connection_established', 'data': '{}'}) == {
+        'event': 'pusher:connection_established'}
+
+
+def test_bt_order_book_messages():
+    book = ob.BtOrderBook(0, bids=ob.snapshot_to_orders([['100.00', '1.0', '1']]))
+    assert book.get(1) == (100., 1., 1)
+
+    book.process_message(_msg('order_created', 2, 99., 2.))
+    book.process_message(_msg('order_created', 3, 101., 1., order_type=1))
+    book.process_message(_msg('order_changed', 2, 99., 0.5))
+    book.process_message(_msg('order_deleted', 1, 100., 1.))
+    assert book.to_set() == {(99., .5, 2), (101., 1., 3)}
+    assert book.sequence == 4
+
+    # messages from before the snapshot
+    book.process_message(_msg('order_deleted', 1, 100., 1.))
+    book.process_message(_msg('order_created', 3, 101., 0.25, order_type=1))
+    book.process_message(_msg('order_changed', 4, 98., 1.))
+    assert book.to_set() == {(99., .5, 2), (101., .25, 3), (98., 1., 4)}
+    book.process_message({'event': 'trade'})
+    assert book.sequence == 7
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_bt_order_book_replay_logs(fixed_point):
+    messages = [ob.parse_message(msg, fixed_point=fixed_point) for msg in bbt.load_logs()]
+    assert len(messages) > 500
+    books = [ob.BtOrderBook(0, engine=engine, fixed_point=fixed_point) for engine in ['sorted', 'ladder']]
+    for book in books:
+        bbt.replay(book, messages)
+    assert books[0].to_set() == books[1].to_set()
+    assert all(size > 0 for _, size, _ in books[0].to_set())
@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from bitcoin.order_book.order_book import OrderBook
+
+
+def _random_book(engine, fixed_point, num_orders=3000):
+    random.seed(3)
+    tick = 10 ** 6 if fixed_point else 0.01
+    unit = 10 ** 8 if fixed_point else 1.
+    book = OrderBook(1, engine=engine, fixed_point=fixed_point, depth_index=True)
+    order_ids = []
+    for i in range(num_orders):
+        if order_ids and random.random() < 0.4:
+            order_id = order_ids.pop(random.randrange(len(order_ids)))
+            new_size = random.choice([0, unit / 2])
+            book.update(order_id, new_size)
+            if new_size:
+                order_ids.append(order_id)
+        else:
+            side = random.choice(['buy', 'sell'])
+            # a few orders far from the touch make the index grow
+            offset = random.randint(1, 50) if random.random() < 0.99 else random.randint(1000, 100000)
+            price = (100000 - offset if side == 'buy' else 100000 + offset) * tick
+            price = price if fixed_point else round(price, 2)
+            book.add(side, price, random.randint(1, 4) * unit, str(i))
+            order_ids.append(str(i))
+    return book
+
+
+def _walk(book, method, *args):
+    """
+    Answer a query by walking the levels
+    """
+    book.bid_depth, bid_depth = None, book.bid_depth
+    book.ask_depth, ask_depth = None, book.ask_depth
+    result = getattr(book, method)(*args)
+    book.bid_depth, book.ask_depth = bid_depth, ask_depth
+    return result
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_depth_index_matches_levels(engine, fixed_point):
+    book = _random_book(engine, fixed_point)
+    tick = 10 ** 6 if fixed_point else 0.01
+    unit = 10 ** 8 if fixed_point else 1.
+    approx = (lambda x: x) if fixed_point else pytest.approx
+
+    for side in ['buy', 'sell']:
+        levels = book.bids if side == 'buy' else book.asks
+        for level in list(levels)[:60:7]:
+            for ticks in [-1, 0, 1]:
+                price = level.price + ticks * tick if fixed_point else round(level.price + ticks * tick, 2)
+                expected = _walk(book, 'get_cumulative_size', side, price)
+                assert book.get_cumulative_size(side, price) == approx(expected)
+
+        for size in [0.5 * unit, 3 * unit, 37.5 * unit, 200 * unit, 1e9 * unit]:
+            assert book.get_price_for_size(side, size) == _walk(book, 'get_price_for_size', side, size)
+            expected = _walk(book, 'get_vwap', side, size)
+            actual = book.get_vwap(side, size)
+            assert actual is None if expected is None else actual == pytest.approx(expected)
+
+
+def test_depth_index_clone():
+    book = OrderBook(1, bids=[['100', '1', 'a'], ['99', '2', 'b']], asks=[['101', '1', 'c']], depth_index=True)
+    assert book.get_cumulative_size('buy', 99.) == 3.
+    assert book.get_price_for_size('buy', 2.) == 99.
+    assert book.get_vwap('buy', 2.) == 99.5
+    assert book.get_vwap('sell', 2.) is None
+
+    clone = book.clone()
+    clone.update('a', 0)
+    assert clone.get_cumulative_size('buy', 99.) == 2.
+    assert book.get_cumulative_size('buy', 99.) == 3.
+    assert clone != book
@@ -0,0 +1,61 @@
+import pytest
+
+import bitcoin.order_book.events as events
+from bitcoin.order_book.order_book import OrderBook
+
+
+def _subscribe(book_events, kinds):
+    received = []
+    for kind in kinds:
+        book_events.subscribe(kind, received.append)
+    return received
+
+
+@pytest.mark.parametrize('top_depth', [0, 10])
+def test_book_events(top_depth):
+    book = OrderBook(1, bids=[['100', '1', 'a']], asks=[['101', '1', 'b']], top_depth=top_depth)
+    book_events = events.BookEvents(depth=2)
+    received = _subscribe(book_events, [events.BestPrice, events.BestSize])
+
+    book_events.check(book)
+    assert received == [events.BestPrice('buy', 100., 1), events.BestSize('buy', 100., 1., 1),
+                        events.BestPrice('sell', 101., 1), events.BestSize('sell', 101., 1., 1)]
+
+    # deeper than the best level
+    del received[:]
+    book.add('buy', 99., 1., 'c')
+    book_events.check(book)
+    assert received == []
+
+    book.add('buy', 100., 2., 'd')
+    book.sequence = 2
+    book_events.check(book)
+    assert received == [events.BestSize('buy', 100., 3., 2)]
+
+    del received[:]
+    book.update('b', 0)
+    book.sequence = 3
+    book_events.check(book)
+    assert received == [events.BestPrice('sell', None, 3), events.BestSize('sell', None, None, 3)]
+
+
+def test_book_events_top_depth():
+    book = OrderBook(1, bids=[['100', '1', 'a'], ['99', '1', 'b'], ['98', '1', 'c']])
+    book_events = events.BookEvents(depth=2)
+    received = _subscribe(book_events, [events.TopDepth])
+    book_events.check(book)
+    assert [event.side for event in received] == ['buy', 'sell']
+
+    del received[:]
+    book.update('c', 0.5)
+    book_events.check(book)
+    assert received == []
+    book.update('b', 0.5)
+    book_events.check(book)
+    assert [event.side for event in received] == ['buy']
+
+    # unsubscribed kinds are not checked
+    book_events.unsubscribe(events.TopDepth, received.append)
+    book.update('a', 0.5)
+    book_events.check(book)
+    assert len(received) == 1
@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.events as events
+import bitcoin.order_book.l2_order_book as l2
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+from bitcoin.order_book.l2_order_book import L2OrderBook
+
+
+def _levels(levels):
+    return [(level.price, level.size) for level in levels]
+
+
+def test_l2_order_book_messages():
+    book = L2OrderBook(depth_index=True, top_depth=2)
+    book.process_message(l2.parse_message({'type': 'snapshot', 'product_id': 'BTC-USD',
+                                           'bids': [['100', '1'], ['99', '2'], ['98', '3']],
+                                           'asks': [['101', '1.5'], ['102', '0.5']]}))
+    assert book.get_best_bid_ask() == (100., 101.)
+    assert _levels(book.bids[:2]) == [(100., 1.), (99., 2.)]
+
+    book.process_message(l2.parse_message({'type': 'l2update', 'product_id': 'BTC-USD',
+                                           'time': '2017-12-01T00:00:00.000000Z',
+                                           'changes': [['buy', '100', '0'], ['buy', '99.5', '4'],
+                                                       ['sell', '101', '2.5'], ['sell', '103', '0']]}))
+    assert book.sequence == 2
+    assert book.timestamp == np.datetime64('2017-12-01T00:00:00.000000')
+    assert _levels(book.bids) == [(99.5, 4.), (99., 2.), (98., 3.)]
+    assert _levels(book.asks) == [(101., 2.5), (102., .5)]
+    assert book.top_bids.to_arrays()[0].tolist() == [99.5, 99.]
+    assert book.get_cumulative_size('buy', 99.) == 6.
+    assert book.get_vwap('sell', 3.) == (101. * 2.5 + 102. * .5) / 3.
+    assert book.to_df(level_type=2)['bid_size'].tolist() == [4., 2., 3.]
+    assert book.to_arrays(level_type=2, depth=3)[1]['price'].tolist() == [101., 102., 0.]
+    with pytest.raises(AssertionError):
+        book.to_df(level_type=3)
+
+    clone = book.clone()
+    book.set('sell', 101., 0)
+    assert clone.get_best_bid_ask() == (99.5, 101.)
+    assert book.get_best_bid_ask() == (99.5, 102.)
+
+    # a snapshot e.g. after a reconnect replaces the book
+    book.process_message(l2.parse_message({'type': 'snapshot', 'bids': [['10', '1']], 'asks': []}))
+    assert _levels(book.bids) == [(10., 1.)] and not book.asks
+    assert book.bid_depth.size == 1.
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_l2_order_book_replay(tmpdir, fixed_point):
+    # the level2 feed of a full channel replay gives the same levels as the level 3 book
+    data = bob.synthetic_book(num_orders=1000)
+    messages = bob.synthetic_messages(data, 5000)
+    if fixed_point:
+        messages = bob.to_fixed_messages(messages)
+    l3_book = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], fixed_point=fixed_point)
+    path = str(tmpdir.join('feed.json'))
+    with open(path, 'w') as f:
+        for msg in l2.l3_to_l2_feed(l3_book, messages):
+            f.write(json.dumps(msg) + '\n')
+
+    book = L2OrderBook(fixed_point=fixed_point, depth_index=True)
+    received = []
+    book_events = events.BookEvents()
+    book_events.subscribe(events.BestPrice, received.append)
+    for msg in l2.load_feed(path, fixed_point=fixed_point):
+        book.process_message(msg)
+        book_events.check(book)
+
+    assert _levels(book.bids) == _levels(l3_book.bids)
+    assert _levels(book.asks) == _levels(l3_book.asks)
+    for actual, expected in zip(book.top_asks.to_arrays()[:2], l3_book.top_asks.to_arrays()[:2]):
+        assert np.array_equal(actual, expected)
+    size = 10 ** 9 if fixed_point else 10.
+    assert book.get_vwap('buy', size) == pytest.approx(l3_book.get_vwap('buy', size))
+    assert [event.price for event in received if event.side == 'buy'][-1] == l3_book.bids[0].price
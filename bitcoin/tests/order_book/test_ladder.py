@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from bitcoin.order_book.ladder import PriceLadder
+from bitcoin.order_book.order_book import OrderBook
+from bitcoin.order_book.price_level import PriceLevel
+
+
+def test_ladder_best_first():
+    bids = PriceLadder('buy', tick_size=0.01, capacity=8)
+    asks = PriceLadder('sell', tick_size=0.01, capacity=8)
+    for price in [100., 100.05, 99.97]:
+        bids.add(PriceLevel(price, {}))
+        asks.add(PriceLevel(price, {}))
+    assert [level.price for level in bids] == [100.05, 100., 99.97]
+    assert [level.price for level in asks] == [99.97, 100., 100.05]
+    assert bids[0].price == 100.05
+    assert asks[-1].price == 100.05
+    assert len(bids) == 3
+
+
+def test_ladder_get():
+    asks = PriceLadder('sell', tick_size=0.01, capacity=8)
+    level = PriceLevel(100.01, {'a': 1.})
+    asks.add(level)
+    assert asks.get(100.01) is level
+    assert asks.get(100.02) is None
+    assert asks.get(500.) is None
+
+
+def test_ladder_off_tick_price():
+    asks = PriceLadder('sell', tick_size=0.01, capacity=8)
+    asks.add(PriceLevel(100.01, {}))
+    with pytest.raises(ValueError):
+        asks.get(100.011)
+
+
+def test_ladder_overflow_and_recentre():
+    asks = PriceLadder('sell', tick_size=1., capacity=4)
+    for price in [10., 11., 50., 1000.]:
+        asks.add(PriceLevel(price, {}))
+    # 50 and 1000 are outside the window
+    assert len(asks._overflow) == 2
+    assert [level.price for level in asks] == [10., 11., 50., 1000.]
+
+    # a better price before the window moves the window
+    asks.add(PriceLevel(2., {}))
+    assert asks[0].price == 2.
+    assert [level.price for level in asks] == [2., 10., 11., 50., 1000.]
+
+    # emptying the window pulls the overflow into it
+    for price in [2., 10., 11.]:
+        asks.remove(asks.get(price))
+    assert asks[0].price == 50.
+    assert [level.price for level in asks] == [50., 1000.]
+
+    asks.remove(asks.get(50.))
+    asks.remove(asks.get(1000.))
+    assert not asks
+    assert list(asks) == []
+
+
+def test_ladder_slice_and_bisect():
+    bids = PriceLadder('buy', tick_size=1., capacity=4)
+    for price in [10., 9., 7., 1.]:
+        bids.add(PriceLevel(price, {}))
+    assert [level.price for level in bids[:2]] == [10., 9.]
+    assert [level.price for level in bids[1:]] == [9., 7., 1.]
+    assert bids.bisect_left(PriceLevel(8., {})) == 2
+    assert bids.bisect_left(PriceLevel(0., {})) == 4
+    assert bids.bisect_left(PriceLevel(11., {})) == 0
+
+
+def test_ladder_remove_missing():
+    bids = PriceLadder('buy', tick_size=1., capacity=4)
+    bids.add(PriceLevel(10., {}))
+    with pytest.raises(ValueError):
+        bids.remove(PriceLevel(9., {}))
+
+
+def test_ladder_engine_order_book():
+    book = OrderBook(1, engine='ladder', tick_size=0.01)
+    book.add('buy', 100., 5., 'a')
+    book.add('sell', 105., 1., 'b')
+    book.add('buy', 100., 2., 'c')
+    assert book.get_best_bid_ask() == (100., 105.)
+    assert book.bids[0] == PriceLevel(100., {'a': 5., 'c': 2.}, side='buy')
+    book.update('a', 0)
+    book.update('c', 0)
+    assert len(book.bids) == 0
+    assert book.to_set() == {(105., 1., 'b')}
+
+
+def test_ladder_engine_matches_sorted_engine():
+    random.seed(0)
+    sorted_book = OrderBook(1)
+    ladder_book = OrderBook(1, engine='ladder', tick_size=0.01)
+    order_ids = []
+
+    for i in range(3000):
+        if order_ids and random.random() < 0.4:
+            order_id = order_ids.pop(random.randrange(len(order_ids)))
+            new_size = random.choice([0, 0.5])
+            for book in [sorted_book, ladder_book]:
+                book.update(order_id, new_size)
+            if new_size:
+                order_ids.append(order_id)
+        else:
+            side = random.choice(['buy', 'sell'])
+            offset = random.choice([random.randint(1, 50), random.randint(1, 5000)])
+            price = 1000. - offset / 100. if side == 'buy' else 1000. + offset / 100.
+            order_id = str(i)
+            for book in [sorted_book, ladder_book]:
+                book.add(side, price, 1., order_id)
+            order_ids.append(order_id)
+
+        if sorted_book.bids and sorted_book.asks:
+            assert ladder_book.get_best_bid_ask() == sorted_book.get_best_bid_ask()
+
+    assert ladder_book.to_set() == sorted_book.to_set()
+    assert ladder_book.to_df(level_type=2, depth=20).equals(sorted_book.to_df(level_type=2, depth=20))
@@ -0,0 +1,86 @@
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.batch as batch
+from bitcoin.order_book.gdax_order_book import BookError, GdaxOrderBook
+
+
+def _state(book):
+    orders = [(level.price, list(level.iteritems())) for levels in [book.bids, book.asks] for level in levels]
+    return book.sequence, book.timestamp, orders, dict(book.order_to_time), book.checksum
+
+
+def _books(fixed_point=False, **kwargs):
+    data = bob.synthetic_book(num_orders=300)
+    messages = bob.synthetic_messages(data, 2000)
+    if fixed_point:
+        messages = bob.to_fixed_messages(messages)
+    books = [GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], fixed_point=fixed_point, mode=mode,
+                           **kwargs)
+             for mode in ['strict', 'trusted']]
+    return books, messages
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_modes_same_book(engine, fixed_point):
+    (strict, trusted), messages = _books(fixed_point=fixed_point, engine=engine, tick_size=0.01, max_undo=100)
+    for i, msg in enumerate(messages):
+        strict.process_message(msg)
+        trusted.process_message(msg)
+        if i % 100 == 0:
+            assert _state(strict) == _state(trusted)
+    assert _state(strict) == _state(trusted)
+
+    strict.rewind(50)
+    trusted.rewind(50)
+    assert _state(strict) == _state(trusted)
+
+
+def test_modes_same_batch():
+    (strict, trusted), messages = _books()
+    columns = batch.messages_to_columns(messages)
+    strict.apply_batch(columns)
+    trusted.apply_batch(columns)
+    assert _state(strict) == _state(trusted)
+
+
+def _msg(sequence, _type, **kwargs):
+    msg = {'sequence': sequence, 'type': _type, 'time': '2017-12-01T00:00:00'}
+    msg.update(kwargs)
+    return msg
+
+
+@pytest.mark.parametrize('msg, check', [
+    (_msg(2, 'open', order_id='a', side='buy', price=99., remaining_size=1.), 'duplicate_order'),
+    (_msg(2, 'open', order_id='c', side='bid', price=99., remaining_size=1.), 'side'),
+    (_msg(2, 'open', order_id='c', side='buy', price=99., remaining_size=0.), 'size'),
+    (_msg(2, 'match', maker_order_id='c', side='buy', price=100., size=1.), 'unknown_order'),
+    (_msg(2, 'match', maker_order_id='a', side='buy', price=101., size=1.), 'price'),
+    (_msg(2, 'match', maker_order_id='a', side='sell', price=100., size=1.), 'side'),
+    (_msg(2, 'match', maker_order_id='a', side='buy', price=100., size=3.), 'size'),
+    (_msg(2, 'change', order_id='a', side='buy', price=100., new_size=3.), 'size'),
+    (_msg(2, 'done', order_id='a', side='buy', price=99., remaining_size=2.), 'price'),
+    (_msg(2, 'unknown'), 'type'),
+    (_msg(5, 'received'), 'sequence'),
+])
+def test_strict_errors(msg, check):
+    book = GdaxOrderBook(1, bids=[[100., 2., 'a']], asks=[[101., 1., 'b']])
+    state = _state(book)
+    with pytest.raises(BookError) as error:
+        book.process_message(msg)
+    assert error.value.check == check
+    assert error.value.to_dict()['sequence'] == msg['sequence']
+    # the book is not changed
+    assert _state(book) == state
+
+
+def test_strict_valid_messages():
+    book = GdaxOrderBook(1, bids=[[100., 2., 'a']], asks=[[101., 1., 'b']])
+    # done and change messages for orders that are not on the book are ignored
+    book.process_message(_msg(2, 'done', order_id='c', side='buy', remaining_size=1.))
+    book.process_message(_msg(3, 'change', order_id='c', side='buy', price=99., new_size=1.))
+    book.process_message(_msg(4, 'match', maker_order_id='a', side='buy', price=100., size=0.5))
+    book.process_message(_msg(5, 'change', order_id='a', side='buy', price=100., new_size=1.))
+    assert book.get('a') == (100., 1., 'a')
+    assert book.sequence == 5
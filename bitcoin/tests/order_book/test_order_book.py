@@ -1,6 +1,14 @@
+import itertools
+import pickle
+
+import numpy as np
 import pytest
 
+import bitcoin.order_book.order_book as ob
+import bitcoin.util as util
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
 from bitcoin.order_book.order_book import OrderBook
+from bitcoin.order_book.order_ids import OrderIds
 from bitcoin.order_book.price_level import PriceLevel
 
 
@@ -8,8 +16,8 @@ def test_order_book_add_single_order():
     book = OrderBook(1)
     book.add('buy', 100., 5., 'a')
     assert len(book.bids) == 1
-    assert book.bids[0] == PriceLevel(100., {'a': 5.})
-    assert book.orders == {'a': 100.}
+    assert book.bids[0] == PriceLevel(100., {'a': 5.}, side='buy')
+    assert book.orders == {'a': book.bids[0]}
 
 
 def test_order_book_add_multiple_orders():
@@ -17,13 +25,13 @@ def test_order_book_add_multiple_orders():
     book.add('buy', 100., 5., 'a')
     book.add('sell', 105., 1., 'b')
     assert len(book.asks) == 1
-    assert book.asks[0] == PriceLevel(105., {'b': 1.})
-    assert book.orders == {'a': 100., 'b': 105.}
+    assert book.asks[0] == PriceLevel(105., {'b': 1.}, side='sell')
+    assert book.orders == {'a': book.bids[0], 'b': book.asks[0]}
 
     book.add('buy', 90., 2., 'c')
     assert len(book.bids) == 2
-    assert book.bids[0] == PriceLevel(100., {'a': 5.})
-    assert book.orders == {'a': 100., 'b': 105., 'c': 90.}
+    assert book.bids[0] == PriceLevel(100., {'a': 5.}, side='buy')
+    assert book.orders == {'a': book.bids[0], 'b': book.asks[0], 'c': book.bids[1]}
 
 
 def test_order_book_add_orders_at_same_price():
@@ -33,11 +41,11 @@ def test_order_book_add_orders_at_same_price():
     book.add('sell', 150., 5., 'c')
     book.add('buy', 100., 1., 'd')
     assert len(book.bids) == 2
-    assert book.bids[-1] == PriceLevel(100., {'b': 2., 'd': 1.})
-    assert book.orders == {'a': 110.,
-                           'b': 100.,
-                           'c': 150.,
-                           'd': 100.}
+    assert book.bids[-1] == PriceLevel(100., {'b': 2., 'd': 1.}, side='buy')
+    assert book.orders == {'a': book.bids[0],
+                           'b': book.bids[1],
+                           'c': book.asks[0],
+                           'd': book.bids[1]}
 
 
 def test_order_book_get():
@@ -50,6 +58,18 @@ def test_order_book_get():
     assert book.get('c') == (100., 7., 'c')
 
 
+def test_order_book_get_volume_ahead():
+    book = OrderBook(1)
+    book.add('buy', 100., 5., 'a')
+    book.add('buy', 100., 7., 'b')
+    book.add('buy', 100., 2., 'c')
+    book.update('b', 3.)
+    assert book.get_volume_ahead('a') == 0
+    assert book.get_volume_ahead('c') == 8.
+    assert book.get_volume_ahead(side='buy', price=100.) == 10.
+    assert book.get_volume_ahead(side='buy', price=99.) == 0
+
+
 def test_order_book_get_assert():
     book = OrderBook(1)
     with pytest.raises(AssertionError):
@@ -61,8 +81,8 @@ def test_order_book_update():
     book.add('buy', 100., 5., 'a')
     book.update('a', 15.)
     assert len(book.bids) == 1
-    assert book.bids[0] == PriceLevel(100., {'a': 15.})
-    assert book.orders == {'a': 100.}
+    assert book.bids[0] == PriceLevel(100., {'a': 15.}, side='buy')
+    assert book.orders == {'a': book.bids[0]}
 
 
 def test_order_book_update_order_at_same_price():
@@ -71,8 +91,8 @@ def test_order_book_update_order_at_same_price():
     book.add('buy', 100., 10., 'b')
     book.update('a', 15.)
     assert len(book.bids) == 1
-    assert book.bids[0] == PriceLevel(100., {'a': 15., 'b': 10.})
-    assert book.orders == {'a': 100., 'b': 100.}
+    assert book.bids[0] == PriceLevel(100., {'a': 15., 'b': 10.}, side='buy')
+    assert book.orders == {'a': book.bids[0], 'b': book.bids[0]}
 
 
 def test_order_book_remove():
@@ -81,5 +101,188 @@ def test_order_book_remove():
     book.add('buy', 100., 10., 'b')
     book.update('a', 0.)
     assert len(book.bids) == 1
-    assert book.bids[0] == PriceLevel(100., {'b': 10.})
-    assert book.orders == {'b': 100.}
+    assert book.bids[0] == PriceLevel(100., {'b': 10.}, side='buy')
+    assert book.orders == {'b': book.bids[0]}
+
+
+def test_order_book_update_crossed_bid():
+    book = OrderBook(1)
+    book.add('sell', 100., 1., 'a')
+    # bid priced above the best ask is still found on the bid side
+    book.add('buy', 101., 2., 'b')
+    assert book.get('b') == (101., 2., 'b')
+    book.update('b', 0.)
+    assert len(book.bids) == 0
+    assert book.asks[0] == PriceLevel(100., {'a': 1.}, side='sell')
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+def test_order_book_fixed_point(engine):
+    book = OrderBook(1, bids=[['100.01', '0.1', 'a'], ['100.01', '0.2', 'b']], asks=[['100.02', '1.5', 'c']],
+                     engine=engine, fixed_point=True)
+    assert book.get('a') == (10001000000, 10000000, 'a')
+    assert book.bids[0].size == 30000000
+    book.update('a', 0)
+    book.update('b', 0)
+    assert len(book.bids) == 0
+    assert book.orders.keys() == ['c']
+
+    df = book.to_df(level_type=3)
+    assert df['price'].tolist() == [100.02]
+    assert df['size'].tolist() == [1.5]
+
+
+def test_gdax_order_book_fixed_point_match():
+    book = GdaxOrderBook(1, asks=[['400.23', '0.3', 'a']], fixed_point=True)
+    for sequence, size in [(2, '0.1'), (3, '0.2')]:
+        msg = {'type': 'match', 'sequence': sequence, 'maker_order_id': 'a', 'taker_order_id': 'b',
+               'time': '2014-11-07T08:19:27.028459', 'size': size, 'price': '400.23', 'side': 'sell'}
+        book.process_message(util.parse_message(msg, 'GDAX', fixed_point=True))
+    # 0.3 - 0.1 - 0.2 is exactly 0 so the order and its level are removed
+    assert book.orders == {}
+    assert len(book.asks) == 0
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+def test_order_book_clone(engine):
+    book = OrderBook(1, bids=[['100', '1', 'a'], ['100', '2', 'b'], ['99', '1', 'c']], asks=[['101', '1', 'd']],
+                     engine=engine)
+    expected = book.to_set()
+    clone = book.clone()
+    # levels are shared until one of the books changes them
+    assert clone.orders['a'] is book.orders['a']
+
+    clone.update('a', 0)
+    clone.add('buy', 100., 3., 'e')
+    clone.add('sell', 102., 1., 'f')
+    assert book.to_set() == expected
+    assert book.get_best_bid_ask() == (100., 101.)
+    assert clone.get('e') == (100., 3., 'e')
+    assert clone.orders['c'] is book.orders['c']
+    assert clone.orders['b'] is not book.orders['b']
+
+    book.update('c', 0)
+    assert (99., 1., 'c') in clone.to_set()
+    assert _top(clone.top_bids) == [(100., 5.), (99., 1.)]
+    assert _top(book.top_bids) == [(100., 3.)]
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+def test_order_book_pickle_clones(monkeypatch, engine):
+    # books built in another process share levels owned by that process's tokens, e.g. storage.api.get_books
+    book = OrderBook(1, bids=[['100', '1', 'a']], asks=[['101', '1', 'b']], engine=engine)
+    owner = book.orders['a'].owner
+    clone = book.clone()
+    unpickled, unpickled_clone = pickle.loads(pickle.dumps([book, clone]))
+    assert unpickled.orders['a'] is unpickled_clone.orders['a']
+
+    # the next tokens of this process are the tokens the levels had
+    monkeypatch.setattr(ob, '_owner_tokens', itertools.count(owner))
+    unpickled_clone.clone()
+    unpickled_clone.update('a', 2.)
+    assert unpickled.get('a') == (100., 1., 'a')
+    assert unpickled_clone.get('a') == (100., 2., 'a')
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+def test_order_book_eq_ignores_owner(engine):
+    book = GdaxOrderBook(1, bids=[['100', '1', 'a']], asks=[['101', '1', 'b']], engine=engine)
+    clone = book.clone()
+    assert book._owner != clone._owner
+    assert book == clone
+    assert book == pickle.loads(pickle.dumps(book))
+
+    clone.update('a', 2.)
+    assert book != clone
+
+
+def _top(top):
+    prices, sizes, _ = top.to_arrays()
+    return zip(prices.tolist(), sizes.tolist())
+
+
+def test_order_book_order_ids():
+    order_ids = OrderIds()
+    uuid = '5f0d9b7c-0a1e-4c3b-9d5e-0123456789ab'
+    book = GdaxOrderBook(1, bids=[['100', '1', uuid], ['99', '2', 'b']], order_ids=order_ids)
+    handle = order_ids.to_handle(uuid)
+    assert handle == int(uuid.replace('-', ''), 16)
+    assert order_ids.to_id(handle) == uuid
+    assert order_ids.to_handle('b') == -1
+    assert len(order_ids) == 1
+    assert set(book.orders) == {handle, -1}
+
+    msg = util.parse_message({'sequence': 2, 'time': '2017-12-01T00:00:01', 'type': 'done', 'order_id': uuid,
+                              'side': 'buy', 'price': '100', 'remaining_size': '1', 'reason': 'canceled'},
+                             exchange='GDAX', order_ids=order_ids)
+    assert msg['order_id'] == handle
+    book.process_message(msg)
+    assert book.to_df(level_type=3)['order_id'].tolist() == ['b']
+
+
+def test_order_ids_int_ids():
+    order_ids = OrderIds()
+    book = OrderBook(1, bids=[[100, 1, 7]], asks=[[101, 2, 12345678901234567890123456789012345]], order_ids=order_ids)
+    assert order_ids.to_handle(7) == -1
+    assert order_ids.to_handle(12345678901234567890123456789012345) == -2
+    assert book.to_df(level_type=3)['order_id'].tolist() == [7, 12345678901234567890123456789012345]
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+@pytest.mark.parametrize('top_depth', [0, 2])
+def test_order_book_to_arrays(engine, top_depth):
+    book = OrderBook(1, bids=[[100, 1, 'a'], [100, 2, 'b'], [99, 3, 'c']], asks=[[101, 1, 'd']], engine=engine,
+                     tick_size=0.01, top_depth=top_depth)
+    out = book.to_arrays(level_type=2, depth=2)
+    assert out[0].tolist() == [(100., 3., 2), (99., 3., 1)]
+    assert out[1].tolist() == [(101., 1., 1), (0., 0., 0)]
+
+    book.add('sell', 102, 4, 'e')
+    assert book.to_arrays(level_type=2, depth=2, out=out) is out
+    assert out[1].tolist() == [(101., 1., 1), (102., 4., 1)]
+
+    out = book.to_arrays(level_type=3)
+    assert out.tolist() == [(0, 0, 100., 1., 'a'), (0, 0, 100., 2., 'b'), (0, 1, 99., 3., 'c'),
+                            (1, 0, 101., 1., 'd'), (1, 1, 102., 4., 'e')]
+    book.update('a', 0)
+    assert book.to_arrays(level_type=3, out=out) is out
+    assert out['order_id'][out['level'] >= 0].tolist() == ['b', 'c', 'd', 'e']
+    assert book.to_arrays(level_type=3, depth=1)['order_id'].tolist() == ['b', 'd']
+
+    with pytest.raises(ValueError):
+        book.to_arrays(level_type=3, out=out[:2])
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_order_book_from_arrays(engine, fixed_point):
+    # unsorted rows with several orders per level
+    bids = [['99.5', '1', 'a'], ['100', '2', 'b'], ['99.5', '3', 'c'], ['100', '0.5', 'd']]
+    asks = [['101', '1', 'e'], ['100.5', '2', 'f']]
+    kwargs = dict(engine=engine, tick_size=0.5, fixed_point=fixed_point, top_depth=2, depth_index=True)
+
+    expected = OrderBook(1, **kwargs)
+    for side, orders in [('buy', bids), ('sell', asks)]:
+        for price, size, order_id in orders:
+            to_number = util.to_fixed if fixed_point else float
+            expected.add(side, to_number(price), to_number(size), order_id)
+    expected.top_bids.reset(expected.bids)
+    expected.top_asks.reset(expected.asks)
+
+    def _arrays(orders):
+        prices, sizes, order_ids = zip(*orders)
+        to_array = util.to_fixed_array if fixed_point else lambda values: np.array(values, dtype=np.float_)
+        return to_array(prices), to_array(sizes), list(order_ids)
+
+    for book in [OrderBook(1, bids=bids, asks=asks, **kwargs),
+                 OrderBook.from_arrays(1, bids=_arrays(bids), asks=_arrays(asks), **kwargs)]:
+        assert [level.price for level in book.bids] == [level.price for level in expected.bids]
+        assert [list(level.iteritems()) for level in book.bids] == [list(level.iteritems()) for level in expected.bids]
+        assert book.to_set() == expected.to_set()
+        assert book.checksum == expected.checksum
+        assert book.top_bids == expected.top_bids
+        assert book.bid_depth == expected.bid_depth
+        assert book.get('d') == expected.get('d')
+
+    with pytest.raises(AssertionError):
+        OrderBook(1, bids=[['100', '1', 'a'], ['99', '1', 'a']])
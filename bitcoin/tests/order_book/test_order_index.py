@@ -0,0 +1,84 @@
+import pickle
+
+import pytest
+
+import bitcoin.order_book.order_index as order_index
+from bitcoin.order_book.order_book import OrderBook
+
+
+def test_order_index_changes():
+    base = {'a': 1, 'b': 2}
+    index = order_index.share(base)
+    index['c'] = 3
+    index['a'] = 4
+    del index['b']
+    assert base == {'a': 1, 'b': 2}
+    assert len(index) == 2
+    assert 'b' not in index and 'c' in index
+    assert index.get('b') is None
+    assert index['a'] == 4
+    assert sorted(index) == ['a', 'c']
+    assert index == {'a': 4, 'c': 3}
+    with pytest.raises(KeyError):
+        index['b']
+    with pytest.raises(KeyError):
+        del index['b']
+    assert index.pop('c') == 3
+    assert index.pop('c', None) is None
+    assert index == {'a': 4}
+
+
+def test_order_index_share():
+    base = {'a': 1, 'b': 2}
+    index = order_index.share(base)
+    index['c'] = 3
+    first, second = order_index.share(index), order_index.share(index)
+    del first['a']
+    second['b'] = 5
+    assert index == {'a': 1, 'b': 2, 'c': 3}
+    assert first == {'b': 2, 'c': 3}
+    assert second == {'a': 1, 'b': 5, 'c': 3}
+    assert first.base is second.base is base
+
+
+def test_order_index_merge():
+    base = {i: i for i in range(100)}
+    index = order_index.share(base)
+    for i in range(100, 200):
+        index[i] = i
+    # the changes outgrew the base and were merged into a copy of it
+    assert index.owned
+    assert index.base is not base
+    assert len(base) == 100
+    assert index == {i: i for i in range(200)}
+    assert index.merge() is index.base
+
+
+def test_order_index_pickle():
+    index = order_index.share({'a': 1, 'b': 2})
+    del index['a']
+    unpickled = pickle.loads(pickle.dumps(index))
+    assert type(unpickled) is dict
+    assert unpickled == {'b': 2}
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+def test_order_book_clone_shares_orders(engine):
+    book = OrderBook(1, bids=[['100', '1', 'a'], ['99', '1', 'b']], asks=[['101', '1', 'c']], engine=engine)
+    orders = book.orders
+    clone = book.clone()
+    assert book.orders.base is clone.orders.base is orders
+    assert book == clone
+
+    clone.update('a', 0)
+    book.add('sell', 102., 1., 'd')
+    assert 'a' in book.orders and 'a' not in clone.orders
+    assert 'd' in book.orders and 'd' not in clone.orders
+    assert len(orders) == 3
+
+    # the book takes back a dict once its changes are merged
+    for i in range(100):
+        clone.add('buy', 90., 1., i)
+    assert type(clone.orders) is dict
+    assert len(clone.orders) == 102
+    assert book.get('b') == clone.get('b')
@@ -1,3 +1,9 @@
+import pickle
+import random
+
+import pytest
+
+from bitcoin.order_book.fenwick import FenwickTree
 from bitcoin.order_book.price_level import PriceLevel
 
 
@@ -46,3 +52,77 @@ def test_price_level_update_to_zero():
     level.update('abc', 0.)
     assert level.size == 0.
     assert level.orders == {}
+
+
+def test_price_level_arrival_order():
+    level = PriceLevel(price=1000., orders={})
+    for i in range(20):
+        level.add(1., str(i))
+    for i in range(0, 20, 2):
+        level.update(str(i), 0)
+    level.add(2., 'last')
+    assert [order_id for order_id, _ in level.iteritems()] == [str(i) for i in range(1, 20, 2)] + ['last']
+    assert len(level) == 11
+    assert level.size == 12.
+
+
+def test_price_level_compact():
+    level = PriceLevel(price=1000., orders={})
+    for i in range(40):
+        level.add(1., str(i))
+    for i in range(30):
+        level.update(str(i), 0)
+    # removed slots are reclaimed
+    assert len(level._ids) < 40
+    assert level.orders == {str(i): 1. for i in range(30, 40)}
+    level.update('35', 0.5)
+    assert level.get_size('35') == 0.5
+    assert '35' in level
+    assert '0' not in level
+
+
+def test_price_level_pickle():
+    level = PriceLevel(price=1000., orders={'abc': 5., 'xyz': 10.}, side='buy')
+    level.update('abc', 0)
+    result = pickle.loads(pickle.dumps(level))
+    assert result == level
+    assert result.orders == {'xyz': 10.}
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_price_level_volume_ahead(fixed_point):
+    random.seed(2)
+    level = PriceLevel(price=1000, orders={}, fixed_point=fixed_point)
+    queue = []
+    for i in range(3000):
+        if queue and random.random() < 0.4:
+            order_id, _ = queue.pop(random.randrange(len(queue)))
+            level.update(order_id, 0)
+        elif queue and random.random() < 0.3:
+            idx = random.randrange(len(queue))
+            order_id, _ = queue[idx]
+            queue[idx] = order_id, random.randint(1, 10)
+            level.update(order_id, queue[idx][1])
+        else:
+            queue.append((str(i), random.randint(1, 10)))
+            level.add(queue[-1][1], str(i))
+
+        if queue and i % 10 == 0:
+            idx = random.randrange(len(queue))
+            assert level.volume_ahead(queue[idx][0]) == sum(size for _, size in queue[:idx])
+    assert level.volume_ahead() == level.size == sum(size for _, size in queue)
+
+
+def test_fenwick_tree():
+    values = [random.randint(0, 100) for _ in range(100)]
+    tree = FenwickTree(values[:37], typecode='l')
+    for value in values[37:]:
+        tree.append(value)
+    for _ in range(200):
+        idx = random.randrange(len(values))
+        delta = random.randint(-5, 5)
+        values[idx] += delta
+        tree.add(idx, delta)
+    assert len(tree) == len(values)
+    assert [tree.prefix_sum(idx) for idx in range(len(values) + 1)] == [sum(values[:idx])
+                                                                        for idx in range(len(values) + 1)]
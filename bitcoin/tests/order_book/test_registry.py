@@ -0,0 +1,50 @@
+import bitcoin.benchmarks.order_book as bob
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+from bitcoin.order_book.registry import BookRegistry
+
+
+def test_registry_dispatch():
+    products = ['BTC-USD', 'ETH-USD']
+    data = {product: bob.synthetic_book(num_orders=200, seed=i) for i, product in enumerate(products)}
+    registry = BookRegistry(products)
+    expected = {}
+    for product in products:
+        registry.set_book(product, data[product]['sequence'], data[product]['bids'], data[product]['asks'])
+        expected[product] = GdaxOrderBook(data[product]['sequence'], bids=data[product]['bids'],
+                                          asks=data[product]['asks'])
+
+    messages = {product: bob.synthetic_messages(data[product], 500, seed=10 + i) for i, product in enumerate(products)}
+    for msgs in zip(*[messages[product] for product in products]):
+        for product, msg in zip(products, msgs):
+            msg = dict(msg, product_id=product)
+            assert registry.process_message(msg) is registry[product]
+            expected[product].process_message(msg)
+
+    for product in products:
+        assert registry[product].sequence == expected[product].sequence
+        assert registry[product].to_set() == expected[product].to_set()
+    # only ids of orders in the books are kept
+    registry.set_book('ETH-USD', data['ETH-USD']['sequence'], [], [])
+    assert set(registry._order_ids) == set(registry['BTC-USD'].orders) | set(registry['BTC-USD'].order_to_time)
+
+
+def test_registry_interning():
+    registry = BookRegistry(['BTC-USD'])
+    order_id = ''.join(['a', 'b'])
+    book = registry.set_book('BTC-USD', 1, bids=[['100', '1', order_id]], asks=[])
+    msg = registry.parse_message({'sequence': 2, 'time': '2017-12-01T00:00:01', 'type': 'change',
+                                  'order_id': ''.join(['a', 'b']), 'side': 'buy', 'price': '100',
+                                  'new_size': '0.5', 'old_size': '1', 'product_id': 'BTC-USD'})
+    assert msg['order_id'] is order_id
+    registry.process_message(msg)
+    assert book.get(order_id) == (100., .5, order_id)
+
+
+def test_registry_implied_bid_ask():
+    registry = BookRegistry(['BTC-USD', 'ETH-USD', 'ETH-BTC'])
+    registry.set_book('BTC-USD', 1, bids=[['10000', '1', 'a']], asks=[['10001', '1', 'b']])
+    registry.set_book('ETH-USD', 1, bids=[['500', '1', 'c']], asks=[['501', '1', 'd']])
+    bid, ask = registry.get_implied_bid_ask('ETH-BTC')
+    assert bid == 500 / 10001.
+    assert ask == 501 / 10000.
+    assert registry['ETH-BTC'].tick_size == 0.00001
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.snapshot as snapshot
+from bitcoin.order_book.bt_order_book import BtOrderBook
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+from bitcoin.order_book.order_ids import OrderIds
+
+
+def _orders(book):
+    return [(level.price, list(level.iteritems())) for levels in [book.bids, book.asks] for level in levels]
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+@pytest.mark.parametrize('intern_ids', [False, True])
+@pytest.mark.parametrize('mmap', [False, True])
+def test_snapshot_round_trip(tmpdir, fixed_point, intern_ids, mmap):
+    data = bob.synthetic_book(num_orders=500)
+    order_ids = OrderIds() if intern_ids else None
+    book = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], timestamp=pd.Timestamp('2017-12-01'),
+                         fixed_point=fixed_point, order_ids=order_ids)
+    path = str(tmpdir.join('book.snap'))
+    snapshot.save_book(path, book)
+
+    result = snapshot.read(path, mmap=mmap)
+    assert result.id_kind == snapshot.ID_UUID
+    assert result.fixed_point == fixed_point
+    loaded = snapshot.to_book(result, order_ids=order_ids)
+    assert loaded.sequence == book.sequence
+    assert loaded.timestamp == book.timestamp
+    assert _orders(loaded) == _orders(book)
+    assert loaded.checksum == book.checksum
+
+
+@pytest.mark.parametrize('order_ids, id_kind', [
+    ([1, 2, 3], snapshot.ID_INT),
+    (['a', 'bb', '5f0d9b7c-0a1e-4c3b-9d5e-0123456789ab'], snapshot.ID_STR),
+])
+def test_snapshot_id_kinds(tmpdir, order_ids, id_kind):
+    bids = [['100', '1', order_ids[0]], ['99', '2', order_ids[1]]]
+    book = BtOrderBook(5, bids=bids, asks=[['101', '3', order_ids[2]]], timestamp=1503261585)
+    path = str(tmpdir.join('book.snap'))
+    snapshot.save_book(path, book)
+    assert snapshot.read(path).id_kind == id_kind
+    loaded = snapshot.load_book(path)
+    assert _orders(loaded) == _orders(book)
+
+
+def test_snapshot_from_rows(tmpdir):
+    data = {'sequence': 3, 'bids': [['100.01', '1.5', 'a'], ['99', '2', 'b']], 'asks': []}
+    path = str(tmpdir.join('book.snap'))
+    snapshot.write(path, snapshot.from_rows(data['sequence'], data['bids'], data['asks'], fixed_point=True))
+    loaded = snapshot.load_book(path)
+    expected = GdaxOrderBook(3, bids=data['bids'], asks=data['asks'], fixed_point=True)
+    assert loaded.fixed_point
+    assert loaded.timestamp is None
+    assert _orders(loaded) == _orders(expected)
+
+
+def test_snapshot_invalid_file(tmpdir):
+    path = tmpdir.join('book.snap')
+    path.write('not a snapshot' * 10)
+    with pytest.raises(ValueError):
+        snapshot.read(str(path))
@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.snapshot as snapshot
+import bitcoin.order_book.stream as stream
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+from bitcoin.order_book.registry import BookRegistry
+
+
+def _chunks(body, size):
+    return [body[idx:idx + size] for idx in xrange(0, len(body), size)]
+
+
+def _body(data):
+    body = {side: [[str(price), str(size), order_id] for price, size, order_id in data[side]]
+            for side in ['bids', 'asks']}
+    body['sequence'] = data['sequence']
+    return json.dumps(body)
+
+
+def _orders(book):
+    return [(level.price, list(level.iteritems())) for levels in [book.bids, book.asks] for level in levels]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096, 10 ** 7])
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_read_book(chunk_size, fixed_point):
+    data = bob.synthetic_book(num_orders=300)
+    body = _body(data)
+    expected = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], fixed_point=fixed_point)
+
+    book = stream.read_book(_chunks(body, chunk_size), fixed_point=fixed_point)
+    assert book.sequence == expected.sequence
+    assert _orders(book) == _orders(expected)
+    assert book.checksum == expected.checksum
+
+
+def test_iter_book_format():
+    # string sequence, whitespace, extra keys and an empty side
+    body = json.dumps({'sequence': '12', 'bids': [['100.5', '1.5', 'a'], ['100', '2', 'b']], 'asks': [],
+                       'auction': {'open': True}}, indent=2)
+    items = []
+    for key, value in stream.iter_book(_chunks(body, 3)):
+        if key == 'bids':
+            items.extend(value)
+        else:
+            items.append((key, value))
+    assert sorted(items) == sorted([('sequence', 12), ('100.5', '1.5', 'a'), ('100', '2', 'b'),
+                                    ('auction', {'open': True})])
+
+    sequence, bids, asks = stream.read_arrays(_chunks(body, 5), fixed_point=True)
+    assert sequence == 12
+    assert bids[0].tolist() == [10050000000, 10000000000]
+    assert bids[2] == ['a', 'b']
+    assert len(asks[0]) == 0 and asks[0].dtype == np.int64
+
+
+@pytest.mark.parametrize('body', [
+    '{"sequence": 1, "bids": [["1", "1", "a"]',  # truncated
+    '{"sequence": 1, "bids": [["1", "1"]], "asks": []}',  # not level 3
+    '',
+])
+def test_iter_book_invalid(body):
+    with pytest.raises(ValueError):
+        stream.read_arrays(_chunks(body, 4))
+
+
+def test_read_snapshot():
+    data = bob.synthetic_book(num_orders=100)
+    result = stream.read_snapshot(_chunks(_body(data), 256), fixed_point=True)
+    expected = snapshot.from_rows(data['sequence'], data['bids'], data['asks'], fixed_point=True)
+    assert result.sequence == expected.sequence
+    assert result.id_kind == expected.id_kind
+    for side in ['bids', 'asks']:
+        for actual, values in zip(getattr(result, side), getattr(expected, side)):
+            assert np.array_equal(actual, values)
+
+
+def test_registry_set_book_arrays():
+    data = bob.synthetic_book(num_orders=100)
+    registry = BookRegistry(['BTC-USD'])
+    sequence, bids, asks = stream.read_arrays(_chunks(_body(data), 512))
+    book = registry.set_book('BTC-USD', sequence, bids, asks, arrays=True)
+    expected = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'])
+    assert _orders(book) == _orders(expected)
+    # the book keys on the interned ids
+    order_id = data['bids'][0][2]
+    assert next(key for key in book.orders if key == order_id) is registry.intern(order_id)
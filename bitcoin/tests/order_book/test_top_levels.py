@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from bitcoin.order_book.order_book import OrderBook
+
+
+def _expected_top(levels, depth):
+    return [(level.price, level.size, len(level)) for level in levels[:depth]]
+
+
+def _actual_top(top):
+    prices, sizes, counts = top.to_arrays()
+    return zip(prices.tolist(), sizes.tolist(), counts.tolist())
+
+
+def test_top_levels_add_and_remove():
+    book = OrderBook(1, top_depth=2)
+    book.add('buy', 100., 1., 'a')
+    book.add('buy', 99., 2., 'b')
+    book.add('buy', 98., 3., 'c')
+    book.add('buy', 100., 4., 'd')
+    assert _actual_top(book.top_bids) == [(100., 5., 2), (99., 2., 1)]
+
+    # a new best level pushes 99 out of the view
+    book.add('buy', 101., 1., 'e')
+    assert _actual_top(book.top_bids) == [(101., 1., 1), (100., 5., 2)]
+
+    # changes deeper than the view are ignored
+    book.update('c', 1.)
+    assert _actual_top(book.top_bids) == [(101., 1., 1), (100., 5., 2)]
+
+    # removing a level in the view brings in the next level
+    book.update('e', 0)
+    assert _actual_top(book.top_bids) == [(100., 5., 2), (99., 2., 1)]
+    assert book.top_bids[1] == (99., 2., 1)
+    assert len(book.top_asks) == 0
+
+
+def test_top_levels_initial_orders():
+    book = OrderBook(1, bids=[['100', '1', 'a'], ['99', '2', 'b']], asks=[['101', '1', 'c']], top_depth=5)
+    assert _actual_top(book.top_bids) == [(100., 1., 1), (99., 2., 1)]
+    assert _actual_top(book.top_asks) == [(101., 1., 1)]
+
+
+def test_top_levels_disabled():
+    book = OrderBook(1, top_depth=0)
+    book.add('buy', 100., 1., 'a')
+    assert book.top_bids is None
+    assert book.to_df(level_type=2, depth=1)['bid'].tolist() == [100.]
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+def test_top_levels_match_levels(engine):
+    random.seed(1)
+    book = OrderBook(1, engine=engine, top_depth=5)
+    order_ids = []
+
+    for i in range(3000):
+        if order_ids and random.random() < 0.45:
+            order_id = order_ids.pop(random.randrange(len(order_ids)))
+            new_size = random.choice([0, 0.5])
+            book.update(order_id, new_size)
+            if new_size:
+                order_ids.append(order_id)
+        else:
+            side = random.choice(['buy', 'sell'])
+            offset = random.randint(1, 30)
+            price = 1000. - offset if side == 'buy' else 1000. + offset
+            book.add(side, price, 1., str(i))
+            order_ids.append(str(i))
+
+        assert _actual_top(book.top_bids) == _expected_top(book.bids, 5)
+        assert _actual_top(book.top_asks) == _expected_top(book.asks, 5)
+
+    for depth in [1, 5]:
+        book.top_depth, top_depth = 0, book.top_depth
+        expected = book.to_df(level_type=2, depth=depth)
+        book.top_depth = top_depth
+        assert book.to_df(level_type=2, depth=depth).equals(expected)
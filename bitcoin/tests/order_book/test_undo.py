@@ -0,0 +1,88 @@
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.batch as batch
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+
+
+def _state(book):
+    """
+    Everything rewind restores, including the queue order within levels
+    """
+    orders = [(level.price, list(level.iteritems())) for levels in [book.bids, book.asks] for level in levels]
+    return book.sequence, book.timestamp, orders, dict(book.order_to_time)
+
+
+def _book_and_messages(num_messages, fixed_point=False, max_undo=10000):
+    data = bob.synthetic_book(num_orders=300)
+    messages = bob.synthetic_messages(data, num_messages)
+    if fixed_point:
+        messages = bob.to_fixed_messages(messages)
+    book = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], fixed_point=fixed_point,
+                         max_undo=max_undo)
+    return book, messages
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+def test_rewind(fixed_point):
+    book, messages = _book_and_messages(600, fixed_point=fixed_point)
+    states = [_state(book)]
+    for msg in messages:
+        book.process_message(msg)
+        states.append(_state(book))
+
+    book.rewind(1)
+    assert _state(book) == states[-2]
+    book.rewind(300)
+    assert _state(book) == states[-302]
+    book.rewind_to(messages[100]['sequence'])
+    assert _state(book) == states[101]
+    book.rewind(101)
+    assert _state(book) == states[0]
+    assert len(book.undo_log) == 0
+
+    # the book can be replayed after rewinding
+    for msg in messages:
+        book.process_message(msg)
+    assert _state(book) == states[-1]
+
+
+def test_rewind_limits():
+    book, messages = _book_and_messages(50, max_undo=10)
+    for msg in messages:
+        book.process_message(msg)
+    assert len(book.undo_log) == 10
+    with pytest.raises(AssertionError):
+        book.rewind(11)
+    with pytest.raises(AssertionError):
+        book.rewind_to(messages[0]['sequence'])
+
+    book = GdaxOrderBook(1)
+    with pytest.raises(AssertionError):
+        book.rewind(1)
+
+
+def test_rewind_batch():
+    book, messages = _book_and_messages(2000)
+    columns = batch.messages_to_columns(messages)
+    start = _state(book)
+    book.apply_batch(columns, end_sequence=messages[999]['sequence'])
+    middle = _state(book)
+    book.apply_batch(columns)
+
+    book.rewind_to(messages[999]['sequence'])
+    assert _state(book)[2:] == middle[2:]
+    book.rewind_to(0)
+    assert _state(book)[2:] == start[2:]
+    assert book.sequence == 0
+
+
+def test_rewind_clone():
+    book, messages = _book_and_messages(200)
+    for msg in messages[:100]:
+        book.process_message(msg)
+    clone = book.clone()
+    for msg in messages[100:]:
+        clone.process_message(msg)
+    clone.rewind(100)
+    assert _state(clone) == _state(book)
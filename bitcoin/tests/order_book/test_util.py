@@ -1,5 +1,8 @@
+import bitcoin.benchmarks.order_book as bob
 import bitcoin.gdax.public_client as gdax
-from bitcoin.order_book.util import compare_books, order_book_data_to_set
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+from bitcoin.order_book.util import (aggregate_orders, compare_books, diff_books, get_checksum, order_book_data_to_set,
+                                     summarize_diff)
 from bitcoin.order_book.order_book import OrderBook
 
 
@@ -24,3 +27,55 @@ def test_compare_books():
     actual.update(order_id='3f681726-9078-4b8c-bfb2-dbc25910b75e', new_size=1)
     num_diff = compare_books(actual, expected)
     assert num_diff == 2
+
+
+def test_aggregate_orders():
+    prices, sizes, counts = aggregate_orders([300, 100, 300, 200], [1, 2, 3, 4])
+    assert prices.tolist() == [100, 200, 300]
+    assert sizes.tolist() == [2, 4, 4]
+    assert counts.tolist() == [1, 1, 2]
+
+
+def test_checksum():
+    data = bob.synthetic_book(num_orders=300)
+    book = GdaxOrderBook(data['sequence'], bids=data['bids'], asks=data['asks'], max_undo=1000)
+    assert book.checksum == get_checksum(book.to_set())
+    initial = book.checksum
+
+    for msg in bob.synthetic_messages(data, 1000):
+        book.process_message(msg)
+    assert book.checksum == get_checksum(book.to_set())
+    assert book.checksum != initial
+
+    book.rewind(1000)
+    assert book.checksum == initial
+
+
+def test_compare_books_checksum():
+    data = {'sequence': 1, 'bids': [['100', '1', 'a']], 'asks': [['101', '2', 'b']]}
+    expected = OrderBook(data['sequence'], bids=data['bids'], asks=data['asks'])
+    actual = OrderBook(data['sequence'], asks=data['asks'])
+    assert compare_books(actual, expected) == 1
+    actual.add('buy', 100., 1., 'a')
+    assert actual.checksum == expected.checksum
+    assert compare_books(actual, expected) == 0
+
+
+def test_diff_books():
+    expected = OrderBook(1, bids=[['100', '1', 'a'], ['100', '2', 'b'], ['99', '1', 'c']], asks=[['101', '1', 'd']])
+    actual = OrderBook(1, bids=[['100', '1', 'a'], ['100', '1.5', 'b']], asks=[['101', '1', 'd'], ['102', '1', 'e']])
+    diff = diff_books(actual, expected)
+    assert diff[['kind', 'side', 'depth', 'price', 'order_id']].values.tolist() == [
+        ['extra', 'ask', 1, 102., 'e'],
+        ['changed', 'bid', 0, 100., 'b'],
+        ['missing', 'bid', 1, 99., 'c'],
+    ]
+    assert diff['actual_size'].tolist()[:2] == [1., 1.5]
+    assert diff['expected_size'].tolist()[1:] == [2., 1.]
+
+    summary = summarize_diff(diff)
+    assert summary.loc[('bid', 1, 99.)].tolist() == [1, 0, 0]
+    assert summary['changed'].sum() == 1
+
+    assert diff_books(expected, expected).empty
+    assert diff_books(OrderBook(1), OrderBook(1)).empty
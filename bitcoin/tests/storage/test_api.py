@@ -0,0 +1,115 @@
+import multiprocessing
+import multiprocessing.pool
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.storage
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+
+
+DATA = bob.synthetic_book(num_orders=200)
+MESSAGES = bob.synthetic_messages(DATA, 600)
+SNAPSHOTS = [DATA['sequence'], MESSAGES[299]['sequence']]
+
+
+def _book_at(sequence):
+    book = GdaxOrderBook(DATA['sequence'], bids=DATA['bids'], asks=DATA['asks'])
+    for msg in MESSAGES:
+        if msg['sequence'] > sequence:
+            break
+        book.process_message(msg)
+    return book
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """
+    storage.api with the database replaced by the synthetic snapshots and messages
+    """
+    # storage.util connects to the database on import
+    sutil = types.ModuleType('bitcoin.storage.util')
+    sutil.df_to_book = lambda sequence, **kwargs: _book_at(sequence)
+    monkeypatch.setitem(sys.modules, 'bitcoin.storage.util', sutil)
+    monkeypatch.setattr(bitcoin.storage, 'util', sutil, raising=False)
+    monkeypatch.delitem(sys.modules, 'bitcoin.storage.api', raising=False)
+    import bitcoin.storage.api as api
+    monkeypatch.setattr(api, '_init_worker', lambda: None)
+
+    calls = []
+
+    def get_closest_snapshot(at=None, exchange=None, product=None):
+        calls.append(at)
+        return max(sequence for sequence in SNAPSHOTS if sequence <= at)
+
+    def get_messages(start=None, end=None, exchange=None, product=None, fixed_point=False):
+        return [msg for msg in MESSAGES if start < msg['sequence'] <= end]
+
+    monkeypatch.setattr(api, 'get_snapshot_index', lambda exchange=None, product=None: pd.DataFrame(
+        {'sequence': SNAPSHOTS, 'received_time': [MESSAGES[0]['time'], MESSAGES[299]['time']]}))
+    monkeypatch.setattr(api, 'get_closest_snapshot', get_closest_snapshot)
+    monkeypatch.setattr(api, 'get_messages', get_messages)
+    api.snapshot_calls = calls
+    return api
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_get_books(api, workers):
+    ats = [MESSAGES[idx]['sequence'] for idx in [450, 10, 299, 100, 599]]
+    result = list(api.get_books(ats, workers=workers))
+
+    # yielded in order, each book at its sequence
+    assert [at for at, _ in result] == sorted(ats)
+    for at, book in result:
+        expected = _book_at(at)
+        assert book.sequence == expected.sequence == at
+        assert book.to_set() == expected.to_set()
+
+    # clones from the same group do not share changes after they are returned
+    _, first = result[0]
+    _, second = result[1]
+    order_id = next(iter(second.orders))
+    expected = first.to_set()
+    second.update(order_id, 0)
+    assert first.to_set() == expected
+
+    if workers == 1:
+        # one snapshot per group
+        assert api.snapshot_calls == SNAPSHOTS
+
+
+def test_get_books_many_per_group(api):
+    # every message of the first group and a few of the second
+    ats = [msg['sequence'] for msg in MESSAGES[:300]] + [MESSAGES[idx]['sequence'] for idx in [350, 599]]
+    result = list(api.get_books(ats, workers=1))
+    assert api.snapshot_calls == SNAPSHOTS
+
+    assert [at for at, _ in result] == ats
+    for at, book in result:
+        expected = api.get_book(at)
+        assert book.sequence == expected.sequence == at
+        assert book.to_set() == expected.to_set()
+        assert book.order_to_time == expected.order_to_time
+
+
+def test_get_books_terminates_pool(api, monkeypatch):
+    pools = []
+
+    class Pool(multiprocessing.pool.Pool):
+        def __init__(self, *args, **kwargs):
+            super(Pool, self).__init__(*args, **kwargs)
+            self.terminated = False
+            pools.append(self)
+
+        def terminate(self):
+            self.terminated = True
+            super(Pool, self).terminate()
+
+    monkeypatch.setattr(api.multiprocessing, 'Pool', Pool)
+    books = api.get_books([MESSAGES[idx]['sequence'] for idx in [10, 400]], workers=2)
+    next(books)
+    books.close()
+    assert len(pools) == 1 and pools[0].terminated
@@ -0,0 +1,17 @@
+import pytest
+
+import bitcoin.strategies.util as autil
+from bitcoin.order_book.order_book import OrderBook
+
+
+@pytest.mark.parametrize('fixed_point', [False, True])
+@pytest.mark.parametrize('top_depth', [0, 2, 10])
+@pytest.mark.parametrize('depth_index', [False, True])
+def test_get_vwap(fixed_point, top_depth, depth_index):
+    bids = [['100', '1', 'a'], ['99.5', '2', 'b'], ['99', '4', 'c']]
+    asks = [['101', '0.5', 'd'], ['102', '3', 'e'], ['103', '4', 'f']]
+    book = OrderBook(1, bids=bids, asks=asks, fixed_point=fixed_point, top_depth=top_depth, depth_index=depth_index)
+
+    # bids: 1 at 100 and 1.5 at 99.5, asks: 0.5 at 101 and 2 at 102
+    expected = ((100 + 1.5 * 99.5) / 2.5 + (0.5 * 101 + 2 * 102) / 2.5) / 2
+    assert autil.get_vwap(book, 2.5) == pytest.approx(expected)
@@ -0,0 +1,18 @@
+import pytest
+
+from bitcoin.order_book.order_book import OrderBook
+from bitcoin.strategies.wall import WallStrategy
+
+
+@pytest.mark.parametrize('engine', ['sorted', 'ladder'])
+@pytest.mark.parametrize('depth_index', [False, True])
+def test_wall_target_prices(engine, depth_index):
+    bids = [['100', '1', 'a'], ['99.5', '4', 'b'], ['99.01', '6', 'c'], ['98.5', '20', 'd']]
+    asks = [['101', '1', 'e']]
+    book = OrderBook(1, bids=bids, asks=asks, engine=engine, depth_index=depth_index)
+
+    # behind 100: 5 up to 99.01, which is 1 below the order at 100.01 and excluded. Behind 99.5: 10 up to 98.51
+    target_buy, target_ask = WallStrategy().get_target_prices(book)
+    assert target_buy == pytest.approx(99.51)
+    # the asks do not reach 1 beyond the first order
+    assert target_ask is None
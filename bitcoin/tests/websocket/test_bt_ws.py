@@ -0,0 +1,29 @@
+import logging
+
+import pytest
+
+import bitcoin.benchmarks.bitstamp as bbt
+import bitcoin.websocket.bt_ws as bt_ws
+from bitcoin.websocket.bt_ws import BitstampOrderBook
+
+
+MSG = {'event': 'order_created', 'channel': 'live_orders',
+       'data': '{"id": 1, "amount": 0.5, "price": 10000.0, "order_type": 0, "datetime": "1512086400"}'}
+
+
+@pytest.mark.parametrize('record', [True, False])
+def test_on_message_records_raw_messages(tmpdir, monkeypatch, record):
+    # log to a temporary file in the format of the captures instead of logs/bitstamp_ws
+    path = str(tmpdir.join('bitstamp_ws.log'))
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    monkeypatch.setattr(bt_ws.logger, 'handlers', [handler])
+    monkeypatch.setattr(bt_ws.logger, 'propagate', False)
+
+    ws = BitstampOrderBook('BTC-USD', channel=None, record=record)
+    ws.restart = False
+    ws.syncing = True
+    ws.on_message(MSG)
+    handler.close()
+    assert len(ws.queue) == 1
+    assert bbt.load_logs([path]) == ([MSG] if record else [])
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import bitcoin.benchmarks.order_book as bob
+import bitcoin.order_book.events as events
+import bitcoin.order_book.snapshot as snapshot
+import bitcoin.websocket.gdax_ws as gdax_ws
+from bitcoin.order_book.gdax_order_book import GdaxOrderBook
+from bitcoin.websocket.gdax_ws import GdaxRegistryWebSocket, GdaxWebSocket
+
+
+@pytest.fixture
+def ws(tmpdir, monkeypatch):
+    data = bob.synthetic_book(num_orders=100)
+    path = str(tmpdir.join('book.snap'))
+    snapshot.save_book(path, GdaxOrderBook(10, bids=data['bids'], asks=data['asks']))
+
+    ws = GdaxWebSocket('BTC-USD', snapshot_path=path)
+    ws.rest_book = GdaxOrderBook(100, bids=data['bids'], asks=data['asks'])
+    monkeypatch.setattr(ws, 'get_book', lambda: ws.rest_book)
+    return ws
+
+
+@pytest.mark.parametrize('sequence, expected', [(11, 11), (12, 100)])
+def test_reset_book_restores_continued_snapshot(ws, sequence, expected):
+    assert ws.restore
+    ws.restart = False  # as in on_message
+    ws.queue.append({'sequence': sequence, 'type': 'received', 'time': None})
+    ws.reset_book()
+    assert not ws.restore
+    assert ws.book.sequence == expected
+    assert (ws.book is ws.rest_book) == (expected == 100)
+
+
+def test_shutdown_saves_snapshot(ws, monkeypatch):
+    saved = []
+    monkeypatch.setattr(ws, 'save_snapshot', lambda: saved.append(ws.book.sequence))
+    monkeypatch.setattr(GdaxWebSocket, 'close', lambda self: None, raising=False)
+    ws.book = ws.rest_book
+
+    ws.close()
+    assert saved == []
+    ws.shutdown()
+    assert saved == [100]
+
+
+def test_registry_on_change():
+    data = bob.synthetic_book(num_orders=100)
+    changes = []
+    ws = GdaxRegistryWebSocket(['BTC-USD', 'ETH-USD'], on_change=lambda *args: changes.append(args))
+    for product_id in ws.registry.product_ids:
+        ws.registry.set_book(product_id, sequence=10, bids=data['bids'], asks=data['asks'])
+
+    ws.process_message({'product_id': 'ETH-USD', 'sequence': 11, 'type': 'received', 'time': None})
+    assert changes
+    assert {product_id for product_id, event in changes} == {'ETH-USD'}
+    assert {type(event) for product_id, event in changes} == set(events.KINDS)
+    assert ws.registry['ETH-USD'].sequence == 11
+
+
+def _best_prices(changes):
+    return [(event.side, event.price) for event in changes if isinstance(event, events.BestPrice)]
+
+
+@pytest.mark.parametrize('method', ['reset_book', 'check_book'])
+def test_resync_emits_events(monkeypatch, method):
+    changes = []
+    ws = GdaxWebSocket('BTC-USD', on_change=changes.append)
+    ws.book = GdaxOrderBook(10, bids=[['100', '1', 'a']], asks=[['101', '1', 'b']])
+    ws.events.check(ws.book)
+    assert _best_prices(changes) == [('buy', 100.), ('sell', 101.)]
+
+    # the resync moves the best bid
+    monkeypatch.setattr(ws, 'get_book', lambda: GdaxOrderBook(20, bids=[['99', '1', 'c']], asks=[['101', '1', 'b']]))
+    ws.restart = False
+    del changes[:]
+    getattr(ws, method)()
+    assert ws.book.sequence == 20
+    assert _best_prices(changes) == [('buy', 99.)]
+
+
+def test_registry_resync_emits_events(monkeypatch):
+    changes = []
+    ws = GdaxRegistryWebSocket(['BTC-USD', 'ETH-USD'], on_change=lambda *args: changes.append(args))
+    arrays = [np.array([100.]), np.array([1.]), ['a']], [np.array([101.]), np.array([1.]), ['b']]
+    monkeypatch.setattr(gdax_ws, 'get_book_arrays', lambda client, product_id, fixed_point=False: (20,) + arrays)
+    ws.restart['ETH-USD'] = False
+    ws.reset_book('ETH-USD')
+    assert [(product_id, event.side, event.price) for product_id, event in changes
+            if isinstance(event, events.BestPrice)] == [('ETH-USD', 'buy', 100.), ('ETH-USD', 'sell', 101.)]
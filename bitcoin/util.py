@@ -5,6 +5,8 @@ import logging
 import functools
 from datetime import datetime
 
+import numpy as np
+
 import bitcoin.params as pms
 
 
@@ -45,7 +47,56 @@ def time_to_str(timestamp):
     return time_str
 
 
-def parse_message(msg, exchange):
+def to_fixed(value):
+    """
+    Convert a price or size to an integer number of 1e-8 units i.e. satoshis for BTC sizes.
+
+    Parameters
+    ----------
+    value: str or float
+
+    Returns
+    -------
+    int
+    """
+    return int(round(float(value) * pms.FIXED_POINT_SCALE))
+
+
+def to_fixed_array(values):
+    """
+    Vectorized to_fixed, rounds halves away from zero like to_fixed
+
+    Parameters
+    ----------
+    values: np.array or list
+        floats or strings
+
+    Returns
+    -------
+    np.array
+        int64
+    """
+    scaled = np.asarray(values, dtype=np.float_) * pms.FIXED_POINT_SCALE
+    result = np.round(scaled)
+    truncated = np.trunc(scaled)
+    halves = np.abs(scaled - truncated) == 0.5
+    result[halves] = truncated[halves] + np.sign(scaled[halves])
+    return result.astype(np.int64)
+
+
+def from_fixed(value):
+    """
+    Convert fixed point integers back to floats. Works on scalars, arrays and pandas objects.
+    """
+    return value / float(pms.FIXED_POINT_SCALE)
+
+
+# dict[exchange, dict[field, dtype]] with prices and sizes as fixed point integers
+MSG_DTYPE_FIXED = {exchange: dict(dtypes, **{field: to_fixed for field in pms.FIXED_POINT_FIELDS})
+                   for exchange, dtypes in pms.MSG_DTYPE.iteritems()}
+
+
+def parse_message(msg, exchange, fixed_point=False, order_ids=None):
     """
     Convert message to appropriate dtypes.
 
@@ -53,13 +104,21 @@ def parse_message(msg, exchange):
     ----------
     msg: dict
     exchange: str
+    fixed_point: bool
+        convert prices and sizes to fixed point integers instead of floats, see to_fixed
+    order_ids: OrderIds
+        convert order ids to integer handles, see OrderBook
 
     Returns
     -------
     dict
     """
-    dtypes = pms.MSG_DTYPE[exchange]
+    dtypes = MSG_DTYPE_FIXED[exchange] if fixed_point else pms.MSG_DTYPE[exchange]
     result = {k: dtypes[k](v) for k, v in msg.iteritems() if v}
+    if order_ids is not None:
+        for field in pms.ORDER_ID_FIELDS:
+            if field in result:
+                result[field] = order_ids.to_handle(result[field])
     return result
 
 
@@ -1,6 +1,9 @@
+from collections import deque
 from threading import Thread
 
+import bitcoin.bitstamp.client as bitstamp
 import bitcoin.logs.logger as lc
+import bitcoin.order_book.bt_order_book as ob
 import bitcoin.params as params
 from bitcoin.websocket.core_ws import WebSocket
 
@@ -9,24 +12,65 @@ logger = lc.config_logger('bitstamp_ws', 'DEBUG')
 
 
 class BitstampOrderBook(WebSocket):
-    def __init__(self, product_id, channel):
+    """
+    Maintains an up to date instance of BtOrderBook from the live_orders channel. Messages are queued while the
+    book is loaded from the REST order book and applied afterwards.
+
+    With `record` the raw messages are logged at DEBUG level to logs/bitstamp_ws, which benchmarks.bitstamp replays.
+    """
+    def __init__(self, product_id, channel, engine=None, fixed_point=False, record=True):
         self.exchange = 'BITSTAMP'
         super(BitstampOrderBook, self).__init__(url=params.WS_URL[self.exchange],
                                                 channel=channel,
                                                 heartbeat=False)
-        self.book = None
+        self.product_id = product_id
+        self.engine = engine
+        self.fixed_point = fixed_point
+        self.tick_size = params.TICK_SIZE[self.exchange][product_id]
+        self.client = bitstamp.Public()
+        self.book = self.create_book(sequence=0)
+        self.queue = deque()
+        self.restart = True  # load the order book
+        self.syncing = False  # loading the order book
+        self.record = record
+
+    def create_book(self, sequence, bids=None, asks=None, timestamp=None):
+        return ob.BtOrderBook(sequence=sequence, bids=bids, asks=asks, timestamp=timestamp, engine=self.engine,
+                              tick_size=self.tick_size, fixed_point=self.fixed_point)
 
     def on_message(self, msg):
-        logger.debug(msg)
+        if self.record:
+            logger.debug(msg)
+        msg = ob.parse_message(msg, fixed_point=self.fixed_point)
+
+        if self.restart:
+            logger.info('Restarting sync')
+            self.queue = deque([msg])
+            Thread(target=self.reset_book).start()
+            self.restart = False
+        elif self.syncing:
+            self.queue.append(msg)
+        else:
+            self.book.process_message(msg)
+
+    def reset_book(self):
+        """get the order book and apply pending messages from queue"""
+        self.syncing = True
+        base, quote = self.product_id.lower().split('-')
+        data = self.client.order_book(group=2, base=base, quote=quote)
+        self.book = self.create_book(sequence=0, bids=ob.snapshot_to_orders(data['bids']),
+                                     asks=ob.snapshot_to_orders(data['asks']), timestamp=int(data['timestamp']))
+        logger.info('Got book: {} orders'.format(len(self.book.orders)))
+
+        while self.queue:
+            self.book.process_message(self.queue.popleft())
+        self.syncing = False
+        logger.info('Book ready: {}'.format(self.book.sequence))
 
 
 if __name__ == '__main__':
     product_id = 'BTC-USD'
-    live_orders = {'event': 'pusher:subscribe', 'data': {'channel': 'live_orders'}}
-    live_trades = {'event': 'pusher:subscribe', 'data': {'channel': 'live_trades'}}
-
-    ws1 = BitstampOrderBook(product_id=product_id, channel=live_orders)
-    ws2 = BitstampOrderBook(product_id=product_id, channel=live_trades)
+    live_orders = params.CHANNEL['BITSTAMP'][product_id]
 
-    t1 = Thread(target=ws1.start).start()
-    t2 = Thread(target=ws2.start).start()
+    ws = BitstampOrderBook(product_id=product_id, channel=live_orders)
+    ws.start()
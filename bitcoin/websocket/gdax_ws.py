@@ -1,12 +1,21 @@
+import json
 import logging
+import os
+import time
 from collections import deque
-from copy import deepcopy
+from functools import partial
 from threading import Thread
 
 import bitcoin.gdax.public_client as gdax
 import bitcoin.logs.logger as lc
+import bitcoin.order_book.events as events
 import bitcoin.order_book.gdax_order_book as ob
+import bitcoin.order_book.l2_order_book as l2
+import bitcoin.order_book.snapshot as snapshot
+import bitcoin.order_book.stream as stream
 import bitcoin.order_book.util as ob_util
+from bitcoin.order_book.order_ids import OrderIds
+from bitcoin.order_book.registry import BookRegistry
 import bitcoin.params as params
 import bitcoin.util as util
 from bitcoin.websocket.core_ws import WebSocket
@@ -14,29 +23,83 @@ from bitcoin.websocket.core_ws import WebSocket
 logger = lc.config_logger('gdax_websocket')
 
 
+def get_book_arrays(client, product_id, fixed_point=False):
+    """
+    Level 3 REST book of a product parsed while it is downloaded, see order_book.stream. Retries until it succeeds.
+
+    Returns
+    -------
+    tuple(int, tuple, tuple)
+        sequence, bids and asks, see stream.read_arrays
+    """
+    while True:
+        try:
+            return stream.read_arrays(client.stream_product_order_book(product_id, level=3), fixed_point=fixed_point)
+        except Exception as e:
+            logger.error('Failed to read gdax order book: {}'.format(e))
+            logger.error('Sleeping for {}s before trying again'.format(client.sleep_time))
+            time.sleep(client.sleep_time)
+
+
 class GdaxWebSocket(WebSocket):
     """
     Maintains an up to date instance of GdaxOrderBook. Is responsible for queuing and applying messages and
     restarting the book if needed.
+
+    Top of book changes are published through `events`, see order_book.events. Subscribe to the kinds of changes
+    you need with `events.subscribe(kind, callback)`; `on_change` is subscribed to all of them.
+
+    With `snapshot_path` the book is saved as a binary snapshot (see order_book.snapshot) after every check and on
+    `shutdown`, and the first sync after a restart starts from the saved book instead of the level 3 REST book if the
+    first queued message continues it. Otherwise the REST book is loaded as usual.
     """
-    def __init__(self, product_id, on_change=None):
+    def __init__(self, product_id, on_change=None, engine=None, fixed_point=False, intern_ids=False,
+                 snapshot_path=None):
         self.exchange = 'GDAX'
         url = params.WS_URL[self.exchange]
         channel = params.CHANNEL[self.exchange][product_id]
         super(GdaxWebSocket, self).__init__(url, channel)
 
-        self.book = ob.GdaxOrderBook(sequence=-1)
+        self.engine = engine
+        self.fixed_point = fixed_point
+        self.order_ids = OrderIds() if intern_ids else None
+        self.tick_size = params.TICK_SIZE[self.exchange][product_id]
+        self.book = self.create_book(sequence=-1)
         self.queue = deque()
         self.on_change = on_change
+        self.events = events.BookEvents()
+        if on_change is not None:
+            for kind in events.KINDS:
+                self.events.subscribe(kind, on_change)
         self.gdax_client = gdax.PublicClient()
         self.product_id = product_id
 
         self.restart = True  # load the order book
         self.syncing = False  # sync in process i.e. loading order book or applying messages
         self.check_freq = 3600  # check every x seconds
+        self.snapshot_path = snapshot_path
+        self.restore = snapshot_path is not None and os.path.exists(snapshot_path)  # load the saved book on sync
+
+    def create_book(self, sequence, bids=None, asks=None, arrays=False):
+        """
+        Parameters
+        ----------
+        arrays: bool
+            bids and asks are (prices, sizes, order_ids) arrays instead of rows, see GdaxOrderBook.from_arrays
+        """
+        create = ob.GdaxOrderBook.from_arrays if arrays else ob.GdaxOrderBook
+        return create(sequence, bids=bids, asks=asks, engine=self.engine, tick_size=self.tick_size,
+                      fixed_point=self.fixed_point, order_ids=self.order_ids)
+
+    def get_book(self):
+        """
+        Level 3 REST book, built while it is downloaded
+        """
+        sequence, bids, asks = get_book_arrays(self.gdax_client, self.product_id, fixed_point=self.fixed_point)
+        return self.create_book(sequence, bids=bids, asks=asks, arrays=True)
 
     def on_message(self, msg):
-        msg = util.parse_message(msg, exchange=self.exchange)
+        msg = util.parse_message(msg, exchange=self.exchange, fixed_point=self.fixed_point, order_ids=self.order_ids)
         sequence = msg['sequence']
 
         if self.restart:
@@ -68,6 +131,8 @@ class GdaxWebSocket(WebSocket):
             return -1
 
         book.process_message(msg, book)
+        if book is self.book:
+            self.events.check(book)
 
     def reset_book(self):
         """get level 3 order book and apply pending messages from queue"""
@@ -76,9 +141,20 @@ class GdaxWebSocket(WebSocket):
         logger.info('Loading book', extra={'sequence': self.book.sequence})
 
         # get book
-        data = self.gdax_client.get_product_order_book(self.product_id, level=3)
-        self.book = ob.GdaxOrderBook(sequence=data['sequence'], bids=data['bids'], asks=data['asks'])
-        logger.info('Got book: {}'.format(self.book.sequence))
+        book = None
+        if self.restore:
+            self.restore = False
+            book = self.load_snapshot()
+            if self.continues(book):
+                logger.info('Loaded saved book: {}'.format(book.sequence))
+            else:
+                logger.info('Saved book {} does not continue the feed, getting book'.format(book.sequence))
+                book = None
+        if book is None:
+            book = self.get_book()
+            logger.info('Got book: {}'.format(book.sequence))
+        self.book = book
+        self.events.check(self.book)
 
         # apply queue
         self.apply_queue(self.book)
@@ -86,6 +162,15 @@ class GdaxWebSocket(WebSocket):
         self.syncing = False
         logger.info('=' * 30)
 
+    def continues(self, book, timeout=5):
+        """
+        Whether the first queued message follows the book, waits up to timeout seconds for a message
+        """
+        start = time.time()
+        while not self.queue and time.time() - start < timeout:
+            time.sleep(0.1)
+        return bool(self.queue) and self.queue[0]['sequence'] <= book.sequence + 1
+
     def apply_queue(self, book, end=None):
         """apply queued messages to book till end sequence"""
         logger.info('Applying queued msgs: {}'.format(book.sequence))
@@ -110,13 +195,12 @@ class GdaxWebSocket(WebSocket):
         logger.info('^' * 30)
 
         # save current book
-        current_book = deepcopy(self.book)
+        current_book = self.book.clone()
         logger.info('Checking book start: {}'.format(current_book.sequence))
         logger.setLevel(logging.DEBUG)
 
         # get expected book
-        data = self.gdax_client.get_product_order_book(self.product_id, level=3)
-        expected_book = ob.GdaxOrderBook(sequence=data['sequence'], bids=data['bids'], asks=data['asks'])
+        expected_book = self.get_book()
         logger.info('Expected book: {}'.format(expected_book.sequence))
 
         # apply queue to current book
@@ -126,17 +210,173 @@ class GdaxWebSocket(WebSocket):
         num_diff = ob_util.compare_books(current_book, expected_book)
         msg = 'Book differences: {}'.format(num_diff)
         logger.error(msg) if num_diff > 0 else logger.info(msg)
+        if num_diff > 0:
+            # the report is only logged, a failure must not stop the book from being reset
+            try:
+                diff = ob_util.diff_books(current_book, expected_book)
+                logger.error('Differences by level:\n{}'.format(ob_util.summarize_diff(diff).head(20)))
+            except Exception:
+                logger.exception('Failed to diff books')
 
         # reset book
         self.apply_queue(expected_book)
         self.book = expected_book
+        self.events.check(self.book)
         self.queue = deque()
         self.syncing = False
         logger.setLevel(logging.INFO)
         logger.info('Checking book end: {}'.format(self.book.sequence))
         logger.info('^' * 30)
+        if self.snapshot_path:
+            self.save_snapshot()
         return
 
+    def load_snapshot(self):
+        """
+        Book saved at `snapshot_path`
+        """
+        return snapshot.load_book(self.snapshot_path, engine=self.engine, tick_size=self.tick_size,
+                                  fixed_point=self.fixed_point, order_ids=self.order_ids)
+
+    def save_snapshot(self):
+        """
+        Save the book to `snapshot_path`
+        """
+        book = self.book.clone()
+        snapshot.save_book(self.snapshot_path, book)
+        logger.info('Saved book: {}'.format(book.sequence))
+
+    def shutdown(self):
+        """
+        Close the websocket for good and save the book to `snapshot_path`. Reconnects only call close.
+        """
+        self.close()
+        if self.snapshot_path and not self.syncing and self.book.sequence >= 0:
+            self.save_snapshot()
+
+
+class GdaxL2WebSocket(WebSocket):
+    """
+    Maintains an L2OrderBook from the level2 channel for strategies that only need aggregated depth. The channel sends
+    a snapshot of the book when subscribing and then the new size of every changed level, so there is no level 3 REST
+    sync or message queue: the book is replaced by the snapshot sent after every (re)connect.
+
+    Top of book changes are published through `events` like GdaxWebSocket. With `record_path` the raw messages are
+    appended to a JSON lines file that can be replayed with `l2_order_book.load_feed`.
+    """
+    def __init__(self, product_id, on_change=None, fixed_point=False, depth_index=False, record_path=None):
+        self.exchange = 'GDAX'
+        url = params.WS_URL[self.exchange]
+        channel = {'type': 'subscribe', 'product_ids': [product_id], 'channels': ['level2', 'heartbeat']}
+        super(GdaxL2WebSocket, self).__init__(url, channel)
+
+        self.product_id = product_id
+        self.fixed_point = fixed_point
+        self.book = l2.L2OrderBook(tick_size=params.TICK_SIZE[self.exchange][product_id], fixed_point=fixed_point,
+                                   depth_index=depth_index)
+        self.on_change = on_change
+        self.events = events.BookEvents()
+        if on_change is not None:
+            for kind in events.KINDS:
+                self.events.subscribe(kind, on_change)
+        self.record_path = record_path
+        self.record_file = None
+
+    def on_message(self, msg):
+        if self.record_path:
+            if self.record_file is None:
+                self.record_file = open(self.record_path, 'a')
+            self.record_file.write(json.dumps(msg) + '\n')
+
+        msg = l2.parse_message(msg, fixed_point=self.fixed_point)
+        if msg.get('type') == 'snapshot':
+            logger.info('Got {} level 2 book: {} bids, {} asks'.format(self.product_id, len(msg['bids']),
+                                                                       len(msg['asks'])))
+        self.book.process_message(msg)
+        self.events.check(self.book)
+
+    def close(self):
+        super(GdaxL2WebSocket, self).close()
+        if self.record_file is not None:
+            self.record_file.close()
+            self.record_file = None
+
+
+class GdaxRegistryWebSocket(WebSocket):
+    """
+    Maintains the books of several products from one websocket, see BookRegistry. Each product is synced and
+    restarted on its own so a gap in one product does not reload the others.
+
+    Top of book changes of each product are published through `events[product_id]`, see GdaxWebSocket. `on_change`
+    is subscribed to all kinds of every product and called as `on_change(product_id, event)`.
+    """
+    def __init__(self, product_ids, on_change=None, **kwargs):
+        self.exchange = 'GDAX'
+        url = params.WS_URL[self.exchange]
+        channel = {'type': 'subscribe', 'product_ids': list(product_ids)}
+        super(GdaxRegistryWebSocket, self).__init__(url, channel)
+
+        self.registry = BookRegistry(product_ids, exchange=self.exchange, **kwargs)
+        self.queues = {product_id: deque() for product_id in product_ids}
+        self.restart = {product_id: True for product_id in product_ids}
+        self.syncing = {product_id: False for product_id in product_ids}
+        self.on_change = on_change
+        self.events = {product_id: events.BookEvents() for product_id in product_ids}
+        if on_change is not None:
+            for product_id, product_events in self.events.iteritems():
+                for kind in events.KINDS:
+                    product_events.subscribe(kind, partial(on_change, product_id))
+        self.gdax_client = gdax.PublicClient()
+
+    def on_message(self, msg):
+        product_id = msg.get('product_id')
+        if product_id not in self.registry:
+            # e.g. subscriptions message
+            logger.debug('Ignoring msg: {}'.format(msg))
+            return
+        msg = self.registry.parse_message(msg)
+
+        if self.restart[product_id]:
+            logger.info('Restarting sync: {}'.format(product_id))
+            self.queues[product_id] = deque()
+            Thread(target=self.reset_book, args=(product_id,)).start()
+            self.restart[product_id] = False
+        elif self.syncing[product_id]:
+            self.queues[product_id].append(msg)
+        else:
+            self.process_message(msg)
+
+    def process_message(self, msg):
+        product_id = msg['product_id']
+        book = self.registry[product_id]
+        sequence = msg['sequence']
+
+        if sequence <= book.sequence:
+            logger.debug('Ignoring older msg: {}'.format(sequence))
+            return -1
+        elif sequence != book.sequence + 1:
+            logger.warning('{} out of sync: book({}), message({})'.format(product_id, book.sequence, sequence))
+            self.restart[product_id] = True
+            return -1
+
+        self.registry.process_message(msg)
+        self.events[product_id].check(book)
+
+    def reset_book(self, product_id):
+        """get level 3 order book of a product and apply its pending messages"""
+        self.syncing[product_id] = True
+        sequence, bids, asks = get_book_arrays(self.gdax_client, product_id, fixed_point=self.registry.fixed_point)
+        book = self.registry.set_book(product_id, sequence=sequence, bids=bids, asks=asks, arrays=True)
+        self.events[product_id].check(book)
+        logger.info('Got {} book: {}'.format(product_id, book.sequence))
+
+        queue = self.queues[product_id]
+        while not self.restart[product_id] and queue:
+            self.process_message(queue.popleft())
+        self.queues[product_id] = deque()
+        self.syncing[product_id] = False
+        logger.info('{} book ready: {}'.format(product_id, book.sequence))
+
 
 if __name__ == '__main__':
     ws = GdaxWebSocket(product_id='BTC-USD')